@@ -1,22 +1,174 @@
 # autologx/api/admin.py
-from django.contrib import admin
-from .models import Vehicle, ServiceRecord, Attachment
+"""
+Admin for tables with millions of rows (LargeTableAdmin):
+- no COUNT(*) over a whole table: EstimatedCountPaginator reads the planner's row
+  estimate, and counts of filtered changelists stop at COUNT_LIMIT
+- FK columns come from list_select_related joins, not a query per row
+- FK inputs are autocomplete widgets instead of selects listing every row
+- choices of value filters (a DISTINCT scan) are cached by CachedValuesFilter
+- service record search goes through the full-text index (search.py), and a VIN
+  is looked up through its unique index
+- vehicles are deleted set-wise (deletion.py) instead of through delete_selected,
+  which loads and lists every related row before asking to confirm
+"""
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Sum
+from django.template.response import TemplateResponse
+from django.utils import timezone
+from django.utils.functional import cached_property
+from .models import Vehicle, ServiceRecord, Attachment, Job, VehicleSummary
+from .services import normalize_vin
+from .vin_index import validate_vin
+from . import deletion, search
+
+EXACT_COUNT_BELOW = 10000  # Tables estimated smaller than this are counted exactly
+COUNT_LIMIT = 10000  # Filtered changelists report at most this many results
+FILTER_CHOICES_TIMEOUT = 600
+FILTER_CHOICES_LIMIT = 500
+
+def estimated_count(queryset):
+    """Estimated rows in queryset's whole table, from planner statistics; None if unavailable"""
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute("SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s", [table])
+        elif connection.vendor == 'sqlite':
+            # SQLite keeps no row estimate; the largest rowid is an index seek and bounds the count
+            cursor.execute(f"SELECT max(rowid) FROM {connection.ops.quote_name(table)}")
+        else:
+            return None
+        row = cursor.fetchone()
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            estimate = estimated_count(self.object_list)
+            if estimate is not None and estimate >= EXACT_COUNT_BELOW: return estimate
+        # COUNT over a LIMITed subquery: stops scanning at COUNT_LIMIT matches
+        return self.object_list.order_by()[:COUNT_LIMIT].count()
+
+class CachedValuesFilter(admin.AllValuesFieldListFilter):
+    """AllValuesFieldListFilter with its choices (a DISTINCT over the column) cached for FILTER_CHOICES_TIMEOUT"""
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        super().__init__(field, request, params, model, model_admin, field_path)
+        key = f"admin-filter-choices:{model._meta.label_lower}:{field_path}"
+        choices = cache.get(key)
+        if choices is None:
+            choices = list(self.lookup_choices[:FILTER_CHOICES_LIMIT])
+            cache.set(key, choices, FILTER_CHOICES_TIMEOUT)
+        self.lookup_choices = choices
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False  # Would COUNT(*) the whole table on every filtered page
+    show_facets = admin.ShowFacets.NEVER  # A COUNT per filter choice
 
 @admin.register(Vehicle)
-class VehicleAdmin(admin.ModelAdmin):
-    list_display = ('year', 'make', 'model', 'vin', 'user', 'created_at')
-    list_filter = ('year', 'make', 'created_at')
+class VehicleAdmin(LargeTableAdmin):
+    list_display = ('year', 'make', 'model', 'vin', 'user', 'record_count', 'created_at')
+    list_filter = (('year', CachedValuesFilter), ('make', CachedValuesFilter), 'created_at')
+    list_select_related = ('user', 'summary')
     search_fields = ('vin', 'make', 'model', 'user__username')
+    autocomplete_fields = ('user',)
+    ordering = ('-id',)
+    actions = ['delete_vehicles']
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.action(description="Delete selected vehicles with their records", permissions=['delete'])
+    def delete_vehicles(self, request, queryset):
+        if request.POST.get('post') == 'yes':
+            total, counts = deletion.delete_vehicles(queryset)
+            self.message_user(request, f"Deleted {counts.get(Vehicle._meta.label, 0)} vehicles ({total} rows)")
+            return None
+        # Record counts come from the summaries rather than a COUNT over the records
+        summaries = VehicleSummary.objects.filter(vehicle__in=queryset.values('pk'))
+        return TemplateResponse(request, 'admin/api/vehicle/delete_vehicles.html', {
+            **self.admin_site.each_context(request),
+            'title': "Delete vehicles",
+            'opts': self.model._meta,
+            'vehicles': queryset[:20],
+            'vehicle_count': queryset.count(),
+            'record_count': summaries.aggregate(n=Sum('record_count'))['n'] or 0,
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+            'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across', '0'),
+        })
+
+    @admin.display(description="Records")
+    def record_count(self, vehicle):
+        summary = getattr(vehicle, 'summary', None)  # Maintained by summaries.py
+        return summary.record_count if summary else None
+
+    def get_search_results(self, request, queryset, search_term):
+        vin = normalize_vin(search_term)
+        if vin and validate_vin(vin) is None: return queryset.filter(vin=vin), False
+        return super().get_search_results(request, queryset, search_term)
 
 @admin.register(ServiceRecord)
-class ServiceRecordAdmin(admin.ModelAdmin):
+class ServiceRecordAdmin(LargeTableAdmin):
     list_display = ('service_type', 'vehicle', 'date', 'mileage', 'cost')
-    list_filter = ('service_type', 'date', 'vehicle__make')
-    search_fields = ('description', 'vehicle__vin', 'shop_name')
-    date_hierarchy = 'date'
+    # date_hierarchy is left out: it runs MIN/MAX and a DISTINCT over the dates of every record
+    list_filter = ('service_type', 'date', ('vehicle__make', CachedValuesFilter))
+    search_fields = ('description', 'notes', 'shop_name', 'vehicle__vin')
+    search_help_text = "Words in the description, notes, shop or attachment titles, or a VIN"
+    autocomplete_fields = ('vehicle',)
+    ordering = ('-id',)
+
+    def get_queryset(self, request):
+        # __str__ shows the vehicle: joined for the changelist and the autocomplete widgets alike
+        return super().get_queryset(request).select_related('vehicle')
+
+    def get_search_results(self, request, queryset, search_term):
+        vin = normalize_vin(search_term)
+        if vin and validate_vin(vin) is None: return queryset.filter(vehicle__vin=vin), False
+        matching = search.filter_matching(queryset, search_term)
+        if matching is not None: return matching, False
+        return super().get_search_results(request, queryset, search_term)
 
 @admin.register(Attachment)
-class AttachmentAdmin(admin.ModelAdmin):
+class AttachmentAdmin(LargeTableAdmin):
     list_display = ('title', 'attachment_type', 'service_record', 'uploaded_at')
     list_filter = ('attachment_type', 'uploaded_at')
+    list_select_related = ('service_record__vehicle',)
     search_fields = ('title', 'service_record__description')
+    autocomplete_fields = ('service_record',)
+
+@admin.register(Job)
+class JobAdmin(LargeTableAdmin):
+    list_display = ('task', 'status', 'priority', 'attempts', 'run_after', 'locked_by', 'created_at')
+    list_filter = ('status', ('task', CachedValuesFilter))
+    readonly_fields = ('last_error', 'locked_by', 'locked_at', 'created_at')
+    actions = ['retry_now']
+
+    @admin.action(description="Retry selected jobs now")
+    def retry_now(self, request, queryset):
+        now, retry = timezone.now(), queryset.exclude(status=Job.RUNNING)
+        count = retry.filter(unique_key='').update(status=Job.QUEUED, attempts=0, run_after=now)
+        skipped = 0
+        # At most one job per unique_key is queued (job_unique_queued): one whose key already is stays as it is
+        for pk in retry.exclude(unique_key='').order_by('pk').values_list('pk', flat=True):
+            try:
+                with transaction.atomic():
+                    Job.objects.filter(pk=pk).update(status=Job.QUEUED, attempts=0, run_after=now)
+                count += 1
+            except IntegrityError:
+                skipped += 1
+        if skipped:
+            self.message_user(request, f"{count} jobs queued, {skipped} skipped: a job with the same key is already queued",
+                              messages.WARNING)
+        else:
+            self.message_user(request, f"{count} jobs queued")
@@ -1,6 +1,12 @@
-# autologx/api/apps.py
 from django.apps import AppConfig
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'autologx.api'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (registers the model signal receivers)
+        from . import tasks  # noqa: F401  (registers the background job tasks)
+        # Map the offline VIN index once per process (no-op if it has not been built)
+        from .vin_index import load_index
+        load_index()
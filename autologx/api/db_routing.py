@@ -0,0 +1,119 @@
+# AutoLogX/autologx/api/db_routing.py
+"""
+Primary/replica database routing (replicas are the replicaN aliases from DATABASE_REPLICAS).
+Writes, and reads outside replica_reads(), go to 'default'. ReplicaRoutingMiddleware
+sends the reads of GET/HEAD requests for DATABASE_ROUTING['REPLICA_VIEWS'] to one
+replica chosen per request (streamed bodies included), except that reads stay on
+the primary:
+- for a client that wrote within PIN_SECONDS: every other request sets a cookie that
+  pins it to the primary, so it reads its own writes despite replication lag
+- inside a transaction on the primary (read-after-write within a request)
+- for PRIMARY_MODELS (sessions: a fresh login must never look logged out)
+Replicas are filled by replication, never migrated or written by Django. Locally,
+DATABASE_REPLICAS=/path/replica.sqlite3 and `manage.py sync_sqlite_replicas` stand in.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PRIMARY_MODELS = frozenset({'sessions.session'})
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_replica = ContextVar('db_replica', default=None)
+
+def routing_config():
+    config = getattr(settings, 'DATABASE_ROUTING', {})
+    return {
+        'replica_views': frozenset(config.get('REPLICA_VIEWS', ())),
+        'pin_seconds': config.get('PIN_SECONDS', 10),
+        'pin_cookie': config.get('PIN_COOKIE', 'db_primary'),
+    }
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith('replica')]
+
+def current_replica():
+    """The replica alias reads are going to right now, or None"""
+    return _replica.get()
+
+@contextmanager
+def replica_reads(alias=None):
+    """Send reads in this block to a replica (alias, or a random one); a no-op without replicas"""
+    replicas = replica_aliases()
+    previous = _replica.get()
+    if replicas: _replica.set(alias or random.choice(replicas))
+    try:
+        yield _replica.get()
+    finally:
+        # set(), not reset(): also correct when a streamed body resumes in another context
+        _replica.set(previous)
+
+def _streamed_from(alias, iterable):
+    with replica_reads(alias):
+        yield from iterable
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _replica.get()
+        if alias is None or model._meta.label_lower in PRIMARY_MODELS: return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block: return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # Every alias holds the same data
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+class ReplicaRoutingMiddleware:
+    """Picks the replica in process_view, once the URL name is known; a no-op without replicas"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = routing_config()
+        self.replicas = replica_aliases()
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async: markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async: return self.__acall__(request)
+        previous = _replica.get()
+        try:
+            response = self.get_response(request)
+        finally:
+            _replica.set(previous)
+        return self.finish(request, response)
+
+    async def __acall__(self, request):
+        previous = _replica.get()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _replica.set(previous)
+        return self.finish(request, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not self.replicas or request.method not in ('GET', 'HEAD'): return None
+        if request.resolver_match.url_name not in self.config['replica_views']: return None
+        if self.config['pin_cookie'] in request.COOKIES: return None
+        request.db_replica = random.choice(self.replicas)
+        _replica.set(request.db_replica)
+        return None
+
+    def finish(self, request, response):
+        if not self.replicas: return response
+        alias = getattr(request, 'db_replica', None)
+        if alias and response.streaming and not response.is_async:
+            response.streaming_content = _streamed_from(alias, response.streaming_content)
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(self.config['pin_cookie'], '1', max_age=self.config['pin_seconds'],
+                                httponly=True, samesite='Lax', secure=request.is_secure())
+        return response
@@ -0,0 +1,112 @@
+# AutoLogX/autologx/api/deletion.py
+"""
+Set-based deletion of vehicles with everything under them.
+Model.delete() has Django's collector load every service record and attachment and
+send signals row by row. delete_vehicles() runs one DELETE per table (attachments,
+rollups, summaries, odometer readings and samples, service records, vehicles) per
+batch of vehicles, all in one transaction, and does what those signals would have done, set-wise:
+- blob reference counts drop by the number of deleted attachments per blob, so
+  gc_attachment_blobs collects the unreferenced ones (and their thumbnails)
+- the read caches of the owners and vehicles are invalidated
+- the vehicles' media directories (vehicles/<id>/: files uploaded before
+  content-addressed storage, and their thumbnails) are queued for the
+  sweep_vehicle_media task, queued in the same transaction
+The search index follows through its triggers.
+"""
+import logging
+import os
+from collections import defaultdict
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from .models import (Vehicle, ServiceRecord, VehicleSummary, MonthlyRollup, OdometerReading, OdometerSample,
+                     Attachment, StoredBlob)
+from .query_cache import query_cache
+from .storage import is_blob_name
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+def vehicle_media_prefix(vehicle_id):
+    """Storage prefix of a vehicle's files (attachment_upload_path)"""
+    return f"vehicles/{vehicle_id}/"
+
+def _raw_delete(queryset):
+    # A single DELETE ... WHERE, without the collector (no signals, no cascades)
+    return queryset._raw_delete(queryset.db)
+
+def _release_blobs(attachments):
+    """Drop blob reference counts by the number of attachments about to be deleted"""
+    by_count = defaultdict(list)
+    for name, n in attachments.order_by().values_list('file').annotate(n=Count('id')):
+        if is_blob_name(name): by_count[n].append(name)
+    now = timezone.now()
+    for n, names in by_count.items():
+        StoredBlob.objects.filter(name__in=names).update(ref_count=F('ref_count') - n, updated_at=now)
+
+def delete_vehicles(vehicles):
+    """
+    Delete vehicles (a queryset) with their service records, attachments, summaries,
+    rollups and odometer series; returns the number of deleted rows per model label, like QuerySet.delete()
+    """
+    from . import jobs, tasks
+    counts = defaultdict(int)
+    with transaction.atomic():
+        rows = list(vehicles.select_for_update().order_by('pk').values_list('pk', 'user_id'))
+        for start in range(0, len(rows), BATCH_SIZE):
+            ids = [pk for pk, _ in rows[start:start + BATCH_SIZE]]
+            attachments = Attachment.objects.filter(service_record__vehicle_id__in=ids)
+            _release_blobs(attachments)
+            counts[Attachment._meta.label] += _raw_delete(attachments)
+            for model in (MonthlyRollup, VehicleSummary, OdometerReading, OdometerSample, ServiceRecord):
+                counts[model._meta.label] += _raw_delete(model.objects.filter(vehicle_id__in=ids))
+            counts[Vehicle._meta.label] += _raw_delete(Vehicle.objects.filter(pk__in=ids))
+            jobs.enqueue(tasks.sweep_vehicle_media, vehicle_ids=ids)
+        query_cache.invalidate(user_ids={user_id for _, user_id in rows}, vehicle_ids=[pk for pk, _ in rows])
+    counts = {label: n for label, n in counts.items() if n}
+    logger.info(f"Deleted {len(rows)} vehicles: {counts}")
+    return sum(counts.values()), counts
+
+def _is_referenced(name, referenced):
+    # Thumbnails/previews are named <file>.<variant>.<ext> (thumbnails.derivative_prefix)
+    return name in referenced or name.rsplit('.', 2)[0] in referenced
+
+def sweep_directory(prefix, referenced, older_than=None, dry_run=False):
+    """
+    Delete the files under prefix that are not in referenced (nor derivatives of one),
+    then the directories left empty; files modified after older_than (a timestamp) are
+    kept. Returns the number of files deleted.
+    """
+    root = default_storage.path(prefix)
+    removed = 0
+    for directory, _, files in os.walk(root, topdown=False):
+        for filename in files:
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, default_storage.location).replace(os.sep, '/')
+            if _is_referenced(name, referenced): continue
+            try:
+                if older_than is not None and os.path.getmtime(path) >= older_than: continue
+                if not dry_run: os.remove(path)
+            except FileNotFoundError:
+                continue
+            removed += 1
+        if not dry_run:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass  # Not empty
+    return removed
+
+def sweep_vehicle_media(vehicle_ids):
+    """Delete the directories of deleted vehicles, keeping any file an Attachment still references"""
+    existing = set(Vehicle.objects.filter(pk__in=vehicle_ids).values_list('pk', flat=True))  # A deletion that rolled back
+    prefixes = [vehicle_media_prefix(pk) for pk in sorted(set(vehicle_ids) - existing)]
+    prefixes = [prefix for prefix in prefixes if os.path.isdir(default_storage.path(prefix))]
+    if not prefixes: return 0
+    # Attachments moved to another vehicle's record keep their file name
+    moved = Q()
+    for prefix in prefixes: moved |= Q(file__startswith=prefix)
+    referenced = set(Attachment.objects.filter(moved).values_list('file', flat=True))
+    return sum(sweep_directory(prefix, referenced) for prefix in prefixes)
@@ -0,0 +1,136 @@
+# AutoLogX/autologx/api/downloads.py
+"""
+Serving stored files to their (already authorized) owner.
+serve_file() answers conditional requests (ETag/Last-Modified -> 304) itself, then
+either hands the transfer to the web server (ATTACHMENT_DOWNLOADS['SENDFILE']:
+'x-accel-redirect' for nginx, 'x-sendfile' for Apache/lighttpd), which also handles
+Range, or streams it with FileResponse. There, single byte ranges are answered with
+206 and the file is passed on still open, so WSGI servers with wsgi.file_wrapper
+(gunicorn, uWSGI) send it with sendfile() rather than through Python.
+"""
+import io
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+# Shown in the browser when asked to; anything else (HTML, SVG, ...) is always a download
+INLINE_TYPES = ('image/jpeg', 'image/png', 'image/gif', 'image/webp', 'application/pdf', 'text/plain')
+INLINE_PREFIXES = ('video/', 'audio/')
+RANGE_RE = re.compile(r'\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*', re.IGNORECASE)
+
+def download_config():
+    config = getattr(settings, 'ATTACHMENT_DOWNLOADS', {})
+    return {
+        'sendfile': (config.get('SENDFILE') or '').lower(),
+        'accel_prefix': config.get('ACCEL_PREFIX', '/protected-media/'),
+    }
+
+def file_etag(stat):
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single 'bytes=' range of a size-byte file
+    None to ignore the header (malformed, or several ranges: the full file is sent);
+    raises ValueError if the range is unsatisfiable.
+    """
+    match = RANGE_RE.fullmatch(header or '')
+    if not match or not any(match.groups()): return None
+    first, last = match.groups()
+    if not first:  # bytes=-N: the last N bytes
+        if int(last) == 0 or size == 0: raise ValueError("Empty suffix range")
+        return max(0, size - int(last)), size - 1
+    start, end = int(first), int(last) if last else size - 1
+    if start >= size: raise ValueError("Range starts beyond the end of the file")
+    if end < start: return None
+    return start, min(end, size - 1)
+
+def _if_range_matches(request, etag, last_modified):
+    if_range = request.headers.get('If-Range')
+    if not if_range: return True
+    if if_range.startswith(('"', 'W/')): return if_range == etag  # Strong comparison only
+    return parse_http_date_safe(if_range) == last_modified
+
+class FileRange(io.RawIOBase):
+    """
+    bytes start..end (inclusive) of an open file, for FileResponse
+    Reads stop at end; fileno() lets wsgi.file_wrapper sendfile() from the current
+    offset for Content-Length bytes. Seeking to the end lands on end + 1, so
+    FileResponse computes the range length as Content-Length.
+    """
+
+    def __init__(self, file, start, end):
+        self.file, self.end = file, end + 1
+        self.name = getattr(file, 'name', '')
+        file.seek(start)
+
+    def readable(self): return True
+    def seekable(self): return True
+    def fileno(self): return self.file.fileno()
+    def tell(self): return self.file.tell()
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_END: offset, whence = self.end + offset, io.SEEK_SET
+        return self.file.seek(offset, whence)
+
+    def read(self, size=-1):
+        remaining = max(0, self.end - self.file.tell())
+        return self.file.read(remaining if size is None or size < 0 else min(size, remaining))
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+def serve_file(request, path, name, filename='', content_type=None, as_attachment=False, cache_control='private, no-cache'):
+    """
+    Response for the file at path (its storage name is name), honouring conditional and Range headers
+    Raises FileNotFoundError if it is missing.
+    """
+    stat = os.stat(path)
+    etag, last_modified = file_etag(stat), int(stat.st_mtime)
+    content_type = content_type or mimetypes.guess_type(filename or path)[0] or 'application/octet-stream'
+    if not (content_type in INLINE_TYPES or content_type.startswith(INLINE_PREFIXES)): as_attachment = True
+
+    def finish(response):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = cache_control
+        response['Accept-Ranges'] = 'bytes'
+        response['X-Content-Type-Options'] = 'nosniff'
+        return response
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None: return finish(not_modified)
+
+    config = download_config()
+    if config['sendfile']:
+        # The web server reads the file (and handles Range); Python only authorized the request
+        response = HttpResponse(content_type=content_type)
+        response['Content-Disposition'] = content_disposition_header(as_attachment, os.path.basename(filename or path))
+        if config['sendfile'] == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = config['accel_prefix'].rstrip('/') + '/' + quote(name)
+        else:
+            response['X-Sendfile'] = path
+        return finish(response)
+
+    byte_range = None
+    if 'Range' in request.headers and _if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range(request.headers['Range'], stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f"bytes */{stat.st_size}"
+            return finish(response)
+    file = open(path, 'rb')
+    if byte_range is None:
+        return finish(FileResponse(file, content_type=content_type, as_attachment=as_attachment, filename=filename))
+    start, end = byte_range
+    response = FileResponse(FileRange(file, start, end), status=206, content_type=content_type,
+                            as_attachment=as_attachment, filename=filename)
+    response['Content-Range'] = f"bytes {start}-{end}/{stat.st_size}"
+    return finish(response)
@@ -0,0 +1,94 @@
+# AutoLogX/autologx/api/exports.py
+"""
+Streaming CSV/JSONL export of service history joined to its vehicle.
+Rows come from values_list(...).iterator(chunk_size), so no model instances are
+built and only one chunk is in memory; output is yielded in blocks of
+EXPORT_CHUNK_SIZE rows, so the first bytes leave before the query finishes. That
+needs rows to come off an index in export order: the query must not end in a sort.
+CSV cells that a spreadsheet would read as a formula are prefixed with a quote.
+"""
+import csv
+import io
+import json
+from datetime import date
+from django.core.exceptions import ValidationError
+from django.db.models.functions import Lower
+from .models import ServiceRecord
+
+EXPORT_CHUNK_SIZE = 2000
+
+# (output column, ORM lookup)
+EXPORT_COLUMNS = [
+    ('id', 'id'), ('vin', 'vehicle__vin'), ('year', 'vehicle__year'), ('make', 'vehicle__make'),
+    ('model', 'vehicle__model'), ('vehicle_id', 'vehicle_id'), ('service_type', 'service_type'),
+    ('date', 'date'), ('mileage', 'mileage'), ('description', 'description'), ('cost', 'cost'),
+    ('shop_name', 'shop_name'), ('notes', 'notes'), ('next_service_date', 'next_service_date'),
+    ('next_service_mileage', 'next_service_mileage'), ('created_at', 'created_at'),
+]
+EXPORT_CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'jsonl': 'application/x-ndjson; charset=utf-8'}
+
+def export_queryset(records, params):
+    """
+    Narrow records by the request filters: vehicle, service_type, date_from, date_to (ISO dates)
+    Raises ValidationError on malformed values.
+    """
+    vehicle = params.get('vehicle')
+    if vehicle:
+        if not vehicle.isdigit(): raise ValidationError("vehicle must be a vehicle id")
+        records = records.filter(vehicle_id=int(vehicle))
+    service_type = params.get('service_type')
+    if service_type:
+        if service_type not in dict(ServiceRecord.SERVICE_TYPES): raise ValidationError(f"Unknown service_type '{service_type}'")
+        # Compared through an expression so the planner cannot pick the (service_type, date)
+        # index: its rows come out of export order and would all be sorted before streaming
+        records = records.alias(service_type_key=Lower('service_type')).filter(service_type_key=service_type)
+    for param, lookup in (('date_from', 'date__gte'), ('date_to', 'date__lte')):
+        value = params.get(param)
+        if not value: continue
+        try:
+            records = records.filter(**{lookup: date.fromisoformat(value)})
+        except ValueError:
+            raise ValidationError(f"{param} must be a YYYY-MM-DD date")
+    # Vehicle by vehicle in date order: a backward scan of the (vehicle, -date, -id) index
+    return records.order_by('-vehicle_id', 'date', 'id').values_list(*[lookup for _, lookup in EXPORT_COLUMNS])
+
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+def _text(value):
+    if value is None: return ''
+    if isinstance(value, str):
+        # A leading =, +, -, @ makes spreadsheets evaluate the cell (CSV injection)
+        return "'" + value if value.startswith(FORMULA_PREFIXES) else value
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+def _json_value(value):
+    # Dates and datetimes as ISO 8601, Decimals as exact strings
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+def stream_csv(rows):
+    yield ','.join(name for name, _ in EXPORT_COLUMNS) + '\r\n'
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for block in _blocks(rows):
+        writer.writerows([[_text(v) for v in row] for row in block])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+def stream_jsonl(rows):
+    names = [name for name, _ in EXPORT_COLUMNS]
+    encoder = json.JSONEncoder(default=_json_value, ensure_ascii=False)
+    for block in _blocks(rows):
+        yield ''.join(encoder.encode(dict(zip(names, row))) + '\n' for row in block)
+
+def stream_export(rows, fmt):
+    return stream_jsonl(rows) if fmt == 'jsonl' else stream_csv(rows)
+
+def _blocks(rows):
+    block = []
+    for row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        block.append(row)
+        if len(block) >= EXPORT_CHUNK_SIZE:
+            yield block
+            block = []
+    if block: yield block
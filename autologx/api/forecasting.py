@@ -0,0 +1,213 @@
+# AutoLogX/autologx/api/forecasting.py
+"""
+Fleet-wide maintenance forecasting.
+Service history is streamed from the database straight into NumPy arrays (no model
+instances), each vehicle's daily mileage rate is fitted with a least-squares line
+computed for all vehicles at once from grouped sums (np.bincount), and every
+(vehicle, service type) pair is projected to its next due date by mileage and by
+time. A fleet of 100k vehicles is a handful of array passes, not 100k ORM loops.
+"""
+import logging
+from datetime import date
+import numpy as np
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Coalesce
+from .models import Vehicle, ServiceRecord
+
+logger = logging.getLogger(__name__)
+
+# Default intervals per service type: miles and/or days between services (None = not scheduled)
+DEFAULT_INTERVALS = {
+    'oil_change': {'miles': 5000, 'days': 182},
+    'tire_rotation': {'miles': 7500, 'days': 182},
+    'brake_service': {'miles': 30000, 'days': 730},
+    'inspection': {'miles': None, 'days': 365},
+}
+# Used when a vehicle has too little history to fit a rate (~13,500 miles/year)
+DEFAULT_DAILY_MILES = 37.0
+
+SERVICE_TYPE_KEYS = [key for key, _ in ServiceRecord.SERVICE_TYPES]
+SERVICE_TYPE_LABELS = dict(ServiceRecord.SERVICE_TYPES)
+_EPOCH = np.datetime64('1970-01-01', 'D')
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+def get_intervals():
+    return getattr(settings, 'MAINTENANCE_INTERVALS', DEFAULT_INTERVALS)
+
+def _day_number(d):
+    return d.toordinal() - _EPOCH_ORDINAL
+
+def _fetch_chunks(queryset, fields, chunk_size):
+    """Yield lists of raw DB rows for queryset.values_list(*fields), bypassing model/value conversion."""
+    alias = router.db_for_read(queryset.model)
+    sql, params = queryset.values_list(*fields).query.sql_with_params()
+    with connections[alias].cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows: break
+            yield rows
+
+def _to_days(values):
+    """ISO date strings -> int32 days since 1970-01-01."""
+    return (np.array(values).astype('datetime64[D]') - _EPOCH).astype(np.int32)
+
+class FleetHistory:
+    """Column arrays of a fleet's service history plus per-vehicle current odometer readings."""
+
+    def __init__(self, vehicles=None, chunk_size=50000):
+        vehicles = vehicles if vehicles is not None else Vehicle.objects.all()
+        # current_mileage is taken as an odometer reading on the day the vehicle was last updated
+        vehicle_rows = [row for rows in _fetch_chunks(
+            vehicles.order_by('pk').annotate(updated_text=Cast('updated_at', CharField())),
+            ('pk', 'current_mileage', 'updated_text'), chunk_size) for row in rows]
+        ids, current_mileage, updated = zip(*vehicle_rows) if vehicle_rows else ((), (), ())
+        self.vehicle_ids = np.array(ids, dtype=np.int64)
+        self.current_mileage = np.array(current_mileage, dtype=np.float64)
+        self.current_day = _to_days(np.array(updated, dtype=str).astype('U10')) if updated else np.empty(0, np.int32)
+        type_keys = np.array(sorted(SERVICE_TYPE_KEYS))
+        type_code_of_sorted = np.array([SERVICE_TYPE_KEYS.index(k) for k in type_keys], dtype=np.int8)
+        columns = {'vehicle': [], 'day': [], 'mileage': [], 'type': [], 'next_day': [], 'next_mileage': []}
+        records = ServiceRecord.objects.all() if not vehicles.query.where else ServiceRecord.objects.filter(vehicle__in=vehicles.order_by())
+        records = records.order_by().annotate(
+            # Dates as ISO text and NULLs as sentinels, so rows arrive as plain strings/ints that
+            # NumPy converts in bulk (no per-row date parsing by the DB adapter)
+            date_text=Cast('date', CharField()),
+            next_date_text=Coalesce(Cast('next_service_date', CharField()), Value('NaT')),
+            next_mileage_value=Coalesce('next_service_mileage', Value(-1)),
+        )
+        fields = ('vehicle_id', 'date_text', 'mileage', 'service_type', 'next_date_text', 'next_mileage_value')
+        for rows in _fetch_chunks(records, fields, chunk_size):
+            vid, day, mileage, stype, next_date, next_mileage = zip(*rows)
+            columns['vehicle'].append(np.array(vid, dtype=np.int64))
+            columns['day'].append(_to_days(day))
+            columns['mileage'].append(np.array(mileage, dtype=np.float64))
+            stype = np.array(stype)
+            position = np.minimum(np.searchsorted(type_keys, stype), len(type_keys) - 1)
+            columns['type'].append(np.where(type_keys[position] == stype, type_code_of_sorted[position], -1).astype(np.int8))
+            # NaT / NaN mark "not set"
+            columns['next_day'].append(np.array(next_date).astype('datetime64[D]'))
+            next_mileage = np.array(next_mileage, dtype=np.float64)
+            columns['next_mileage'].append(np.where(next_mileage < 0, np.nan, next_mileage))
+        def concat(name, dtype):
+            return np.concatenate(columns[name]) if columns[name] else np.empty(0, dtype=dtype)
+        # Map vehicle ids to dense 0..n-1 indexes so per-vehicle sums are bincounts;
+        # drop records of vehicles created after the vehicle list was read
+        raw_vehicle = concat('vehicle', np.int64)
+        position = np.minimum(np.searchsorted(self.vehicle_ids, raw_vehicle), max(len(self.vehicle_ids) - 1, 0))
+        known = self.vehicle_ids[position] == raw_vehicle if len(self.vehicle_ids) else np.zeros(len(raw_vehicle), bool)
+        self.vehicle = position[known].astype(np.int64)
+        self.day = concat('day', np.int32)[known]
+        self.mileage = concat('mileage', np.float64)[known]
+        self.type = concat('type', np.int8)[known]
+        next_day = concat('next_day', 'datetime64[D]')[known]
+        self.next_day = np.where(np.isnat(next_day), -1, (next_day - _EPOCH).astype(np.int64)).astype(np.int64)
+        self.next_mileage = concat('next_mileage', np.float64)[known]
+
+    def __len__(self):
+        return len(self.day)
+
+def daily_mileage_rates(history, default_rate=DEFAULT_DAILY_MILES):
+    """
+    Least-squares slope of mileage over days for every vehicle at once
+    Uses every service record plus the vehicle's current odometer reading. Vehicles
+    with fewer than two distinct days or a non-positive slope get default_rate.
+    """
+    n_vehicles = len(history.vehicle_ids)
+    vehicle = np.concatenate([history.vehicle, np.arange(n_vehicles)])
+    # Center days per fit to keep the sums well conditioned
+    x = np.concatenate([history.day, history.current_day]).astype(np.float64) - 18000.0
+    y = np.concatenate([history.mileage, history.current_mileage])
+    has_reading = np.concatenate([np.ones(len(history), bool), history.current_mileage > 0])
+    vehicle, x, y = vehicle[has_reading], x[has_reading], y[has_reading]
+    n = np.bincount(vehicle, minlength=n_vehicles).astype(np.float64)
+    sx = np.bincount(vehicle, x, n_vehicles)
+    sy = np.bincount(vehicle, y, n_vehicles)
+    sxx = np.bincount(vehicle, x * x, n_vehicles)
+    sxy = np.bincount(vehicle, x * y, n_vehicles)
+    denominator = n * sxx - sx * sx
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (n * sxy - sx * sy) / denominator
+    valid = (n >= 2) & (denominator > 1e-9) & np.isfinite(slope) & (slope > 0)
+    return np.where(valid, slope, default_rate)
+
+def forecast(vehicles=None, horizon_days=30, today=None, intervals=None, default_rate=DEFAULT_DAILY_MILES, history=None, limit=None):
+    """
+    Project the next due date of every scheduled service for every vehicle
+    A service is due at the earlier of: last service mileage + interval miles (reached
+    at the fitted daily rate) and last service date + interval days. A record's own
+    next_service_date/next_service_mileage override the intervals when set.
+    Returns a list of dicts for services due within horizon_days (overdue included),
+    soonest first, at most limit of them if given.
+    """
+    history = history if history is not None else FleetHistory(vehicles)
+    intervals = intervals or get_intervals()
+    today = today or date.today()
+    today_day = _day_number(today)
+    n_vehicles, n_types = len(history.vehicle_ids), len(SERVICE_TYPE_KEYS)
+    if not n_vehicles or not len(history): return []
+    rate = daily_mileage_rates(history, default_rate)
+
+    # Estimated odometer today: extrapolate from the newest reading, never below the current reading
+    last_obs_day = np.full(n_vehicles, np.iinfo(np.int32).min, dtype=np.int64)
+    np.maximum.at(last_obs_day, history.vehicle, history.day)
+    max_mileage = np.zeros(n_vehicles)
+    np.maximum.at(max_mileage, history.vehicle, history.mileage)
+    newest_day = np.maximum(last_obs_day, history.current_day)
+    newest_mileage = np.maximum(max_mileage, history.current_mileage)
+    est_mileage = newest_mileage + rate * np.maximum(today_day - newest_day, 0)
+
+    # Last record per (vehicle, type): sort by (key, day, mileage) and take the last of each key
+    valid = history.type >= 0
+    key = history.vehicle[valid] * n_types + history.type[valid]
+    order = np.lexsort((history.mileage[valid], history.day[valid], key))
+    key_sorted = key[order]
+    last = order[np.append(np.flatnonzero(np.diff(key_sorted)), len(key_sorted) - 1)] if len(key_sorted) else order
+    idx = np.flatnonzero(valid)[last]
+    v, t = history.vehicle[idx], history.type[idx].astype(np.int64)
+    last_day, last_mileage = history.day[idx].astype(np.int64), history.mileage[idx]
+
+    interval_miles = np.array([(intervals.get(k) or {}).get('miles') or np.nan for k in SERVICE_TYPE_KEYS], dtype=np.float64)[t]
+    interval_days = np.array([(intervals.get(k) or {}).get('days') or -1 for k in SERVICE_TYPE_KEYS], dtype=np.int64)[t]
+    due_mileage = np.where(np.isnan(history.next_mileage[idx]), last_mileage + interval_miles, history.next_mileage[idx])
+    due_by_date = np.where(history.next_day[idx] >= 0, history.next_day[idx], np.where(interval_days > 0, last_day + interval_days, -1))
+    with np.errstate(invalid='ignore'):
+        due_by_mileage = np.where(np.isnan(due_mileage), -1, today_day + np.ceil((due_mileage - est_mileage[v]) / rate[v])).astype(np.int64)
+    # Services with neither a mileage nor a time interval stay at "never" and are dropped
+    never = np.iinfo(np.int64).max
+    due_day = np.minimum(np.where(np.isnan(due_mileage), never, due_by_mileage), np.where(due_by_date >= 0, due_by_date, never))
+    selected = np.flatnonzero((due_day != never) & (due_day <= today_day + horizon_days))
+    selected = selected[np.argsort(due_day[selected], kind='stable')]
+
+    if limit: selected = selected[:limit]
+
+    # Materialize only the selected rows, converting whole columns at once
+    vi, ti = v[selected], t[selected]
+    by_mileage = ~np.isnan(due_mileage[selected]) & (due_day[selected] == due_by_mileage[selected])
+    columns = zip(
+        history.vehicle_ids[vi].tolist(), ti.tolist(),
+        (due_day[selected] + _EPOCH).astype('datetime64[D]').tolist(),
+        (due_day[selected] - today_day).tolist(),
+        np.where(np.isnan(due_mileage[selected]), -1, due_mileage[selected]).astype(np.int64).tolist(),
+        est_mileage[vi].astype(np.int64).tolist(), np.round(rate[vi], 1).tolist(), by_mileage.tolist(),
+        (last_day[selected] + _EPOCH).astype('datetime64[D]').tolist(), last_mileage[selected].astype(np.int64).tolist(),
+    )
+    results = []
+    for vehicle_id, type_code, due_date, days_until, due_miles, est_miles, daily_miles, mileage_first, last_date, last_miles in columns:
+        service_type = SERVICE_TYPE_KEYS[type_code]
+        results.append({
+            'vehicle_id': vehicle_id,
+            'service_type': service_type,
+            'service_type_display': SERVICE_TYPE_LABELS[service_type],
+            'due_date': due_date,
+            'days_until_due': days_until,
+            'due_mileage': None if due_miles < 0 else due_miles,
+            'estimated_mileage': est_miles,
+            'daily_miles': daily_miles,
+            'due_by': 'mileage' if mileage_first else 'date',
+            'last_service_date': last_date,
+            'last_service_mileage': last_miles,
+        })
+    return results
@@ -0,0 +1,238 @@
+# AutoLogX/autologx/api/importers.py
+"""
+Streaming import of service history from CSV or JSONL.
+Rows are read one at a time, cleaned with ServiceRecordForm's field definitions
+(no form per row), matched to a vehicle through a VIN -> id dict loaded up front,
+and written with bulk_create in chunked transactions, so memory stays flat no
+matter how large the file is. Each chunk's transaction also applies its records
+to the vehicle summaries and monthly rollups (records_added), since bulk_create sends no signals.
+"""
+import csv
+import json
+import logging
+import time
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from django import forms
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from .forms import ServiceRecordForm
+from .models import Vehicle, ServiceRecord
+from .services import normalize_vin
+from . import rollups
+from .summaries import records_added
+
+logger = logging.getLogger(__name__)
+
+MAX_REPORTED_ERRORS = 100
+
+class _Unusual(Exception):
+    """A value the fast path does not handle; field.clean decides"""
+
+class UnreadableInput(Exception):
+    """The file cannot be read from line_no on (not UTF-8, malformed CSV)"""
+
+    def __init__(self, line_no, message):
+        super().__init__(message)
+        self.line_no = line_no
+        self.message = message
+
+def fast_cleaner(field):
+    """
+    Return a callable equivalent to field.clean for the plain strings/numbers rows carry
+    The common case skips Field.clean's generic machinery (about 3x faster per row);
+    anything else, including every invalid value, goes through field.clean itself,
+    so accepted values and error messages are exactly the form's.
+    """
+    clean, required, validators = field.clean, field.required, field.validators
+    empty = getattr(field, 'empty_value', None)
+
+    if isinstance(field, forms.ChoiceField):
+        valid = {str(key) for key, _ in field.choices if key != ''}
+        def convert(value):
+            if value in valid: return value
+            raise _Unusual
+    elif isinstance(field, forms.CharField):
+        def convert(value):
+            if type(value) is not str: raise _Unusual
+            value = value.strip() if field.strip else value
+            if not value and required: raise _Unusual
+            return value
+    elif isinstance(field, forms.DateField):
+        def convert(value):
+            # Only the ISO form; date.fromisoformat also takes formats the form rejects
+            if type(value) is str and len(value) == 10 and value[4] == value[7] == '-':
+                return date.fromisoformat(value)
+            raise _Unusual
+    elif isinstance(field, forms.DecimalField):  # before IntegerField, its base class
+        def convert(value):
+            if type(value) not in (str, int): raise _Unusual
+            value = Decimal(value)
+            if not value.is_finite(): raise _Unusual
+            return value
+    elif isinstance(field, forms.IntegerField):
+        def convert(value):
+            if type(value) is int: return value
+            if type(value) is str and value.isdigit(): return int(value)
+            raise _Unusual
+    else:
+        return clean
+
+    def cleaned(value):
+        if value is None or value == '':
+            return empty if not required else clean(value)
+        try:
+            value = convert(value)
+            for validator in validators: validator(value)
+            return value
+        except (_Unusual, TypeError, ValueError, InvalidOperation, ValidationError):
+            return clean(value)
+    return cleaned
+
+# Built from the form's own fields: same required/choices/max_length rules as the web form
+IMPORT_CLEANERS = {name: fast_cleaner(ServiceRecordForm.base_fields[name]) for name in ServiceRecordForm._meta.fields}
+
+def detect_format(filename):
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+
+def iter_rows(stream, fmt):
+    """
+    Yield (line number, row dict) from a text stream of CSV (header row required) or JSONL
+    Rows that cannot be parsed are yielded as (line number, None); a stream that cannot
+    be read on raises UnreadableInput.
+    """
+    if fmt == 'jsonl':
+        for line_no, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line: continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                row = None
+            yield line_no, row if isinstance(row, dict) else None
+    else:
+        # strict: an unclosed quote is an error, not a field swallowing the rest of the file
+        reader = csv.reader(stream, strict=True)
+        start = 1  # First line of the row being read
+        try:
+            header = next(reader, None)
+            if header is None: return
+            header = [h.strip().lower() for h in header]
+            start = reader.line_num + 1
+            for row in reader:
+                # csv.reader counts physical lines, which differs from rows when fields hold newlines
+                if row: yield reader.line_num, dict(zip(header, row))
+                start = reader.line_num + 1
+        except csv.Error as e:
+            raise UnreadableInput(start, f"Malformed CSV: {e}") from e
+
+def text_stream(binary_file):
+    """
+    Decode an uploaded (binary) file lazily, line by line, so a line that is not UTF-8
+    raises UnreadableInput with its number; utf-8-sig drops the BOM Excel writes
+    """
+    for line_no, line in enumerate(binary_file, 1):
+        try:
+            yield line.decode('utf-8-sig' if line_no == 1 else 'utf-8')
+        except UnicodeDecodeError as e:
+            raise UnreadableInput(line_no, f"Not UTF-8 text ({e.reason} at byte {e.start + 1}); save the file as UTF-8") from e
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.failed = 0
+        self.errors = []   # First MAX_REPORTED_ERRORS of (line, message)
+        self.stopped_at = None  # Line the file became unreadable at; nothing from it on was imported
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def error(self, line_no, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS: self.errors.append((line_no, message))
+
+    def as_dict(self):
+        return {'rows': self.rows, 'created': self.created, 'failed': self.failed,
+                'errors': [{'line': line, 'error': message} for line, message in self.errors],
+                'stopped_at_line': self.stopped_at,
+                'seconds': round(self.elapsed, 3), 'rows_per_sec': round(self.rows_per_sec, 1)}
+
+class ServiceRecordImporter:
+    """
+    Import rows keyed by 'vin' into the given user's vehicles (all vehicles if user is None)
+    progress, if given, is called with the ImportResult after every chunk.
+    """
+
+    def __init__(self, user=None, chunk_size=2000, dry_run=False, progress=None):
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.progress = progress
+        vehicles = Vehicle.objects.exclude(vin=None).exclude(vin='')
+        if user is not None: vehicles = vehicles.filter(user=user)
+        self.vehicle_ids = dict(vehicles.values_list('vin', 'id').iterator(chunk_size=10000))
+
+    def clean_row(self, row):
+        """Return (model kwargs, None) or (None, error message)"""
+        vehicle_id = self.vehicle_ids.get(normalize_vin(row.get('vin') or ''))
+        if vehicle_id is None:
+            return None, f"Unknown VIN '{row.get('vin', '')}'"
+        data, problems = {'vehicle_id': vehicle_id}, []
+        for name, clean in IMPORT_CLEANERS.items():
+            value = row.get(name)
+            if isinstance(value, str): value = value.strip()
+            try:
+                data[name] = clean(value)
+            except ValidationError as e:
+                problems.append(f"{name}: {' '.join(e.messages)}")
+            except (TypeError, ValueError, AttributeError):
+                # Form fields expect strings; JSON can carry types they choke on
+                problems.append(f"{name}: Invalid value.")
+        if problems: return None, '; '.join(problems)
+        return data, None
+
+    def run(self, rows):
+        """
+        Import (line number, row dict) pairs, e.g. from iter_rows(); returns an ImportResult
+        Chunks commit as they fill, so if the file turns out unreadable partway the rows
+        before that line stay imported: the import stops there and reports the line
+        as an error and as stopped_at.
+        """
+        result = ImportResult()
+        chunk = []
+        try:
+            for line_no, row in rows:
+                result.rows += 1
+                if row is None:
+                    result.error(line_no, "Unparseable row")
+                    continue
+                data, error = self.clean_row(row)
+                if error:
+                    result.error(line_no, error)
+                    continue
+                chunk.append(ServiceRecord(**data))
+                if len(chunk) >= self.chunk_size:
+                    self._flush(chunk, result)
+                    chunk = []
+        except UnreadableInput as e:
+            result.rows += 1
+            result.error(e.line_no, f"{e.message}; the rest of the file was not imported")
+            result.stopped_at = e.line_no
+        if chunk: self._flush(chunk, result)
+        result.elapsed = time.perf_counter() - result.started
+        logger.info(f"Service record import: {result.created} created, {result.failed} failed "
+                    f"of {result.rows} rows in {result.elapsed:.1f}s ({result.rows_per_sec:.0f} rows/s)")
+        return result
+
+    def _flush(self, chunk, result):
+        if not self.dry_run:
+            with transaction.atomic():
+                ServiceRecord.objects.bulk_create(chunk)
+                records_added(chunk)
+                rollups.records_added(chunk)
+        result.created += len(chunk)
+        result.elapsed = time.perf_counter() - result.started
+        if self.progress: self.progress(result)
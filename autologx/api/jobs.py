@@ -0,0 +1,198 @@
+# AutoLogX/autologx/api/jobs.py
+"""
+Background jobs kept in the database, so slow work leaves the request without a broker.
+enqueue() inserts a Job row in the caller's transaction: a job whose request rolls
+back never runs, and one that commits is not lost. `manage.py run_workers` runs
+Worker loops that claim ready jobs, highest priority first:
+- with SELECT ... FOR UPDATE SKIP LOCKED where the database supports it (PostgreSQL),
+  so workers never block on each other's rows;
+- otherwise (SQLite) with a conditional UPDATE ... WHERE status='queued', which
+  exactly one worker can win.
+A failing job is retried with exponential backoff up to max_attempts; a job whose
+worker died is requeued when its lease (LEASE_SECONDS) runs out, so tasks must be
+safe to run twice. enqueue(unique_key=...) coalesces requests for the same work into
+one queued job. Tasks are functions of JSON-serializable keyword arguments,
+registered with @task (see tasks.py).
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+CLAIM_CANDIDATES = 10  # Rows tried per claim without row locks before giving up for this poll
+
+def queue_config():
+    config = getattr(settings, 'JOB_QUEUE', {})
+    return {
+        'poll_interval': config.get('POLL_INTERVAL', 1.0),
+        'lease_seconds': config.get('LEASE_SECONDS', 600),
+        'max_attempts': config.get('MAX_ATTEMPTS', 5),
+        'retry_backoff': config.get('RETRY_BACKOFF', 10.0),
+        'eager': config.get('EAGER', False),
+    }
+
+def task(name=None, priority=0, max_attempts=None):
+    """Register a function as a task; enqueue() takes the function or its name"""
+    def register(func):
+        func.task_name = name or func.__name__
+        func.priority = priority
+        func.max_attempts = max_attempts
+        TASKS[func.task_name] = func
+        return func
+    return register
+
+def enqueue(func, delay=0, priority=None, unique_key='', **kwargs):
+    """
+    Queue func(**kwargs) to run in a worker; returns the Job
+    With a unique_key, a job already queued under that key is returned instead of adding
+    one (a running one does not count: it may have started before the caller's changes).
+    That job stays locked until the caller's transaction commits, so no worker starts it
+    before the changes that asked for it are visible.
+    With JOB_QUEUE['EAGER'] (scripts, development without workers) it runs in this
+    process once the current transaction commits, and None is returned.
+    """
+    if isinstance(func, str): func = TASKS[func]
+    config = queue_config()
+    if config['eager']:
+        transaction.on_commit(lambda: func(**kwargs))
+        return None
+    job = Job(
+        task=func.task_name, kwargs=kwargs, unique_key=unique_key,
+        priority=func.priority if priority is None else priority,
+        max_attempts=func.max_attempts or config['max_attempts'],
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+    if not unique_key:
+        job.save()
+        return job
+    queued = Job.objects.select_for_update().filter(unique_key=unique_key, status=Job.QUEUED)
+    with transaction.atomic():
+        existing = queued.first()
+        if existing is not None: return existing
+        try:
+            with transaction.atomic():
+                job.save()
+                return job
+        except IntegrityError:
+            return queued.first()  # Queued concurrently (or claimed since, then None)
+
+def _ready(now):
+    return Job.objects.filter(status=Job.QUEUED, run_after__lte=now).order_by('-priority', 'run_after', 'id')
+
+def claim(worker_name):
+    """Mark the next ready job as running for worker_name and return it, or None"""
+    now = timezone.now()
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = _ready(now).select_for_update(skip_locked=True).first()
+            if job is None: return None
+            job.status, job.locked_by, job.locked_at, job.attempts = Job.RUNNING, worker_name, now, job.attempts + 1
+            job.save(update_fields=['status', 'locked_by', 'locked_at', 'attempts'])
+            return job
+    # No row locks (SQLite): the UPDATE is atomic, so a job another worker took just matches nothing
+    for pk in _ready(now).values_list('pk', flat=True)[:CLAIM_CANDIDATES]:
+        won = Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+            status=Job.RUNNING, locked_by=worker_name, locked_at=now, attempts=F('attempts') + 1)
+        if won: return Job.objects.get(pk=pk)
+    return None
+
+def run_job(job):
+    """Run a claimed job; deletes it on success, else schedules a retry or marks it failed"""
+    func = TASKS.get(job.task)
+    start = time.perf_counter()
+    try:
+        if func is None: raise LookupError(f"Unknown task '{job.task}'")
+        func(**job.kwargs)
+    except Exception as e:
+        _job_failed(job, e)
+        return False
+    # Filtered on the lock: if our lease ran out and another worker took the job, leave it to them
+    Job.objects.filter(pk=job.pk, locked_by=job.locked_by).delete()
+    logger.info(f"Job {job.task} #{job.pk} done in {time.perf_counter() - start:.2f}s")
+    return True
+
+def _job_failed(job, error):
+    mine = Job.objects.filter(pk=job.pk, locked_by=job.locked_by)
+    detail = ''.join(traceback.format_exception(error))[-4000:]
+    if job.attempts >= job.max_attempts:
+        mine.update(status=Job.FAILED, last_error=detail, locked_by='', locked_at=None)
+        logger.error(f"Job {job.task} #{job.pk} failed after {job.attempts} attempts: {error}")
+        return
+    # Exponential backoff with jitter, so a flapping dependency is not hit in lockstep
+    delay = queue_config()['retry_backoff'] * 2 ** (job.attempts - 1) * random.uniform(0.8, 1.2)
+    try:
+        with transaction.atomic():
+            mine.update(status=Job.QUEUED, last_error=detail, locked_by='', locked_at=None,
+                        run_after=timezone.now() + timedelta(seconds=delay))
+    except IntegrityError:
+        mine.delete()  # Another job is queued under its unique_key and will do the work
+        logger.warning(f"Job {job.task} #{job.pk} attempt {job.attempts} failed, superseded by a queued job: {error}")
+        return
+    logger.warning(f"Job {job.task} #{job.pk} attempt {job.attempts} failed, retrying in {delay:.0f}s: {error}")
+
+def requeue_expired(lease_seconds):
+    """Release jobs whose worker stopped without finishing them (crash, kill -9); returns how many"""
+    expired = Job.objects.filter(status=Job.RUNNING, locked_at__lt=timezone.now() - timedelta(seconds=lease_seconds))
+    failed = expired.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, last_error='Worker lease expired', locked_by='', locked_at=None)
+    # Not requeued next to another job queued under the same unique_key
+    expired.exclude(unique_key='').filter(
+        unique_key__in=Job.objects.filter(status=Job.QUEUED).values('unique_key')).delete()
+    requeued = expired.update(status=Job.QUEUED, locked_by='', locked_at=None, run_after=timezone.now())
+    if failed or requeued: logger.warning(f"Requeued {requeued} and failed {failed} jobs with expired leases")
+    return failed + requeued
+
+class Worker:
+    """Claims and runs jobs until stop(); with burst, only until no job is ready"""
+
+    def __init__(self, name=None, burst=False):
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        self.burst = burst
+        self.config = queue_config()
+        self.done = self.failed = 0
+        self._stopping = threading.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    def run(self):
+        logger.info(f"Worker {self.name} started")
+        next_sweep = 0.0
+        try:
+            while not self._stopping.is_set():
+                # As between requests: drop connections that broke or outlived CONN_MAX_AGE
+                close_old_connections()
+                try:
+                    if time.monotonic() >= next_sweep:
+                        requeue_expired(self.config['lease_seconds'])
+                        next_sweep = time.monotonic() + min(60.0, self.config['lease_seconds'] / 4)
+                    job = claim(self.name)
+                except DatabaseError as e:
+                    # e.g. SQLite "database is locked" under write contention: back off, try again
+                    logger.warning(f"Worker {self.name} could not claim a job: {e}")
+                    self._idle()
+                    continue
+                if job is None:
+                    if self.burst: break
+                    self._idle()
+                    continue
+                if run_job(job): self.done += 1
+                else: self.failed += 1
+        finally:
+            connection.close()
+            logger.info(f"Worker {self.name} stopped: {self.done} done, {self.failed} failed")
+
+    def _idle(self):
+        self._stopping.wait(self.config['poll_interval'] * random.uniform(0.5, 1.5))
@@ -0,0 +1,467 @@
+# AutoLogX/autologx/api/loadtest.py
+"""
+Benchmark data and load runner (manage.py seed_bench / bench_load).
+seed() fills the database with synthetic users, vehicles, service records and
+receipt attachments through bulk_create, then rebuilds summaries and rollups set-wise.
+run_load() replays a weighted mix of every named route (ROUTES; SKIPPED lists the
+deliberate exceptions and uncovered_routes() any route in neither) from concurrent
+workers, each logged in as a seeded user, either in-process through the full
+middleware stack (InProcessTransport) or against a running server (HttpTransport).
+Results hold p50/p95/p99 latency, requests/s and, in-process, queries per request
+per route; compare() checks them against a saved baseline.
+"""
+import io
+import json
+import logging
+import math
+import random
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from decimal import Decimal
+from urllib.parse import urlencode
+import requests
+from PIL import Image, ImageDraw
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import Client
+from django.urls import URLResolver, get_resolver, reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+from .models import Attachment, ServiceRecord, Vehicle
+from .storage import blob_referenced
+from .rollups import rebuild_rollups
+from .summaries import rebuild_summaries
+from .thumbnails import derivative_config
+from .vin_index import random_vin
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PREFIX = 'bench'
+DEFAULT_PASSWORD = 'bench-password'
+RECEIPT_IMAGES = 8  # Distinct receipt blobs shared by all seeded attachments
+
+# --- Synthetic data ---
+
+# make, model, engine, engine size (L), fuel type, transmission, oil viscosity, tire size, wheel size
+CATALOG = [
+    ('Honda', 'Civic', '1.5L I4 Turbo', '1.5', 'Gasoline', 'cvt', '0W-20', '215/55R16', '16x7'),
+    ('Toyota', 'Camry', '2.5L I4', '2.5', 'Gasoline', 'automatic', '0W-16', '235/45R18', '18x8'),
+    ('Toyota', 'RAV4 Hybrid', '2.5L I4 Hybrid', '2.5', 'Hybrid', 'cvt', '0W-16', '225/65R17', '17x7'),
+    ('Ford', 'F-150', '3.5L V6 EcoBoost', '3.5', 'Gasoline', 'automatic', '5W-30', '275/65R18', '18x7.5'),
+    ('Chevrolet', 'Silverado 1500', '5.3L V8', '5.3', 'Gasoline', 'automatic', '0W-20', '265/70R17', '17x8'),
+    ('Subaru', 'Outback', '2.5L H4', '2.5', 'Gasoline', 'cvt', '0W-20', '225/65R17', '17x7'),
+    ('Mazda', 'MX-5 Miata', '2.0L I4', '2.0', 'Gasoline', 'manual', '0W-20', '205/45R17', '17x7'),
+    ('Volkswagen', 'Golf TDI', '2.0L I4 Diesel', '2.0', 'Diesel', 'manual', '5W-40', '225/45R17', '17x7'),
+    ('Nissan', 'Altima', '2.5L I4', '2.5', 'Gasoline', 'cvt', '0W-20', '215/60R16', '16x7'),
+    ('Jeep', 'Wrangler', '3.6L V6', '3.6', 'Gasoline', 'manual', '5W-20', '245/75R17', '17x7.5'),
+]
+
+# service_type -> (share of records, cost range, descriptions, next service (days, miles) or None)
+SERVICE_MIX = {
+    'oil_change': (45, (39, 120), ['Synthetic oil and filter change', 'Oil change, topped up fluids'], (180, 5000)),
+    'tire_rotation': (20, (20, 60), ['Rotated tires, checked pressures', 'Rotation and balance'], (180, 7500)),
+    'inspection': (10, (25, 90), ['State safety inspection', 'Multi-point inspection'], (365, None)),
+    'brake_service': (10, (150, 650), ['Front pads and rotors', 'Brake fluid flush'], None),
+    'engine_repair': (5, (300, 2500), ['Replaced ignition coil', 'Timing belt and water pump'], None),
+    'other': (10, (15, 400), ['Cabin air filter', 'Wiper blades', 'Battery replacement'], None),
+}
+SHOPS = ['Main Street Auto', 'QuickLube Express', 'Dealer Service Center', 'Precision Tire & Brake', '']
+
+def _vehicle_plan(rng, user, record_count, today):
+    """An unsaved Vehicle and the field values of its service records, oldest first"""
+    make, model, engine, engine_size, fuel, transmission, oil, tire, wheel = rng.choice(CATALOG)
+    year = rng.randint(today.year - 20, today.year)
+    first = max(date(year, 1, 1), today - timedelta(days=max(record_count, 1) * 120))
+    span = max((today - first).days, 1)
+    daily_miles = rng.uniform(15, 60)
+    records = []
+    for day in sorted(rng.randrange(span) for _ in range(record_count)):
+        service_type = rng.choices(list(SERVICE_MIX), [mix[0] for mix in SERVICE_MIX.values()])[0]
+        _, (low, high), descriptions, next_service = SERVICE_MIX[service_type]
+        service_date, mileage = first + timedelta(days=day), int(day * daily_miles)
+        records.append({
+            'service_type': service_type, 'date': service_date, 'mileage': mileage,
+            'description': rng.choice(descriptions), 'cost': Decimal(f"{rng.uniform(low, high):.2f}"),
+            'shop_name': rng.choice(SHOPS),
+            'next_service_date': service_date + timedelta(days=next_service[0]) if next_service else None,
+            'next_service_mileage': mileage + next_service[1] if next_service and next_service[1] else None,
+        })
+    vehicle = Vehicle(
+        user=user, vin=random_vin(rng) if rng.random() < 0.9 else None, make=make, model=model, year=year,
+        engine=engine, engine_size=Decimal(engine_size), fuel_type=fuel, transmission=transmission,
+        oil_viscosity=oil, current_mileage=int(span * daily_miles), stock_tire_size=tire,
+        stock_wheel_size=wheel, current_tire_size=tire, current_wheel_size=wheel,
+    )
+    return vehicle, records
+
+def _receipt_blobs(rng):
+    """A few distinct receipt-like PNGs in storage; seeded attachments share them, like re-uploaded receipts"""
+    names = []
+    for i in range(RECEIPT_IMAGES):
+        image = Image.new('RGB', (800, 1100), 'white')
+        draw = ImageDraw.Draw(image)
+        for line in range(20):
+            draw.text((40, 40 + line * 50), f"{rng.choice(SHOPS) or 'Service'}   ${rng.uniform(5, 200):8.2f}", fill='black')
+        buffer = io.BytesIO()
+        image.save(buffer, 'PNG')
+        names.append(default_storage.save(f"bench/receipt-{i}.png", ContentFile(buffer.getvalue())))
+    return names
+
+def _flush(pending, receipts, attachments, rng, batch_size, created):
+    with transaction.atomic():
+        Vehicle.objects.bulk_create([vehicle for vehicle, _ in pending], batch_size=batch_size)
+        by_vehicle = [[ServiceRecord(vehicle=vehicle, **values) for values in plan] for vehicle, plan in pending]
+        ServiceRecord.objects.bulk_create([r for records in by_vehicle for r in records], batch_size=batch_size)
+        files = [
+            Attachment(service_record=record, title=f"Receipt {record.date:%Y-%m-%d}.png",
+                       attachment_type='receipt', file=rng.choice(receipts))
+            for records in by_vehicle for record in records[-attachments:]
+        ] if receipts and attachments else []
+        Attachment.objects.bulk_create(files, batch_size=batch_size)
+        # bulk_create sends no post_save, so count the blob references here
+        for name, n in Counter(a.file.name for a in files).items(): blob_referenced(name, n)
+    ids = [vehicle.pk for vehicle, _ in pending]
+    rebuild_summaries(Vehicle.objects.filter(pk__range=(min(ids), max(ids))), batch_size=batch_size)
+    rebuild_rollups(Vehicle.objects.filter(pk__range=(min(ids), max(ids))), batch_size=batch_size)
+    created['vehicles'] += len(pending)
+    created['service_records'] += sum(len(records) for records in by_vehicle)
+    created['attachments'] += len(files)
+
+def seed(users, vehicles, records, attachments=0, prefix=DEFAULT_PREFIX, password=DEFAULT_PASSWORD,
+         rng_seed=None, batch_size=2000, progress=None):
+    """
+    Create users <prefix>00000... with vehicles vehicles of records service records each
+    The latest attachments records of every vehicle get a receipt image. Everything is
+    written with bulk_create, so no signals run and no jobs (VIN enrichment) are queued.
+    Needs a backend that returns bulk-inserted primary keys (SQLite, PostgreSQL).
+    Returns counts of what was created; progress(created) is called after every batch.
+    """
+    if not connection.features.can_return_rows_from_bulk_insert:
+        raise ValueError(f"seed needs bulk_create to return primary keys, which {connection.vendor} does not")
+    rng, today = random.Random(rng_seed), date.today()
+    names = [f"{prefix}{i:05d}" for i in range(users)]
+    taken = set(User.objects.filter(username__startswith=prefix).values_list('username', flat=True)).intersection(names)
+    if taken: raise ValueError(f"{len(taken)} of these users already exist (e.g. '{min(taken)}'); use another prefix or --clear")
+    password_hash = make_password(password)  # Hashed once: hashing per user would dominate seeding
+    user_objs = User.objects.bulk_create(
+        [User(username=name, email=f"{name}@example.com", password=password_hash) for name in names], batch_size=batch_size)
+    created = {'users': len(user_objs), 'vehicles': 0, 'service_records': 0, 'attachments': 0}
+    receipts = _receipt_blobs(rng) if attachments and records else []
+    pending = []
+    for user in user_objs:
+        pending.extend(_vehicle_plan(rng, user, records, today) for _ in range(vehicles))
+        if len(pending) * max(records, 1) >= batch_size * 10:  # Bounds the unsaved objects held in memory
+            _flush(pending, receipts, attachments, rng, batch_size, created)
+            pending = []
+            if progress: progress(created)
+    if pending: _flush(pending, receipts, attachments, rng, batch_size, created)
+    return created
+
+# --- Routes ---
+
+def _record_fields(w):
+    day = date.today() - timedelta(days=w.rng.randint(0, 30))
+    return {'service_type': 'oil_change', 'date': day.isoformat(), 'mileage': w.rng.randint(1000, 150000),
+            'description': 'Oil and filter (load test)', 'cost': '59.99', 'shop_name': 'Bench Motors'}
+
+def _import_file(w):
+    rows = [f"{w.pick('vins')},{r['service_type']},{r['date']},{r['mileage']},{r['description']},{r['cost']}"
+            for r in (_record_fields(w) for _ in range(5))]
+    content = "vin,service_type,date,mileage,description,cost\n" + '\n'.join(rows) + '\n'
+    return {'form': {}, 'files': {'file': ('bench.csv', content.encode('utf-8'), 'text/csv')}}
+
+def _odometer(w):
+    now = time.time()
+    return {'json': [{'vin': w.pick('vins'), 'mileage': w.rng.randint(1000, 150000), 'timestamp': int(now - 300 * i)}
+                     for i in range(20)]}
+
+class Route:
+    """
+    One request shape: URL name, method, who sends it (None: anonymous, 'session', 'jwt')
+    and its share of the mix. args/build map the Worker to reverse() args and to the
+    request ({'query', 'json', 'form', 'files'}); requires names a Worker list that
+    must not be empty (e.g. 'attachment_ids').
+    """
+
+    def __init__(self, name, method='GET', weight=1, auth='session', args=None, build=None, requires=None, after=None):
+        self.name, self.method, self.weight, self.auth = name, method, weight, auth
+        self.args, self.build, self.requires, self.after = args, build, requires, after
+        self.label = name if method == 'GET' else f"{name} {method}"
+
+SEARCHES = ['oil', 'brake pads', 'tire rot', 'inspection', 'quicklube', 'receipt', 'battery', 'timing belt']
+
+def _search(w): return {'query': {'q': w.rng.choice(SEARCHES)}}
+def _vehicle(w): return [w.pick('vehicle_ids')]
+def _record(w): return [w.pick('record_ids')]
+def _attachment(w): return [w.pick('attachment_ids')]
+
+def _store_tokens(w, content):
+    tokens = json.loads(content)
+    w.transport.access = tokens.get('access', w.transport.access)
+    w.transport.refresh = tokens.get('refresh', w.transport.refresh)
+
+ROUTES = [
+    # Public pages and JWT (password hashing makes token_obtain_pair deliberately slow)
+    Route('home', auth=None, weight=2),
+    Route('signup', auth=None),
+    Route('login', auth=None),
+    Route('token_obtain_pair', 'POST', auth=None, after=_store_tokens,
+          build=lambda w: {'json': {'username': w.username, 'password': w.password}}),
+    Route('token_refresh', 'POST', auth=None, after=_store_tokens,
+          build=lambda w: {'json': {'refresh': w.transport.refresh}}),
+    # Browser pages (session)
+    Route('vehicle_list', weight=10),
+    Route('vehicle_list_page', weight=3, build=lambda w: {'query': {'format': 'json'}}),
+    Route('maintenance_forecast', weight=2),
+    Route('vehicle_create'),
+    Route('vehicle_detail', weight=15, args=_vehicle, requires='vehicle_ids'),
+    Route('vehicle_edit', args=_vehicle, requires='vehicle_ids'),
+    Route('vehicle_delete', args=_vehicle, requires='vehicle_ids'),  # GET: the confirmation page only
+    Route('service_record_create', args=_vehicle, requires='vehicle_ids'),
+    Route('service_record_create', 'POST', weight=2, args=_vehicle, requires='vehicle_ids',
+          build=lambda w: {'form': _record_fields(w)}),
+    Route('service_record_page', weight=5, args=_vehicle, requires='vehicle_ids',
+          build=lambda w: {'query': {'format': 'json'}}),
+    Route('service_record_export', args=lambda w: [], requires='vehicle_ids',
+          build=lambda w: {'query': {'vehicle': w.pick('vehicle_ids')}}),
+    Route('service_record_search', weight=3, build=_search),
+    Route('fleet_analytics', weight=2, build=lambda w: {'query': {'months': w.rng.choice([3, 12, 36])}}),
+    Route('attachment_download', weight=2, args=_attachment, requires='attachment_ids'),
+    Route('attachment_derivative', weight=4, requires='attachment_ids',
+          args=lambda w: [w.pick('attachment_ids'), next(iter(derivative_config()['sizes']))]),
+    Route('vin_lookup', 'POST', weight=3, build=lambda w: {'json': {'vin': w.pick('lookup_vins')}}),
+    Route('vin_lookup_async', 'POST', build=lambda w: {'json': {'vin': w.pick('lookup_vins')}}),
+    # REST API (JWT)
+    Route('api-root', auth='jwt'),
+    Route('api-vehicle-list', weight=5, auth='jwt'),
+    Route('api-vehicle-detail', weight=5, auth='jwt', args=_vehicle, requires='vehicle_ids'),
+    Route('api-vehicle-bulk', 'PATCH', auth='jwt', requires='vehicle_ids',
+          build=lambda w: {'json': [{'id': w.pick('vehicle_ids'), 'oil_viscosity': '0W-20'} for _ in range(5)]}),
+    Route('api-service-record-list', weight=5, auth='jwt', requires='vehicle_ids',
+          build=lambda w: {'query': {'vehicle': w.pick('vehicle_ids')}}),
+    Route('api-service-record-list', 'POST', weight=2, auth='jwt', requires='vehicle_ids',
+          build=lambda w: {'json': {**_record_fields(w), 'vehicle': w.pick('vehicle_ids')}}),
+    Route('api-service-record-search', weight=2, auth='jwt', build=_search),
+    Route('api-service-record-detail', weight=3, auth='jwt', args=_record, requires='record_ids'),
+    Route('api-service-record-bulk', 'POST', auth='jwt', requires='vehicle_ids',
+          build=lambda w: {'json': [{**_record_fields(w), 'vehicle': w.pick('vehicle_ids')} for _ in range(10)]}),
+    Route('api-service-record-import-file', 'POST', auth='jwt', requires='vins', build=_import_file),
+    Route('api-odometer-list', 'POST', weight=5, auth='jwt', requires='vins', build=_odometer),
+    Route('api-odometer-list', auth='jwt', requires='vehicle_ids', build=lambda w: {'query': {'vehicle': w.pick('vehicle_ids')}}),
+    Route('api-attachment-list', auth='jwt', requires='attachment_ids'),
+    Route('api-attachment-detail', auth='jwt', args=_attachment, requires='attachment_ids'),
+]
+
+SKIPPED = {
+    'logout': "ends the session the other requests use",
+    'metrics': "monitoring scrape endpoint, not user traffic",
+    'api-vehicle-bulk-delete': "deletes the seeded vehicles the other requests use",
+}
+
+def _route_names(resolver):
+    names = set()
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            if not pattern.namespace: names |= _route_names(pattern)  # Namespaced apps (admin) are not ours
+        elif pattern.name:
+            names.add(pattern.name)
+    return names
+
+def uncovered_routes():
+    """Named URL patterns neither in ROUTES nor in SKIPPED"""
+    return sorted(_route_names(get_resolver()) - {route.name for route in ROUTES} - set(SKIPPED))
+
+# --- Transports ---
+
+def _multipart(form, files):
+    data = dict(form or {})
+    for field, (filename, content, content_type) in (files or {}).items():
+        data[field] = SimpleUploadedFile(filename, content, content_type)
+    return data
+
+class InProcessTransport:
+    """Django test Client through the full middleware stack, counting the queries of each request"""
+    counts_queries = True
+
+    def __init__(self, user, password):
+        self.session = Client(raise_request_exception=False)
+        self.session.force_login(user)
+        self.anonymous = Client(raise_request_exception=False)
+        refresh = RefreshToken.for_user(user)
+        self.access, self.refresh = str(refresh.access_token), str(refresh)
+
+    def send(self, method, path, auth, query=None, json=None, form=None, files=None):
+        client = self.session if auth == 'session' else self.anonymous
+        headers = {'Authorization': f"Bearer {self.access}"} if auth == 'jwt' else {}
+        if query: path = f"{path}?{urlencode(query)}"
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            start = time.perf_counter()
+            if form is not None or files:
+                response = client.post(path, _multipart(form, files), headers=headers)
+            elif json is not None:
+                # post()/patch() encode dicts and lists for a JSON content type
+                response = getattr(client, method.lower())(path, json, content_type='application/json', headers=headers)
+            else:
+                response = client.generic(method, path, headers=headers)
+            content = b''.join(response.streaming_content) if response.streaming else response.content
+            response.close()
+            elapsed = time.perf_counter() - start
+        return response.status_code, elapsed, queries, content
+
+    def close(self):
+        connection.close()  # This worker thread's connection
+
+class HttpTransport:
+    """requests against a running server, logged in through the login form and the JWT endpoint"""
+    counts_queries = False
+
+    def __init__(self, base_url, username, password):
+        self.base_url = base_url.rstrip('/')
+        self.session, self.anonymous = requests.Session(), requests.Session()
+        login_url = self.base_url + reverse('login')
+        self.session.get(login_url, timeout=30)
+        response = self.session.post(login_url, allow_redirects=False, timeout=30, headers={'Referer': login_url}, data={
+            'username': username, 'password': password, 'csrfmiddlewaretoken': self.session.cookies.get('csrftoken', '')})
+        if response.status_code != 302: raise ValueError(f"Login as '{username}' failed ({response.status_code})")
+        response = self.anonymous.post(self.base_url + reverse('token_obtain_pair'), timeout=30,
+                                       json={'username': username, 'password': password})
+        if response.status_code != 200: raise ValueError(f"JWT for '{username}' failed ({response.status_code})")
+        self.access, self.refresh = response.json()['access'], response.json()['refresh']
+
+    def send(self, method, path, auth, query=None, json=None, form=None, files=None):
+        session = self.session if auth == 'session' else self.anonymous
+        headers = {'Authorization': f"Bearer {self.access}"} if auth == 'jwt' else {}
+        if auth == 'session' and method != 'GET':
+            headers.update({'X-CSRFToken': session.cookies.get('csrftoken', ''), 'Referer': self.base_url + '/'})
+        start = time.perf_counter()
+        response = session.request(method, self.base_url + path, params=query, json=json, data=form, files=files,
+                                   headers=headers, allow_redirects=False, timeout=60)
+        content = response.content
+        return response.status_code, time.perf_counter() - start, None, content
+
+    def close(self):
+        self.session.close()
+        self.anonymous.close()
+
+# --- Runner ---
+
+class Worker:
+    """One simulated client: a seeded user's ids to pick from, and its transport"""
+
+    def __init__(self, user, password, transport, rng, lookup_vins):
+        self.username, self.password, self.transport, self.rng = user.username, password, transport, rng
+        vehicles = Vehicle.objects.filter(user=user).order_by('-pk')
+        self.vehicle_ids = list(vehicles.values_list('pk', flat=True)[:200])
+        self.vins = list(vehicles.exclude(vin=None).values_list('vin', flat=True)[:200])
+        self.record_ids = list(ServiceRecord.objects.filter(vehicle__user=user).order_by('-pk').values_list('pk', flat=True)[:200])
+        self.attachment_ids = list(Attachment.objects.filter(service_record__vehicle__user=user)
+                                   .order_by('-pk').values_list('pk', flat=True)[:200])
+        self.lookup_vins = lookup_vins
+
+    def pick(self, name):
+        return self.rng.choice(getattr(self, name))
+
+    def call(self, route):
+        path = reverse(route.name, args=route.args(self) if route.args else ())
+        request = route.build(self) if route.build else {}
+        status, elapsed, queries, content = self.transport.send(route.method, path, route.auth, **request)
+        if route.after and status < 400: route.after(self, content)
+        return status, elapsed, queries
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of an ascending list"""
+    if not ordered: return 0.0
+    return ordered[max(1, math.ceil(p / 100 * len(ordered))) - 1]
+
+def _summarize(samples, elapsed):
+    times = sorted(s[0] for s in samples)
+    queries = [s[1] for s in samples if s[1] is not None]
+    return {
+        'count': len(samples), 'errors': sum(1 for s in samples if not 0 < s[2] < 400),
+        'rps': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        'mean': round(sum(times) / len(times) * 1000, 2) if times else 0.0,
+        **{f"p{p}": round(percentile(times, p) * 1000, 2) for p in (50, 95, 99)},
+        'queries': round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+def run_load(workers, routes, total_requests, rng_seed=0, warmup=True):
+    """
+    Send total_requests requests, spread over routes by weight (each route at least once),
+    from one thread per worker. With warmup, every worker first sends each route once
+    unmeasured (templates, connections, caches). Returns {'elapsed', 'total', 'routes'}.
+    """
+    rng = random.Random(rng_seed)
+    plan = list(routes) + rng.choices(routes, [r.weight for r in routes], k=max(0, total_requests - len(routes)))
+    rng.shuffle(plan)
+    samples = {route.label: [] for route in routes}
+    errors = []
+    lock, position = threading.Lock(), iter(plan)
+    ready = threading.Barrier(len(workers) + 1)
+
+    def send(worker, route):
+        try:
+            return worker.call(route)
+        except Exception as e:
+            logger.warning(f"{route.label} failed: {e}")
+            return 0, 0.0, None
+
+    def work(worker):
+        try:
+            if warmup:
+                for route in routes: send(worker, route)
+            ready.wait()
+            while True:
+                with lock: route = next(position, None)
+                if route is None: break
+                status, elapsed, queries = send(worker, route)
+                with lock:
+                    samples[route.label].append((elapsed, queries, status))
+                    if not 0 < status < 400 and len(errors) < 20: errors.append(f"{route.label}: {status}")
+        finally:
+            worker.transport.close()
+
+    threads = [threading.Thread(target=work, args=(w,), name=f"bench-worker-{i}") for i, w in enumerate(workers)]
+    for t in threads: t.start()
+    ready.wait()
+    start = time.perf_counter()
+    for t in threads: t.join()
+    elapsed = time.perf_counter() - start
+    return {
+        'elapsed': round(elapsed, 3),
+        'total': _summarize([s for route_samples in samples.values() for s in route_samples], elapsed),
+        'routes': {label: _summarize(route_samples, elapsed) for label, route_samples in samples.items()},
+        'error_samples': errors,
+    }
+
+def compare(results, baseline, tolerance=0.2, min_ms=2.0, min_count=50):
+    """
+    Rows (label, baseline, current, regressed) for routes in both runs and the total
+    A route regresses when its p95 is more than tolerance (and min_ms) slower, judged only
+    with min_count samples on both sides (below that p95 is about the maximum), or when it
+    runs more queries per request without errors in either run; the total regresses when
+    requests/s drops by more than tolerance.
+    """
+    rows = []
+    for label, current in results['routes'].items():
+        before = baseline['routes'].get(label)
+        if not before: continue
+        slower = (min(current['count'], before['count']) >= min_count and current['p95'] > before['p95'] * (1 + tolerance)
+                  and current['p95'] - before['p95'] > min_ms)
+        more_queries = (None not in (current['queries'], before['queries']) and not (current['errors'] or before['errors'])
+                        and current['queries'] > before['queries'] + 0.5)
+        rows.append((label, before, current, slower or more_queries))
+    total, before = results['total'], baseline['total']
+    rows.append(('TOTAL', before, total, total['rps'] < before['rps'] * (1 - tolerance)))
+    return rows
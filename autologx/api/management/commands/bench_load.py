@@ -0,0 +1,129 @@
+# AutoLogX/autologx/api/management/commands/bench_load.py
+import json
+import os
+import random
+from datetime import datetime, timezone
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from autologx.api import loadtest, services
+from autologx.api.nhtsa_stub import NhtsaStubServer
+from autologx.api.vin_index import random_vin
+
+class Command(BaseCommand):
+    help = ("Load-test every route (see autologx.api.loadtest.ROUTES) with concurrent workers logged in as "
+            "seed_bench users; reports p50/p95/p99 latency, requests/s and queries per request, and "
+            "compares them with a saved baseline.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help="Measured requests in total")
+        parser.add_argument('--concurrency', type=int, default=4, help="Concurrent workers (threads)")
+        parser.add_argument('--prefix', default=loadtest.DEFAULT_PREFIX, help="Username prefix of the seeded users")
+        parser.add_argument('--password', default=loadtest.DEFAULT_PASSWORD)
+        parser.add_argument('--base-url', help="Drive a running server (e.g. http://127.0.0.1:8000) instead of in-process; "
+                                               "it must use this database, and queries are not counted")
+        parser.add_argument('--routes', help="Comma-separated substrings; only routes whose label contains one")
+        parser.add_argument('--vins', type=int, default=50, help="Distinct (fresh, random) VINs for the lookup routes")
+        parser.add_argument('--stub-delay', type=float, default=0.0, help="NHTSA stub response delay in seconds")
+        parser.add_argument('--stub-port', type=int, default=8765,
+                            help="NHTSA stub port with --base-url (set the server's NHTSA_API_BASE to it)")
+        parser.add_argument('--no-warmup', action='store_true', help="Measure from the first request")
+        parser.add_argument('--seed', type=int, default=0, help="Seed of the request mix")
+        parser.add_argument('--baseline', default=os.path.join(settings.BASE_DIR, 'bench', 'baseline.json'),
+                            help="Baseline to compare with (if it exists) or to write with --save-baseline")
+        parser.add_argument('--save-baseline', action='store_true', help="Store this run as the baseline")
+        parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed p95 / requests/s change (0.2 = 20%%)")
+        parser.add_argument('--fail-on-regression', action='store_true', help="Exit with an error on a regression")
+        parser.add_argument('--json', action='store_true', help="Print the full results as JSON as well")
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1: raise CommandError("--requests and --concurrency must be positive")
+        for name in loadtest.uncovered_routes():
+            self.stderr.write(self.style.WARNING(f"Route '{name}' is not in loadtest.ROUTES or SKIPPED"))
+        users = list(User.objects.filter(username__startswith=options['prefix']).order_by('username')[:options['concurrency']])
+        if not users: raise CommandError(f"No '{options['prefix']}' users; run seed_bench first")
+        if len(users) < options['concurrency']:
+            self.stderr.write(self.style.WARNING(f"Only {len(users)} users: some workers share one"))
+
+        in_process = not options['base_url']
+        server = NhtsaStubServer(port=0 if in_process else options['stub_port'], delay=options['stub_delay']).start_in_thread()
+        decode_url = services.NHTSA_DECODE_URL
+        if in_process:
+            services.NHTSA_DECODE_URL = server.api_base + "/vehicles/DecodeVin/{vin}?format=json"
+        else:
+            self.stdout.write(f"NHTSA stub at {server.api_base}: start the server with NHTSA_API_BASE={server.api_base}")
+        try:
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                results = self.run(options, users, in_process)
+        finally:
+            services.NHTSA_DECODE_URL = decode_url
+            server.shutdown()
+            server.server_close()
+
+        self.report(results)
+        if options['json']: self.stdout.write(json.dumps(results, indent=2))
+        if options['save_baseline']:
+            os.makedirs(os.path.dirname(os.path.abspath(options['baseline'])), exist_ok=True)
+            with open(options['baseline'], 'w') as f: json.dump(results, f, indent=2)
+            self.stdout.write(f"Saved baseline to {options['baseline']}")
+        elif os.path.exists(options['baseline']):
+            with open(options['baseline']) as f: baseline = json.load(f)
+            regressed = self.report_comparison(results, baseline, options['tolerance'])
+            if regressed and options['fail_on_regression']:
+                raise CommandError(f"{len(regressed)} regression(s): {', '.join(regressed)}")
+
+    def run(self, options, users, in_process):
+        routes = loadtest.ROUTES
+        if options['routes']:
+            wanted = [part.strip() for part in options['routes'].split(',') if part.strip()]
+            routes = [r for r in routes if any(part in r.label for part in wanted)]
+        lookup_vins = [random_vin(random.Random()) for _ in range(options['vins'])]  # Fresh: not in the VIN caches yet
+        workers = []
+        for i in range(options['concurrency']):
+            user = users[i % len(users)]
+            try:
+                transport = (loadtest.InProcessTransport(user, options['password']) if in_process
+                             else loadtest.HttpTransport(options['base_url'], user.username, options['password']))
+            except Exception as e:
+                raise CommandError(f"Could not start worker {i}: {e}")
+            workers.append(loadtest.Worker(user, options['password'], transport, random.Random(options['seed'] + i), lookup_vins))
+        missing = [r for r in routes if r.requires and not all(getattr(w, r.requires) for w in workers)]
+        for route in missing:
+            self.stderr.write(self.style.WARNING(f"Skipping {route.label}: seeded users have no {route.requires}"))
+        routes = [r for r in routes if r not in missing]
+        if not routes: raise CommandError("No routes to run")
+        self.stdout.write(f"{options['requests']} requests over {len(routes)} routes, {len(workers)} workers, "
+                          f"{'in-process' if in_process else options['base_url']}")
+        results = loadtest.run_load(workers, routes, options['requests'], rng_seed=options['seed'], warmup=not options['no_warmup'])
+        results['meta'] = {
+            'mode': 'in-process' if in_process else 'http', 'requests': options['requests'],
+            'concurrency': options['concurrency'], 'seed': options['seed'], 'database': settings.DATABASES['default']['ENGINE'],
+            'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        }
+        return results
+
+    def report(self, results):
+        self.stdout.write(f"{'route':<38} {'n':>6} {'err':>4} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'q/req':>6}")
+        rows = sorted(results['routes'].items()) + [('TOTAL', results['total'])]
+        for label, r in rows:
+            queries = '-' if r['queries'] is None else f"{r['queries']:.1f}"
+            line = (f"{label:<38} {r['count']:>6} {r['errors']:>4} {r['rps']:>8.1f} {r['p50']:>8.1f} "
+                    f"{r['p95']:>8.1f} {r['p99']:>8.1f} {queries:>6}")
+            self.stdout.write(self.style.ERROR(line) if r['errors'] else line)
+        for sample in results['error_samples']: self.stderr.write(f"  error: {sample}")
+
+    def report_comparison(self, results, baseline, tolerance):
+        meta, base_meta = results['meta'], baseline.get('meta', {})
+        differs = [k for k in ('mode', 'requests', 'concurrency', 'database') if meta.get(k) != base_meta.get(k)]
+        if differs: self.stderr.write(self.style.WARNING(f"Baseline differs in {', '.join(differs)}: compare with care"))
+        self.stdout.write(f"\nVersus baseline of {base_meta.get('date', '?')}:")
+        regressed = []
+        for label, before, now, worse in loadtest.compare(results, baseline, tolerance):
+            change = (now['p95'] - before['p95']) / before['p95'] if before['p95'] else 0.0
+            queries = '' if None in (now['queries'], before['queries']) else f"  q/req {before['queries']:.1f} -> {now['queries']:.1f}"
+            line = (f"{label:<38} p95 {before['p95']:8.1f} -> {now['p95']:8.1f} ms ({change:+.0%})  "
+                    f"req/s {before['rps']:.1f} -> {now['rps']:.1f}{queries}")
+            if worse: regressed.append(label)
+            self.stdout.write(self.style.ERROR(line + "  REGRESSION") if worse else line)
+        return regressed
@@ -0,0 +1,89 @@
+# AutoLogX/autologx/api/management/commands/bench_query_cache.py
+import random
+import shutil
+import tempfile
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from autologx.api.models import ServiceRecord, Vehicle
+from autologx.api.query_cache import query_cache
+
+class Command(BaseCommand):
+    help = ("Benchmark vehicle_list/vehicle_detail throughput (through the full middleware stack) "
+            "with the query cache disabled, on LocMemCache and on FileBasedCache.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Username to browse as (default: the user with the most vehicles)")
+        parser.add_argument('--requests', type=int, default=1000, help="Requests per run")
+        parser.add_argument('--vehicles', type=int, default=20, help="Distinct vehicle pages in the mix")
+        parser.add_argument('--write-every', type=int, default=0,
+                            help="Re-save an unchanged service record every N requests, to include invalidation")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        user = self.pick_user(options['user'])
+        vehicle_ids = list(Vehicle.objects.filter(user=user).order_by('-pk').values_list('pk', flat=True)[:options['vehicles']])
+        if not vehicle_ids: raise CommandError(f"User '{user.username}' has no vehicles")
+        rng = random.Random(options['seed'])
+        # One list view per four requests, the rest spread over the vehicles' detail pages
+        urls = [reverse('vehicle_list') if rng.random() < 0.25 else reverse('vehicle_detail', args=[rng.choice(vehicle_ids)])
+                for _ in range(options['requests'])]
+        writes = list(ServiceRecord.objects.filter(vehicle_id__in=vehicle_ids)[:50]) if options['write_every'] else []
+        self.stdout.write(f"{len(urls)} requests as {user.username} over {len(vehicle_ids)} vehicles"
+                          + (f", a write every {options['write_every']}" if writes else ""))
+
+        cache_dir = tempfile.mkdtemp(prefix='querycache-')
+        caches = {
+            'bench_locmem': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench-query-cache',
+                             'OPTIONS': {'MAX_ENTRIES': 50000}},
+            'bench_file': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': cache_dir,
+                           'OPTIONS': {'MAX_ENTRIES': 50000}},
+        }
+        setup_test_environment()
+        saved = (query_cache.enabled, query_cache.cache_alias)
+        try:
+            with override_settings(CACHES={**self.settings_caches(), **caches}):
+                client = Client()
+                client.force_login(user)
+                for label, enabled, alias in (('disabled', False, saved[1]), ('locmem', True, 'bench_locmem'),
+                                              ('file-based', True, 'bench_file')):
+                    query_cache.enabled, query_cache.cache_alias = enabled, alias
+                    self.run(label, client, urls, writes, options['write_every'])
+        finally:
+            query_cache.enabled, query_cache.cache_alias = saved
+            teardown_test_environment()
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    def run(self, label, client, urls, writes, write_every):
+        for url in set(urls): client.get(url)  # Warm up templates, connections and (if enabled) the cache
+        query_cache.reset_stats()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for i, url in enumerate(urls, 1):
+                response = client.get(url)
+                if response.status_code != 200: raise CommandError(f"{url} returned {response.status_code}")
+                if writes and i % write_every == 0: writes[i % len(writes)].save()
+            elapsed = time.perf_counter() - start
+        stats = query_cache.stats()['total']
+        hit_rate = f"{stats['hit_rate']:.1%} hits" if query_cache.enabled else "-"
+        self.stdout.write(f"{label:<11} {len(urls) / elapsed:8.1f} req/s  {elapsed / len(urls) * 1000:6.2f} ms/req  "
+                          f"{len(queries) / len(urls):5.1f} queries/req  {hit_rate}")
+
+    def pick_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f"User '{username}' does not exist")
+        from django.db.models import Count
+        user = User.objects.annotate(n=Count('vehicles')).order_by('-n').first()
+        if user is None: raise CommandError("No users")
+        return user
+
+    def settings_caches(self):
+        from django.conf import settings
+        return settings.CACHES
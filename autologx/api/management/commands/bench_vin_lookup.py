@@ -0,0 +1,54 @@
+# AutoLogX/autologx/api/management/commands/bench_vin_lookup.py
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from autologx.api import services
+from autologx.api.nhtsa_stub import NhtsaStubServer
+from autologx.api.vin_index import random_vin
+
+class Command(BaseCommand):
+    help = ("Benchmark VIN lookups against a local NHTSA stub with an artificial delay: "
+            "blocking decode_vin on a fixed worker pool vs. adecode_vin on one event loop.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Lookups per run")
+        parser.add_argument('--unique', type=int, default=50, help="Distinct VINs among the lookups (repeats exercise coalescing)")
+        parser.add_argument('--delay', type=float, default=0.5, help="Stub response delay in seconds")
+        parser.add_argument('--workers', type=int, default=8, help="Thread pool size for the sync run (a WSGI worker pool)")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        pool = [random_vin(rng) for _ in range(options['unique'])]
+        vins = [rng.choice(pool) for _ in range(options['requests'])]
+        server = NhtsaStubServer(delay=options['delay']).start_in_thread()
+        decode_url = services.NHTSA_DECODE_URL
+        services.NHTSA_DECODE_URL = server.api_base + "/vehicles/DecodeVin/{vin}?format=json"
+        try:
+            self.stdout.write(f"{len(vins)} lookups of {len(pool)} VINs, stub delay {options['delay']}s")
+
+            def lookup(vin): return services.decode_vin(vin, use_cache=False, use_local=False)
+            server.request_count = 0
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+                sync_results = list(executor.map(lookup, vins))
+            self.report(f"sync  ({options['workers']} threads)", start, server.request_count, sync_results)
+
+            async def run_async():
+                return await asyncio.gather(*(services.adecode_vin(vin, use_cache=False, use_local=False) for vin in vins))
+            server.request_count = 0
+            start = time.perf_counter()
+            async_results = asyncio.run(run_async())
+            self.report("async (1 event loop)", start, server.request_count, async_results)
+        finally:
+            services.NHTSA_DECODE_URL = decode_url
+            server.shutdown()
+            server.server_close()
+
+    def report(self, label, start, upstream, results):
+        elapsed = time.perf_counter() - start
+        ok = sum(1 for r in results if r)
+        self.stdout.write(f"{label:<22} {elapsed:7.2f}s  {len(results) / elapsed:8.1f} lookups/s  "
+                          f"{upstream:4d} upstream calls  {ok}/{len(results)} decoded")
@@ -0,0 +1,96 @@
+# AutoLogX/autologx/api/management/commands/build_vin_index.py
+import csv
+import os
+from collections import defaultdict
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from autologx.api.models import Vehicle
+from autologx.api.services import normalize_vin
+from autologx.api.vin_index import validate_vin, write_index, load_index, wmi_key, vds_key
+
+SEED_WMI_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', 'wmi.csv')
+
+# Fields a VDS pattern record carries (make/year are checked for agreement too)
+PATTERN_FIELDS = ['make', 'model', 'year', 'trim', 'engine', 'engine_size', 'fuel_type', 'transmission']
+
+def read_csv_records(path):
+    """
+    Yield (key, record) pairs from a CSV with any of the columns
+    wmi, make, plant_code, plant, vds, year_code and the PATTERN_FIELDS.
+    A row yields a manufacturer record (wmi+make, no vds), a plant record
+    (wmi+plant_code+plant) and/or a model pattern record (wmi+vds+year_code).
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            row = {k.strip(): (v or '').strip() for k, v in row.items() if k}
+            wmi = row.get('wmi', '').upper()
+            if len(wmi) != 3: continue
+            if row.get('make') and not row.get('vds'):
+                yield 'W' + wmi, {'make': row['make']}
+            if row.get('plant_code') and row.get('plant'):
+                yield 'P' + wmi + row['plant_code'].upper()[:1], {'plant': row['plant']}
+            if len(row.get('vds', '')) == 5 and len(row.get('year_code', '')) == 1:
+                record = {field: row.get(field) for field in PATTERN_FIELDS}
+                if record.get('year'): record['year'] = int(record['year'])
+                if record.get('engine_size'): record['engine_size'] = float(record['engine_size'])
+                yield 'V' + wmi + row['vds'].upper() + row['year_code'].upper(), record
+
+MIN_OWNERS = 3
+
+def vehicle_records(min_owners=MIN_OWNERS):
+    """
+    Yield (key, record) pairs learned from decoded Vehicle rows
+    A pattern is kept only if every vehicle sharing it agrees on all fields and the
+    vehicles belong to at least min_owners users, so one user's typo (or fleet entered
+    by hand) never becomes the index's answer for everyone.
+    """
+    patterns = defaultdict(lambda: [set(), set()])  # key -> [records, owners]
+    makes = defaultdict(lambda: [set(), set()])
+    rows = (Vehicle.objects.exclude(vin__isnull=True).exclude(vin='')
+            .values_list('vin', 'user_id', *PATTERN_FIELDS).iterator(chunk_size=2000))
+    for vin, user_id, *values in rows:
+        vin = normalize_vin(vin)
+        if validate_vin(vin): continue
+        record = dict(zip(PATTERN_FIELDS, values))
+        if record['engine_size'] is not None: record['engine_size'] = float(record['engine_size'])
+        for groups, key, value in ((patterns, vds_key(vin), tuple(record.items())), (makes, wmi_key(vin), record['make'].upper())):
+            seen, owners = groups[key]
+            seen.add(value)
+            owners.add(user_id)
+    for key, (make_set, owners) in makes.items():
+        if len(make_set) == 1 and len(owners) >= min_owners: yield key, {'make': make_set.pop()}
+    for key, (records, owners) in patterns.items():
+        if len(records) == 1 and len(owners) >= min_owners: yield key, dict(records.pop())
+
+class Command(BaseCommand):
+    help = "Build the memory-mapped offline VIN index (WMI makes, plants and VDS model patterns)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=getattr(settings, 'VIN_INDEX_PATH', None), help="Index file to write (default: settings.VIN_INDEX_PATH)")
+        parser.add_argument('--csv', action='append', default=[], help="Extra CSV source (repeatable); see read_csv_records for columns")
+        parser.add_argument('--no-seed', action='store_true', help="Do not include the bundled WMI seed list")
+        parser.add_argument('--from-vehicles', action='store_true', help="Learn VDS patterns from already decoded Vehicle rows")
+        parser.add_argument('--min-owners', type=int, default=MIN_OWNERS,
+                            help="With --from-vehicles, users whose vehicles must agree on a pattern")
+
+    def handle(self, *args, **options):
+        if not options['output']:
+            raise CommandError("No output path: pass --output or set VIN_INDEX_PATH")
+        if options['min_owners'] < 1:
+            raise CommandError("--min-owners must be at least 1")
+        sources = ([] if options['no_seed'] else [SEED_WMI_CSV]) + options['csv']
+        records = []
+        for path in sources:
+            if not os.path.exists(path):
+                raise CommandError(f"File not found: {path}")
+            records.extend(read_csv_records(path))
+        if options['from_vehicles']:
+            # Learned patterns only fill gaps: the seed list and CSV sources always win
+            known = {key for key, _ in records}
+            records.extend((key, record) for key, record in vehicle_records(options['min_owners']) if key not in known)
+        try:
+            count = write_index(options['output'], records)
+        except ValueError as e:
+            raise CommandError(str(e))
+        load_index(options['output'], reload=True)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} records to {options['output']}"))
@@ -0,0 +1,128 @@
+# AutoLogX/autologx/api/management/commands/decode_vins.py
+import csv
+import json
+import os
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from autologx.api.models import Vehicle
+from autologx.api.query_cache import query_cache
+from autologx.api.rollups import rebuild_rollups
+from autologx.api.services import decode_vins, normalize_vin, NHTSA_BATCH_MAX_VINS
+from autologx.api.summaries import rebuild_summaries
+
+# Vehicle fields that decode_vin/decode_vins can populate
+DECODED_FIELDS = ['make', 'model', 'year', 'trim', 'engine', 'engine_size', 'fuel_type', 'transmission']
+
+def read_vins(path, fmt):
+    """Yield raw VINs from a CSV (a 'vin' column, else the first column) or JSONL file."""
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'jsonl':
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line: continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise CommandError(f"{path}:{line_no}: invalid JSON: {e}")
+                yield row.get('vin', '') if isinstance(row, dict) else str(row)
+        else:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None: return
+            lowered = [h.strip().lower() for h in header]
+            if 'vin' in lowered:
+                column = lowered.index('vin')
+            else:
+                # No header row: the first line is already data
+                column = 0
+                yield header[0] if header else ''
+            for row in reader:
+                if len(row) > column: yield row[column]
+
+class Command(BaseCommand):
+    help = ("Decode a CSV or JSONL file of VINs through the NHTSA batch API and create/update the user's Vehicle rows; "
+            "VINs of other users' vehicles are reported as conflicts and left alone.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV (with a 'vin' column or VINs in the first column) or JSONL ({\"vin\": ...} per line)")
+        parser.add_argument('--user', required=True, help="Username whose vehicles are created or updated")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Input format (default: from the file extension)")
+        parser.add_argument('--chunk-size', type=int, default=NHTSA_BATCH_MAX_VINS, help="VINs per NHTSA batch request (max 50)")
+        parser.add_argument('--workers', type=int, default=4, help="Concurrent NHTSA batch requests")
+        parser.add_argument('--batch-size', type=int, default=500, help="Rows per bulk_create/bulk_update statement")
+        parser.add_argument('--no-cache', action='store_true', help="Bypass the VIN decode cache")
+        parser.add_argument('--dry-run', action='store_true', help="Decode but do not write to the database")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"File not found: {path}")
+        fmt = options['format'] or ('jsonl' if path.lower().endswith(('.jsonl', '.ndjson')) else 'csv')
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['user']}' does not exist")
+
+        vins, invalid = [], 0
+        for raw in read_vins(path, fmt):
+            vin = normalize_vin(raw)
+            if len(vin) != 17:
+                invalid += 1
+                continue
+            vins.append(vin)
+        vins = list(dict.fromkeys(vins))
+        self.stdout.write(f"Decoding {len(vins)} unique VINs ({invalid} skipped as invalid)...")
+
+        decoded = decode_vins(vins, chunk_size=options['chunk_size'], max_workers=options['workers'],
+                              use_cache=not options['no_cache'])
+        failed = [vin for vin in vins if not decoded.get(vin)]
+
+        wanted = [vin for vin in vins if decoded.get(vin)]
+        existing = Vehicle.objects.filter(user=user).in_bulk(wanted, field_name='vin')
+        # VINs are unique across users: another customer's vehicle is neither updated nor duplicated
+        conflicts = set(Vehicle.objects.filter(vin__in=wanted).exclude(user=user).values_list('vin', flat=True))
+        to_create, to_update, update_fields = [], [], set()
+        for vin in vins:
+            vehicle_data = decoded.get(vin)
+            if not vehicle_data or vin in conflicts: continue
+            vehicle_data = {k: v for k, v in vehicle_data.items() if k in DECODED_FIELDS and v is not None}
+            vehicle = existing.get(vin)
+            if vehicle is not None:
+                for field, value in vehicle_data.items(): setattr(vehicle, field, value)
+                update_fields.update(vehicle_data)
+                to_update.append(vehicle)
+            elif vehicle_data.get('make') and vehicle_data.get('model') and vehicle_data.get('year'):
+                to_create.append(Vehicle(user=user, vin=vin, **vehicle_data))
+            else:
+                # make/model/year are required to create a Vehicle
+                failed.append(vin)
+
+        if not options['dry_run']:
+            with transaction.atomic():
+                if to_create:
+                    Vehicle.objects.bulk_create(to_create, batch_size=options['batch_size'])
+                if to_update:
+                    # auto_now is not applied by bulk_update
+                    update_fields.add('updated_at')
+                    now = timezone.now()
+                    for vehicle in to_update: vehicle.updated_at = now
+                    Vehicle.objects.bulk_update(to_update, sorted(update_fields), batch_size=options['batch_size'])
+                # bulk writes send no signals: build the new vehicles' summaries and rollups here
+                ids, size = [v.pk for v in to_create], options['batch_size']
+                for start in range(0, len(ids), size):
+                    created = Vehicle.objects.filter(pk__in=ids[start:start + size])
+                    rebuild_summaries(created, batch_size=size)
+                    rebuild_rollups(created, batch_size=size)
+                query_cache.invalidate(user_ids=[user.pk], vehicle_ids=[v.pk for v in to_update])
+
+        for vin in failed:
+            self.stderr.write(f"Could not decode {vin}")
+        for vin in sorted(conflicts):
+            self.stderr.write(f"Skipped {vin}: another user's vehicle has this VIN")
+        prefix = "[dry run] " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Created {len(to_create)}, updated {len(to_update)}, failed {len(failed)}, "
+            f"conflicts {len(conflicts)}, invalid {invalid}."
+        ))
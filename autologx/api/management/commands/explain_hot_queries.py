@@ -0,0 +1,72 @@
+# AutoLogX/autologx/api/management/commands/explain_hot_queries.py
+import re
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from autologx.api.models import Vehicle, ServiceRecord
+from autologx.api.pagination import keyset_queryset, encode_cursor
+from autologx.api.views import (VEHICLE_ORDERING, VEHICLE_LIST_FIELDS,
+                                SERVICE_RECORD_ORDERING, SERVICE_RECORD_LIST_FIELDS)
+
+# Plan lines that mean a full scan or an explicit sort, per backend
+SCAN_PATTERNS = {
+    'sqlite': re.compile(r'\bSCAN (?!.*USING (COVERING )?INDEX)|USE TEMP B-TREE FOR ORDER BY'),
+    'postgresql': re.compile(r'Seq Scan|(?<!Incremental )\bSort\b'),
+}
+
+class Command(BaseCommand):
+    help = ("Print EXPLAIN plans for the per-user/per-vehicle hot queries and flag full scans or sorts. "
+            "Works on SQLite and PostgreSQL; run against each database alias you deploy.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help="Database alias to explain against")
+        parser.add_argument('--user', type=int, help="User id for the sample queries (default: owner of the first vehicle)")
+        parser.add_argument('--vehicle', type=int, help="Vehicle id for the sample queries (default: first vehicle of the user)")
+        parser.add_argument('--analyze', action='store_true', help="PostgreSQL: EXPLAIN ANALYZE (executes the queries)")
+        parser.add_argument('--fail-on-scan', action='store_true', help="Exit non-zero if any plan has a full scan or sort")
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        if alias not in connections:
+            raise CommandError(f"Unknown database alias '{alias}'")
+        vendor = connections[alias].vendor
+        if vendor not in SCAN_PATTERNS:
+            self.stderr.write(f"No scan heuristics for '{vendor}'; plans are printed unchecked.")
+        vehicles = Vehicle.objects.using(alias)
+        records = ServiceRecord.objects.using(alias)
+        user_id = options['user'] or vehicles.values_list('user_id', flat=True).first() or 1
+        vehicle_id = options['vehicle'] or vehicles.filter(user_id=user_id).values_list('id', flat=True).first() or 1
+        sample = records.filter(vehicle_id=vehicle_id).values('date', 'id').first() or {'date': '2000-01-01', 'id': 1}
+        sample_vehicle = vehicles.filter(user_id=user_id).values('created_at', 'id').first()
+
+        queries = [
+            ("vehicle_list", vehicles.filter(user_id=user_id).only(*VEHICLE_LIST_FIELDS).order_by(*VEHICLE_ORDERING)),
+            ("vehicle_detail service history", records.filter(vehicle_id=vehicle_id).only(*SERVICE_RECORD_LIST_FIELDS).order_by(*SERVICE_RECORD_ORDERING)),
+            ("service history next page", keyset_queryset(records.filter(vehicle_id=vehicle_id).only(*SERVICE_RECORD_LIST_FIELDS),
+                                                             SERVICE_RECORD_ORDERING, encode_cursor([sample['date'], sample['id']]))),
+            ("admin filter service_type+date", records.filter(service_type='oil_change', date__gte='2020-01-01').order_by('-date')),
+            ("admin filter vehicle__make", records.filter(vehicle__make='HONDA').order_by('-id')),
+            ("admin vehicle__make choices", vehicles.order_by('make').values_list('make', flat=True).distinct()),
+        ]
+        if sample_vehicle:
+            queries.insert(1, ("vehicle list next page", keyset_queryset(
+                vehicles.filter(user_id=user_id).only(*VEHICLE_LIST_FIELDS), VEHICLE_ORDERING,
+                encode_cursor([sample_vehicle['created_at'], sample_vehicle['id']]))))
+
+        explain_options = {'analyze': True} if options['analyze'] and vendor == 'postgresql' else {}
+        pattern = SCAN_PATTERNS.get(vendor)
+        flagged = []
+        for name, queryset in queries:
+            plan = queryset.explain(**explain_options)
+            bad = [line for line in plan.splitlines() if pattern and pattern.search(line)]
+            style = self.style.WARNING if bad else self.style.SUCCESS
+            self.stdout.write(style(f"== {name} [{vendor}] {'SCAN/SORT' if bad else 'ok'}"))
+            self.stdout.write(str(queryset.query))
+            self.stdout.write(plan + "\n")
+            if bad: flagged.append(name)
+
+        if flagged:
+            message = f"{len(flagged)} hot queries scan or sort: {', '.join(flagged)}"
+            if options['fail_on_scan']: raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"All {len(queries)} hot queries use indexes."))
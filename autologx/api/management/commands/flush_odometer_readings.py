@@ -0,0 +1,14 @@
+# AutoLogX/autologx/api/management/commands/flush_odometer_readings.py
+from django.core.management.base import BaseCommand
+from autologx.api.odometer import flush
+
+class Command(BaseCommand):
+    help = ("Apply staged telematics odometer readings now (normally done by the flush_odometer_readings "
+            "job): fold them into the odometer series and raise Vehicle.current_mileage.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help="Staged rows per transaction (default: ODOMETER_INGEST['FLUSH_BATCH'])")
+
+    def handle(self, *args, **options):
+        staged, raised = flush(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Flushed {staged} staged readings; {raised} vehicles' mileage raised"))
@@ -0,0 +1,45 @@
+# AutoLogX/autologx/api/management/commands/forecast_maintenance.py
+import csv
+import json
+import time
+from django.core.management.base import BaseCommand
+from autologx.api.forecasting import FleetHistory, forecast
+from autologx.api.models import Vehicle
+
+class Command(BaseCommand):
+    help = "Forecast which vehicles are due for service within a horizon, fleet-wide (vectorized)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help="Horizon in days (overdue services are always included)")
+        parser.add_argument('--user', help="Only vehicles of this username")
+        parser.add_argument('--service-type', action='append', help="Only these service types (repeatable)")
+        parser.add_argument('--limit', type=int, default=0, help="Print at most this many rows (0 = all)")
+        parser.add_argument('--format', choices=['table', 'csv', 'jsonl'], default='table')
+
+    def handle(self, *args, **options):
+        vehicles = Vehicle.objects.all()
+        if options['user']: vehicles = vehicles.filter(user__username=options['user'])
+        start = time.perf_counter()
+        history = FleetHistory(vehicles)
+        loaded = time.perf_counter()
+        # Filtering by type happens after the forecast, so only limit early when not filtering
+        limit = None if options['service_type'] else (options['limit'] or None)
+        results = forecast(history=history, horizon_days=options['days'], limit=limit)
+        done = time.perf_counter()
+        if options['service_type']:
+            results = [r for r in results if r['service_type'] in options['service_type']]
+        rows = results[:options['limit']] if options['limit'] else results
+
+        if options['format'] == 'jsonl':
+            for row in rows: self.stdout.write(json.dumps(row, default=str))
+        elif options['format'] == 'csv':
+            if rows:
+                writer = csv.DictWriter(self.stdout, fieldnames=list(rows[0]))
+                writer.writeheader()
+                writer.writerows(rows)
+        else:
+            for r in rows:
+                self.stdout.write(f"vehicle {r['vehicle_id']:>8}  {r['service_type_display']:<14} due {r['due_date']} "
+                                  f"({r['days_until_due']:+d}d, by {r['due_by']})  est. {r['estimated_mileage']} mi @ {r['daily_miles']} mi/day")
+        self.stderr.write(f"{len(rows)} services due within {options['days']} days shown, {len(history.vehicle_ids)} vehicles "
+                          f"({len(history)} records): load {loaded - start:.2f}s, forecast {done - loaded:.2f}s")
@@ -0,0 +1,114 @@
+# AutoLogX/autologx/api/management/commands/gc_attachment_blobs.py
+import os
+from datetime import timedelta
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from autologx.api.models import Attachment, StoredBlob
+from autologx.api.storage import CAS_PREFIX, CAS_TMP, ContentAddressedStorage, is_blob_name
+from autologx.api.thumbnails import derivative_prefix
+
+class Command(BaseCommand):
+    help = ("Delete content-addressed attachment blobs that no Attachment references "
+            "(and, with --orphans, stray files under cas/ that have no StoredBlob row).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=24.0,
+                            help="Keep unreferenced blobs this long after their last upload or reference change")
+        parser.add_argument('--recount', action='store_true', help="Recompute ref counts from Attachment rows first")
+        parser.add_argument('--orphans', action='store_true', help="Also delete files under cas/ with no StoredBlob row")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would be deleted")
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError("The default storage is not ContentAddressedStorage")
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        dry_run = options['dry_run']
+        if options['recount']: self.recount(dry_run)
+
+        deleted = freed = 0
+        candidates = StoredBlob.objects.filter(ref_count__lte=0, updated_at__lt=cutoff).values_list('pk', 'name', 'size')
+        for pk, name, size in candidates.iterator(chunk_size=1000):
+            if dry_run or self.collect(pk, name, cutoff):
+                deleted += 1
+                freed += size
+        prefix = "[dry run] " if dry_run else ""
+        self.stdout.write(self.style.SUCCESS(f"{prefix}Deleted {deleted} unreferenced blobs ({freed / 1e6:.1f} MB)"))
+        if options['orphans']: self.orphans(cutoff, dry_run)
+
+    def collect(self, pk, name, cutoff):
+        """
+        Delete one blob unless it was re-referenced meanwhile
+        The file is moved aside first, so an upload racing with us either touches the row
+        (the conditional delete then fails and the file is put back) or finds no file and
+        writes it again.
+        """
+        path = default_storage.path(name)
+        trash = default_storage.path(f"{CAS_TMP}gc-{pk}")
+        os.makedirs(os.path.dirname(trash), exist_ok=True)
+        try:
+            os.replace(path, trash)
+        except FileNotFoundError:
+            trash = None
+        removed, _ = StoredBlob.objects.filter(pk=pk, ref_count__lte=0, updated_at__lt=cutoff).delete()
+        if trash:
+            if removed or os.path.exists(path): os.remove(trash)
+            else: os.replace(trash, path)
+        if removed: self.remove_derivatives(name)
+        return bool(removed)
+
+    def remove_derivatives(self, name):
+        directory, prefix = os.path.split(default_storage.path(derivative_prefix(name)))
+        try:
+            for filename in os.listdir(directory):
+                if filename.startswith(prefix): os.remove(os.path.join(directory, filename))
+        except FileNotFoundError:
+            pass
+
+    def recount(self, dry_run):
+        refs = (Attachment.objects.filter(file=OuterRef('name')).order_by().values('file')
+                .annotate(n=Count('id')).values('n'))
+        counted = StoredBlob.objects.annotate(actual=Coalesce(Subquery(refs), Value(0)))
+        wrong = [(b.name, b.ref_count, b.actual) for b in counted.only('name', 'ref_count') if b.ref_count != b.actual]
+        for name, stored, actual in wrong[:20]:
+            self.stdout.write(f"  {name}: ref_count {stored} -> {actual}")
+        if not dry_run and wrong:
+            StoredBlob.objects.update(ref_count=Coalesce(Subquery(refs), Value(0)))
+        # Attachments pointing at blobs without a row (e.g. rows lost in a restore)
+        known = set(StoredBlob.objects.values_list('name', flat=True))
+        missing = {n for n in Attachment.objects.filter(file__startswith=CAS_PREFIX).values_list('file', flat=True).distinct()
+                   if is_blob_name(n) and n not in known}
+        if not dry_run and missing:
+            counts = dict(Attachment.objects.filter(file__in=missing).order_by().values_list('file').annotate(n=Count('id')))
+            StoredBlob.objects.bulk_create([StoredBlob(name=n, ref_count=counts[n], size=self.size(n)) for n in missing],
+                                           ignore_conflicts=True)
+        self.stdout.write(f"Recount: {len(wrong)} ref counts corrected, {len(missing)} blob rows restored")
+
+    def orphans(self, cutoff, dry_run):
+        root = default_storage.path(CAS_PREFIX)
+        cutoff_ts = cutoff.timestamp()
+        known = set(StoredBlob.objects.values_list('name', flat=True))
+        known.update(Attachment.objects.filter(file__startswith=CAS_PREFIX).values_list('file', flat=True))
+        removed = 0
+        for directory, _, files in os.walk(root):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, default_storage.location).replace(os.sep, '/')
+                # Derivatives (thumbnails) are named <blob>.<variant>.<ext>
+                if name in known or name.rsplit('.', 2)[0] in known: continue
+                try:
+                    if os.path.getmtime(path) >= cutoff_ts: continue  # Possibly an upload in progress
+                    if not dry_run: os.remove(path)
+                except FileNotFoundError:
+                    continue
+                removed += 1
+        prefix = "[dry run] " if dry_run else ""
+        self.stdout.write(self.style.SUCCESS(f"{prefix}Deleted {removed} orphaned files under {CAS_PREFIX}"))
+
+    def size(self, name):
+        try:
+            return default_storage.size(name)
+        except OSError:
+            return 0
@@ -0,0 +1,90 @@
+# AutoLogX/autologx/api/management/commands/generate_attachment_derivatives.py
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from PIL import Image, ImageDraw
+from autologx.api import thumbnails
+from autologx.api.models import Attachment
+
+def synthetic_photo(path, width, height, seed):
+    """A JPEG with gradients, shapes and noise, compressing roughly like a phone photo"""
+    rng = random.Random(seed)
+    image = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = rng.randrange(width), rng.randrange(height)
+        r = rng.randrange(20, max(21, width // 6))
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rng.randrange(256) for _ in range(3)))
+    noise = Image.effect_noise((width, height), 24).convert('RGB')
+    Image.blend(image, noise, 0.15).save(path, 'JPEG', quality=90)
+
+class Command(BaseCommand):
+    help = ("Render missing thumbnails/previews for existing photo and PDF attachments in a process pool, "
+            "or with --benchmark measure images/sec per core on synthetic photos.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Pool processes")
+        parser.add_argument('--force', action='store_true', help="Re-render derivatives that already exist")
+        parser.add_argument('--benchmark', type=int, metavar='N', help="Render N synthetic photos instead of attachments")
+        parser.add_argument('--size', default='4032x3024', help="Benchmark photo size (default: 12 MP phone photo)")
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            return self.benchmark(options)
+        config = thumbnails.derivative_config()
+        names = Attachment.objects.order_by().values_list('file', flat=True).distinct()
+        jobs = []
+        for name in names.iterator(chunk_size=2000):
+            if not thumbnails.can_render(name) or not default_storage.exists(name): continue
+            if not options['force'] and all(default_storage.exists(thumbnails.derivative_name(name, v, config['format']))
+                                            for v in config['sizes']):
+                continue
+            jobs.append(name)
+        self.stdout.write(f"Rendering derivatives for {len(jobs)} files with {options['workers']} workers...")
+        done, failed, start = 0, 0, time.perf_counter()
+        with self.pool(options['workers']) as pool:
+            futures = {name: pool.submit(thumbnails.render, *thumbnails.render_args(name)) for name in jobs}
+            for name, future in futures.items():
+                try:
+                    future.result()
+                    done += 1
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"{name}: {e}")
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f"Rendered {done} ({failed} failed) in {elapsed:.1f}s"))
+
+    def benchmark(self, options):
+        width, height = (int(v) for v in options['size'].lower().split('x'))
+        config = thumbnails.derivative_config()
+        workdir = tempfile.mkdtemp(prefix='thumbbench-')
+        try:
+            sources = []
+            for i in range(min(options['benchmark'], 8)):
+                path = os.path.join(workdir, f"photo{i}.jpg")
+                synthetic_photo(path, width, height, i)
+                sources.append(path)
+            size_mb = sum(os.path.getsize(p) for p in sources) / len(sources) / 1e6
+            self.stdout.write(f"{options['benchmark']} renders of {width}x{height} JPEGs (~{size_mb:.1f} MB), "
+                              f"variants {config['sizes']} as {config['format']}")
+            jobs = [(sources[i % len(sources)], [(os.path.join(workdir, f"out{i}.{v}"), px) for v, px in config['sizes'].items()],
+                     config['format'], config['quality']) for i in range(options['benchmark'])]
+            for workers in sorted({1, options['workers']}):
+                with self.pool(workers) as pool:
+                    list(pool.map(thumbnails.render, *zip(*jobs[:workers])))  # Warm up the worker processes
+                    start = time.perf_counter()
+                    list(pool.map(thumbnails.render, *zip(*jobs), chunksize=max(1, len(jobs) // (workers * 4))))
+                    elapsed = time.perf_counter() - start
+                rate = len(jobs) / elapsed
+                self.stdout.write(f"  {workers} worker(s): {rate:.1f} images/s, {rate / workers:.1f} images/s/core")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def pool(self, workers):
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
@@ -0,0 +1,21 @@
+# AutoLogX/autologx/api/management/commands/nhtsa_stub.py
+from django.core.management.base import BaseCommand
+from autologx.api.nhtsa_stub import NhtsaStubServer
+
+class Command(BaseCommand):
+    help = "Run a local NHTSA vPIC stub server (set NHTSA_API_BASE to the printed URL)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--delay', type=float, default=0.0, help="Seconds to sleep before every response")
+
+    def handle(self, *args, **options):
+        server = NhtsaStubServer(options['host'], options['port'], delay=options['delay'])
+        self.stdout.write(f"NHTSA stub listening; NHTSA_API_BASE={server.api_base}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,21 @@
+# AutoLogX/autologx/api/management/commands/rebuild_rollups.py
+import time
+from django.core.management.base import BaseCommand
+from autologx.api.models import Vehicle
+from autologx.api.rollups import rebuild_rollups
+
+class Command(BaseCommand):
+    help = "Recompute MonthlyRollup rows (fleet analytics) from ServiceRecord history (backfill/repair)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vehicle', type=int, action='append', help="Only these vehicle ids (repeatable)")
+        parser.add_argument('--user', help="Only vehicles of this username")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        vehicles = Vehicle.objects.all()
+        if options['vehicle']: vehicles = vehicles.filter(pk__in=options['vehicle'])
+        if options['user']: vehicles = vehicles.filter(user__username=options['user'])
+        start = time.perf_counter()
+        count = rebuild_rollups(vehicles, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the monthly rollups of {count} vehicles in {time.perf_counter() - start:.2f}s"))
@@ -0,0 +1,18 @@
+# AutoLogX/autologx/api/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from autologx.api import search
+
+class Command(BaseCommand):
+    help = ("Recreate the service record full-text index and its triggers, then refill it from the tables "
+            "(needed after a migration rebuilt api_servicerecord, api_attachment or api_vehicle on SQLite).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        with transaction.atomic(using=connection.alias):
+            if not search.install(connection):
+                raise CommandError(f"No full-text index on {connection.vendor}: search uses icontains scans there")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the search index on '{connection.alias}'"))
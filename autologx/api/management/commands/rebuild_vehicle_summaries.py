@@ -0,0 +1,21 @@
+# AutoLogX/autologx/api/management/commands/rebuild_vehicle_summaries.py
+import time
+from django.core.management.base import BaseCommand
+from autologx.api.models import Vehicle
+from autologx.api.summaries import rebuild_summaries
+
+class Command(BaseCommand):
+    help = "Recompute VehicleSummary rows and Vehicle last_* fields from ServiceRecord history (backfill/repair)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vehicle', type=int, action='append', help="Only these vehicle ids (repeatable)")
+        parser.add_argument('--user', help="Only vehicles of this username")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        vehicles = Vehicle.objects.all()
+        if options['vehicle']: vehicles = vehicles.filter(pk__in=options['vehicle'])
+        if options['user']: vehicles = vehicles.filter(user__username=options['user'])
+        start = time.perf_counter()
+        count = rebuild_summaries(vehicles, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} vehicle summaries in {time.perf_counter() - start:.2f}s"))
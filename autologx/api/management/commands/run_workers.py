@@ -0,0 +1,71 @@
+# AutoLogX/autologx/api/management/commands/run_workers.py
+import multiprocessing
+import signal
+import threading
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+from autologx.api.jobs import Worker
+from autologx.api.models import Job
+
+def _work_in_process(burst):
+    # Forked child: own DB connection, and SIGTERM/SIGINT finish the current job before exiting
+    worker = Worker(burst=burst)
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: worker.stop())
+    worker.run()
+
+class Command(BaseCommand):
+    help = ("Run background job workers (autologx.api.jobs) until stopped with SIGTERM/Ctrl-C; "
+            "each finishes its current job first.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help="Number of workers")
+        parser.add_argument('--threads', action='store_true',
+                            help="Run workers as threads of this process (I/O-bound tasks) instead of processes")
+        parser.add_argument('--burst', action='store_true', help="Exit once no job is ready")
+        parser.add_argument('--status', action='store_true', help="Print job counts by task and status, then exit")
+
+    def handle(self, *args, **options):
+        if options['status']: return self.status()
+        count = options['workers']
+        if count < 1: raise CommandError("--workers must be at least 1")
+        self.stdout.write(f"Starting {count} {'thread' if options['threads'] else 'process'} worker(s)...")
+        if count == 1 and not options['threads']:
+            worker = Worker(burst=options['burst'])
+            self.on_stop(worker.stop)
+            worker.run()
+        elif options['threads']:
+            self.run_threads(count, options['burst'])
+        else:
+            self.run_processes(count, options['burst'])
+
+    def run_threads(self, count, burst):
+        workers = [Worker(burst=burst) for _ in range(count)]
+        threads = [threading.Thread(target=w.run, name=f"job-worker-{i}") for i, w in enumerate(workers)]
+        self.on_stop(lambda: [w.stop() for w in workers])
+        for t in threads: t.start()
+        for t in threads:
+            while t.is_alive(): t.join(0.5)  # Short joins keep the main thread free for signals
+
+    def run_processes(self, count, burst):
+        # Forked children must not share this process's database connection
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [context.Process(target=_work_in_process, args=(burst,), name=f"job-worker-{i}") for i in range(count)]
+        self.on_stop(lambda: [p.terminate() for p in processes if p.is_alive()])
+        for p in processes: p.start()
+        for p in processes: p.join()
+        failed = [p.name for p in processes if p.exitcode]
+        if failed: raise CommandError(f"Workers exited abnormally: {', '.join(failed)}")
+
+    def on_stop(self, stop):
+        handler = lambda signum, frame: stop()
+        signal.signal(signal.SIGTERM, handler)
+        signal.signal(signal.SIGINT, handler)
+
+    def status(self):
+        rows = Job.objects.order_by('task', 'status').values_list('task', 'status').annotate(n=Count('id'))
+        if not rows: self.stdout.write("No jobs")
+        for task, status, n in rows:
+            self.stdout.write(f"{task:40} {status:8} {n}")
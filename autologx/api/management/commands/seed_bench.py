@@ -0,0 +1,45 @@
+# AutoLogX/autologx/api/management/commands/seed_bench.py
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from autologx.api import loadtest
+
+class Command(BaseCommand):
+    help = ("Create synthetic benchmark data with bulk_create: users <prefix>00000.. (password --password), "
+            "each with --vehicles vehicles of --records service records; see bench_load.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--vehicles', type=int, default=20, help="Vehicles per user")
+        parser.add_argument('--records', type=int, default=25, help="Service records per vehicle")
+        parser.add_argument('--attachments', type=int, default=1,
+                            help="Receipt images on the latest N records of each vehicle (0: none)")
+        parser.add_argument('--prefix', default=loadtest.DEFAULT_PREFIX, help="Username prefix")
+        parser.add_argument('--password', default=loadtest.DEFAULT_PASSWORD)
+        parser.add_argument('--clear', action='store_true', help="Delete existing users with the prefix (and their data) first")
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, help="Random seed, for reproducible data in an empty database")
+
+    def handle(self, *args, **options):
+        if min(options['users'], options['vehicles'], options['records'], options['attachments']) < 0:
+            raise CommandError("Counts must not be negative")
+        if not options['prefix']: raise CommandError("--prefix must not be empty")
+        if options['clear']:
+            # Through the ORM, so signals release blob references and invalidate caches
+            deleted, _ = User.objects.filter(username__startswith=options['prefix']).delete()
+            self.stdout.write(f"Deleted {deleted} rows of earlier '{options['prefix']}' users")
+        start = time.perf_counter()
+        progress = lambda created: self.stdout.write(
+            f"  {created['vehicles']} vehicles, {created['service_records']} service records...")
+        try:
+            created = loadtest.seed(
+                options['users'], options['vehicles'], options['records'], attachments=options['attachments'],
+                prefix=options['prefix'], password=options['password'], rng_seed=options['seed'],
+                batch_size=options['batch_size'], progress=progress,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {created['users']} users, {created['vehicles']} vehicles, {created['service_records']} service "
+            f"records and {created['attachments']} attachments in {elapsed:.1f}s"))
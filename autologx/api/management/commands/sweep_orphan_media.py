@@ -0,0 +1,45 @@
+# AutoLogX/autologx/api/management/commands/sweep_orphan_media.py
+import os
+from datetime import timedelta
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from autologx.api.deletion import sweep_directory
+from autologx.api.models import Attachment
+
+MEDIA_PREFIX = 'vehicles/'  # attachment_upload_path, before content-addressed storage
+
+class Command(BaseCommand):
+    help = ("Reconcile media storage with the Attachment table: delete files under vehicles/ that no "
+            "Attachment references (left by deletions whose sweep did not run), and with --blobs collect "
+            "unreferenced blobs under cas/ through gc_attachment_blobs.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=24.0,
+                            help="Keep files modified this recently (possibly an upload in progress)")
+        parser.add_argument('--missing', action='store_true', help="Also report Attachments whose file is missing")
+        parser.add_argument('--blobs', action='store_true', help="Also run gc_attachment_blobs --recount --orphans")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would be deleted")
+
+    def handle(self, *args, **options):
+        cutoff = (timezone.now() - timedelta(hours=options['grace_hours'])).timestamp()
+        dry_run = options['dry_run']
+        referenced = set(Attachment.objects.filter(file__startswith=MEDIA_PREFIX).values_list('file', flat=True))
+        removed = 0
+        if os.path.isdir(default_storage.path(MEDIA_PREFIX)):
+            removed = sweep_directory(MEDIA_PREFIX, referenced, older_than=cutoff, dry_run=dry_run)
+        prefix = "[dry run] " if dry_run else ""
+        self.stdout.write(self.style.SUCCESS(f"{prefix}Deleted {removed} unreferenced files under {MEDIA_PREFIX}"))
+        if options['missing']: self.missing()
+        if options['blobs']:
+            call_command('gc_attachment_blobs', recount=True, orphans=True, grace_hours=options['grace_hours'],
+                         dry_run=dry_run, stdout=self.stdout, stderr=self.stderr)
+
+    def missing(self):
+        names = (Attachment.objects.exclude(file='').order_by('file').values_list('file', flat=True)
+                 .distinct().iterator(chunk_size=2000))
+        lost = [name for name in names if not os.path.exists(default_storage.path(name))]
+        for name in lost[:20]:
+            self.stdout.write(f"  missing: {name}")
+        self.stdout.write(self.style.WARNING(f"{len(lost)} attachment files missing") if lost else "No attachment files missing")
@@ -0,0 +1,25 @@
+# AutoLogX/autologx/api/management/commands/sync_sqlite_replicas.py
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from autologx.api.db_routing import replica_aliases
+
+class Command(BaseCommand):
+    help = ("Copy the SQLite primary into each SQLite replica (DATABASE_REPLICAS) with the online backup API: "
+            "a local stand-in for replication, to try the read/write router with two files.")
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite': raise CommandError("The primary is not SQLite; replicas are kept by the database")
+        replicas = [alias for alias in replica_aliases() if connections[alias].vendor == 'sqlite']
+        if not replicas: raise CommandError("No SQLite replicas configured; set DATABASE_REPLICAS")
+        primary.ensure_connection()
+        for alias in replicas:
+            connections[alias].close()
+            # A separate writable connection: Django's replica connections are query_only
+            target = primary.Database.connect(settings.DATABASES[alias]['NAME'])
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(f"Copied {primary.settings_dict['NAME']} to {alias} ({settings.DATABASES[alias]['NAME']})")
@@ -0,0 +1,279 @@
+# AutoLogX/autologx/api/metrics.py
+"""
+Per-view request instrumentation, exposed in the Prometheus text format at /metrics.
+RequestMetricsMiddleware times every request and attributes to it, through a
+context variable:
+- DB queries, via connection.execute_wrapper (sync views; the async VIN lookup runs none)
+- outbound NHTSA calls (services.NhtsaClient.observe)
+- template rendering (TimedDjangoTemplates, the template backend in settings)
+Observations go into histograms labelled by URL name. Requests slower than
+METRICS['SLOW_REQUEST_MS'] are logged with their most expensive SQL statements, grouped
+by statement text, so an N+1 shows up as one statement run many times.
+Metrics live in each server process: with several workers, every scrape sees one of them.
+Streaming response bodies (exports, downloads) are sent after the middleware returns
+and are not included.
+"""
+import hmac
+import logging
+import threading
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, float('inf'))
+MAX_DISTINCT_SQL = 100  # Statements kept per request for the slow log
+
+def metrics_config():
+    config = getattr(settings, 'METRICS', {})
+    return {
+        'enabled': config.get('ENABLED', True),
+        'token': config.get('TOKEN'),
+        'slow_request_ms': config.get('SLOW_REQUEST_MS', 500),
+        'slow_sql_samples': config.get('SLOW_SQL_SAMPLES', 5),
+    }
+
+# --- Metric types ---
+
+def _label_text(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs: return ''
+    escape = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+def _number(value):
+    if value == float('inf'): return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help_text, self.labels = name, help_text, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values=(), amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        for label_values, value in values:
+            yield f"{self.name}{_label_text(self.labels, label_values)} {_number(value)}"
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DURATION_BUCKETS):
+        self.name, self.help_text, self.labels, self.buckets = name, help_text, tuple(labels), buckets
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None: series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        with self._lock:
+            values = sorted((k, list(v)) for k, v in self._series.items())
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        for label_values, series in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield f"{self.name}_bucket{_label_text(self.labels, label_values, [('le', _number(bound))])} {cumulative}"
+            labels = _label_text(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {_number(series[-2])}"
+            yield f"{self.name}_count{labels} {series[-1]}"
+
+REQUESTS = Counter('autologx_http_requests_total', "Requests by URL name, method and status", ['view', 'method', 'status'])
+REQUEST_DURATION = Histogram('autologx_http_request_duration_seconds', "Wall time per request", ['view', 'method'])
+DB_DURATION = Histogram('autologx_db_query_duration_seconds', "Total DB query time per request", ['view'])
+DB_QUERIES = Histogram('autologx_db_queries_per_request', "DB queries per request", ['view'], QUERY_COUNT_BUCKETS)
+OUTBOUND_DURATION = Histogram('autologx_outbound_http_duration_seconds',
+                              "Total NHTSA call time per request that made any", ['view'])
+TEMPLATE_DURATION = Histogram('autologx_template_render_duration_seconds',
+                              "Total template render time per request that rendered any", ['view'])
+METRICS = [REQUESTS, REQUEST_DURATION, DB_DURATION, DB_QUERIES, OUTBOUND_DURATION, TEMPLATE_DURATION]
+
+def _collect_nhtsa():
+    from .services import nhtsa_client
+    stats = nhtsa_client.stats()
+    yield "# HELP autologx_nhtsa_calls_total NHTSA client counters (requests are attempts, including retries)"
+    yield "# TYPE autologx_nhtsa_calls_total counter"
+    for kind in ('requests', 'errors', 'retries', 'short_circuits'):
+        yield f'autologx_nhtsa_calls_total{{kind="{kind}"}} {stats[kind]}'
+    yield "# HELP autologx_nhtsa_circuit_open Whether the NHTSA circuit breaker is open"
+    yield "# TYPE autologx_nhtsa_circuit_open gauge"
+    yield f"autologx_nhtsa_circuit_open {int(stats['breaker'] == 'open')}"
+
+def _collect_query_cache():
+    from .query_cache import query_cache
+    names = query_cache.stats()['names']
+    yield "# HELP autologx_query_cache_lookups_total Query cache lookups by entry name and outcome"
+    yield "# TYPE autologx_query_cache_lookups_total counter"
+    for name, counters in sorted(names.items()):
+        for outcome in ('hits', 'misses', 'errors'):
+            yield f'autologx_query_cache_lookups_total{{name="{name}",outcome="{outcome}"}} {counters[outcome]}'
+
+COLLECTORS = [_collect_nhtsa, _collect_query_cache]
+
+def render_metrics():
+    lines = []
+    for metric in METRICS: lines.extend(metric.render())
+    for collect in COLLECTORS:
+        try:
+            lines.extend(collect())
+        except Exception as e:
+            logger.warning(f"Metrics collector {collect.__name__} failed: {e}")
+    return '\n'.join(lines) + '\n'
+
+def scrape_allowed(request):
+    """Bearer METRICS['TOKEN'] if one is configured, else a staff session"""
+    token = metrics_config()['token']
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        return hmac.compare_digest(supplied.encode(), token.encode())
+    return request.user.is_authenticated and request.user.is_staff
+
+# --- Per-request sampling ---
+
+class RequestSample:
+    """What one request spent its time on; shared through _current with DB, HTTP and template hooks"""
+
+    def __init__(self):
+        self.db_time = self.http_time = self.template_time = 0.0
+        self.db_count = self.http_count = 0
+        self.statements = {}  # SQL text -> [count, seconds]
+
+    def execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.db_time += elapsed
+            self.db_count += 1
+            # Grouped by text (placeholders, not values): an N+1 is one entry with a large count
+            entry = self.statements.get(sql)
+            if entry is not None:
+                entry[0] += 1
+                entry[1] += elapsed
+            elif len(self.statements) < MAX_DISTINCT_SQL:
+                self.statements[sql] = [1, elapsed]
+
+_current = ContextVar('request_metrics_sample', default=None)
+
+def record_outbound(seconds):
+    """Attribute an outbound HTTP call to the current request (no-op outside one)"""
+    sample = _current.get()
+    if sample is not None:
+        sample.http_time += seconds
+        sample.http_count += 1
+
+def _record_template(seconds):
+    sample = _current.get()
+    if sample is not None: sample.template_time += seconds
+
+class RequestMetricsMiddleware:
+    """Put it right after SecurityMiddleware so session/auth work is included"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = metrics_config()
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async: markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async: return self.__acall__(request)
+        if not self.config['enabled']: return self.get_response(request)
+        sample = RequestSample()
+        token = _current.set(sample)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(sample.execute))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, sample, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        if not self.config['enabled']: return await self.get_response(request)
+        # DB work of async views runs in worker threads, outside these connections' wrappers
+        sample = RequestSample()
+        token = _current.set(sample)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, sample, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, sample, elapsed):
+        match = getattr(request, 'resolver_match', None)
+        # Unresolved paths share one label, so scanners cannot blow up the series count
+        view = match.view_name if match is not None else '<unmatched>'
+        REQUESTS.inc((view, request.method, str(response.status_code)))
+        REQUEST_DURATION.observe((view, request.method), elapsed)
+        DB_DURATION.observe((view,), sample.db_time)
+        DB_QUERIES.observe((view,), sample.db_count)
+        if sample.http_count: OUTBOUND_DURATION.observe((view,), sample.http_time)
+        if sample.template_time: TEMPLATE_DURATION.observe((view,), sample.template_time)
+        if elapsed * 1000 >= self.config['slow_request_ms']: self.log_slow(request, view, sample, elapsed)
+
+    def log_slow(self, request, view, sample, elapsed):
+        top = sorted(sample.statements.items(), key=lambda item: -item[1][1])[:self.config['slow_sql_samples']]
+        statements = ''.join(f"\n  {count}x {seconds * 1000:.1f}ms {' '.join(sql.split())[:500]}" for sql, (count, seconds) in top)
+        logger.warning(
+            f"Slow request {request.method} {request.path} ({view}) {elapsed * 1000:.0f}ms: "
+            f"db {sample.db_time * 1000:.0f}ms in {sample.db_count} queries, "
+            f"nhtsa {sample.http_time * 1000:.0f}ms in {sample.http_count} calls, "
+            f"templates {sample.template_time * 1000:.0f}ms; top SQL:{statements or ' none'}"
+        )
+
+# --- Template timing ---
+
+class TimedTemplate:
+    """A django backend Template whose render() time counts towards the current request"""
+
+    def __init__(self, template):
+        self._template = template
+
+    def __getattr__(self, name):
+        return getattr(self._template, name)
+
+    def render(self, context=None, request=None):
+        start = time.perf_counter()
+        try:
+            return self._template.render(context, request)
+        finally:
+            _record_template(time.perf_counter() - start)
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates backend that times top-level renders (includes count towards their parent)"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='servicerecord',
+            index=models.Index(fields=['vehicle', '-date', '-id'], name='sr_vehicle_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicerecord',
+            index=models.Index(fields=['service_type', 'date'], name='sr_type_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='vehicle_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['make'], name='vehicle_make_idx'),
+        ),
+    ]
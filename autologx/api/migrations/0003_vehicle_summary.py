@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VehicleSummary',
+            fields=[
+                ('vehicle', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='api.vehicle')),
+                ('record_count', models.IntegerField(default=0)),
+                ('lifetime_cost', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cost_by_type', models.JSONField(blank=True, default=dict, help_text='service_type -> total cost (decimal string)')),
+                ('latest_mileage', models.IntegerField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Full-text index over service records, maintained by triggers (see autologx/api/search.py)
+from django.db import migrations
+from autologx.api import search
+
+
+def install(apps, schema_editor):
+    search.install(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_job_queue'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall, elidable=False),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_monthly_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OdometerReading',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('mileage', models.IntegerField()),
+                ('reading_count', models.IntegerField(default=1)),
+                ('recorded_at', models.DateTimeField()),
+                ('vehicle', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.vehicle')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OdometerSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField(help_text='Start of the bucket')),
+                ('mileage', models.IntegerField()),
+                ('reading_count', models.IntegerField()),
+                ('recorded_at', models.DateTimeField()),
+                ('vehicle', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='odometer_samples', to='api.vehicle')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('vehicle', 'bucket'), name='odometer_sample_unique')],
+            },
+        ),
+    ]
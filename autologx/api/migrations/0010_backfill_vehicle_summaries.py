@@ -0,0 +1,45 @@
+# Summaries for vehicles created before VehicleSummary (0003): the incremental updates in
+# autologx/api/summaries.py only adjust existing rows. `manage.py rebuild_vehicle_summaries`
+# recomputes every vehicle's summary and last_* fields.
+from decimal import Decimal
+from django.db import migrations
+from django.db.models import Count, Max, Sum
+
+BATCH_SIZE = 1000
+CENT = Decimal('0.01')
+
+
+def backfill(apps, schema_editor):
+    Vehicle = apps.get_model('api', 'Vehicle')
+    ServiceRecord = apps.get_model('api', 'ServiceRecord')
+    VehicleSummary = apps.get_model('api', 'VehicleSummary')
+    missing = Vehicle.objects.filter(summary__isnull=True).order_by('pk').values_list('pk', flat=True)
+    last_pk = 0
+    while True:
+        ids = list(missing.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not ids: break
+        last_pk = ids[-1]
+        totals = {vid: {'record_count': 0, 'lifetime_cost': Decimal('0'), 'cost_by_type': {}, 'latest_mileage': None} for vid in ids}
+        grouped = (ServiceRecord.objects.filter(vehicle_id__in=ids).order_by()
+                   .values('vehicle_id', 'service_type').annotate(n=Count('id'), cost=Sum('cost'), mileage=Max('mileage')))
+        for row in grouped:
+            t = totals[row['vehicle_id']]
+            # SQLite sums decimals as floats; round back to cents
+            cost = (row['cost'] or Decimal('0')).quantize(CENT)
+            t['record_count'] += row['n']
+            t['lifetime_cost'] += cost
+            if cost: t['cost_by_type'][row['service_type']] = str(cost)
+            if t['latest_mileage'] is None or row['mileage'] > t['latest_mileage']: t['latest_mileage'] = row['mileage']
+        VehicleSummary.objects.bulk_create([VehicleSummary(vehicle_id=vid, **t) for vid, t in totals.items()],
+                                           ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_job_unique_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -31,6 +31,14 @@ class Vehicle(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # vehicle_list: filter(user=...) ordered/keyset-paginated by (created_at, id)
+            models.Index(fields=['user', 'created_at', 'id'], name='vehicle_user_created_idx'),
+            # Admin list_filter on vehicle__make
+            models.Index(fields=['make'], name='vehicle_make_idx'),
+        ]
+
     def __str__(self):
         return f"{self.year} {self.make} {self.model}"
 
@@ -52,9 +60,154 @@ class ServiceRecord(models.Model):
     next_service_mileage = models.IntegerField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Service history: filter(vehicle=...) ordered/keyset-paginated by (-date, -id)
+            models.Index(fields=['vehicle', '-date', '-id'], name='sr_vehicle_date_idx'),
+            # Admin list_filter/date_hierarchy on service_type and date
+            models.Index(fields=['service_type', 'date'], name='sr_type_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.service_type} for {self.vehicle} on {self.date}"
 
+class VehicleSummary(models.Model):
+    """
+    Precomputed service totals for a vehicle, kept current by autologx.api.summaries
+    whenever a ServiceRecord is saved or deleted (the last_* dates/mileages live on
+    Vehicle itself). Rebuild with `manage.py rebuild_vehicle_summaries`.
+    """
+    vehicle = models.OneToOneField(Vehicle, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    record_count = models.IntegerField(default=0)
+    lifetime_cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cost_by_type = models.JSONField(default=dict, blank=True, help_text="service_type -> total cost (decimal string)")
+    latest_mileage = models.IntegerField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def cost_by_type_display(self):
+        """[(service type label, cost)] in SERVICE_TYPES order, for templates."""
+        return [(label, self.cost_by_type[key]) for key, label in ServiceRecord.SERVICE_TYPES if key in self.cost_by_type]
+
+    def __str__(self):
+        return f"Summary for {self.vehicle_id}: {self.record_count} records, ${self.lifetime_cost}"
+
+class MonthlyRollup(models.Model):
+    """
+    Service record totals per (vehicle, month, service_type, shop_name), kept current by
+    autologx.api.rollups whenever a ServiceRecord is saved or deleted; fleet analytics
+    read these instead of the records. Rebuild with `manage.py rebuild_rollups`.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')  # The vehicle's owner, denormalized
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='rollups')
+    month = models.DateField(help_text="First day of the month")
+    service_type = models.CharField(max_length=20, choices=ServiceRecord.SERVICE_TYPES)
+    shop_name = models.CharField(max_length=100, blank=True)
+    record_count = models.IntegerField(default=0)
+    total_cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    min_mileage = models.IntegerField()
+    max_mileage = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['vehicle', 'month', 'service_type', 'shop_name'], name='rollup_cell_unique'),
+        ]
+        indexes = [
+            # Analytics: filter(user=..., month__gte=...)
+            models.Index(fields=['user', 'month'], name='rollup_user_month_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.vehicle_id} {self.month:%Y-%m} {self.service_type}: {self.record_count} records, ${self.total_cost}"
+
+class OdometerReading(models.Model):
+    """
+    Staged telematics odometer readings (autologx.api.odometer): appended by the ingest
+    endpoint, one row per vehicle and bucket per request, then folded into OdometerSample
+    and Vehicle.current_mileage by the flush task and deleted.
+    """
+    # No index on vehicle: the table only holds the last few seconds of readings, read in pk order
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='+', db_index=False)
+    bucket = models.DateTimeField()
+    mileage = models.IntegerField()  # Highest reading in the bucket
+    reading_count = models.IntegerField(default=1)
+    recorded_at = models.DateTimeField()  # Latest reading in the bucket
+
+    def __str__(self):
+        return f"{self.vehicle_id} {self.recorded_at:%Y-%m-%d %H:%M}: {self.mileage}"
+
+class OdometerSample(models.Model):
+    """The odometer series of a vehicle, downsampled to its highest reading per ODOMETER_INGEST['BUCKET_SECONDS']"""
+    # Indexed through the unique constraint, which leads with vehicle
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='odometer_samples', db_index=False)
+    bucket = models.DateTimeField(help_text="Start of the bucket")
+    mileage = models.IntegerField()
+    reading_count = models.IntegerField()
+    recorded_at = models.DateTimeField()  # Latest reading in the bucket
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['vehicle', 'bucket'], name='odometer_sample_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.vehicle_id} {self.bucket:%Y-%m-%d %H:%M}: {self.mileage}"
+
+class StoredBlob(models.Model):
+    """
+    A file in the content-addressed attachment store (autologx.api.storage), shared by
+    every Attachment with the same content. ref_count follows those Attachment rows;
+    `manage.py gc_attachment_blobs` deletes blobs left at zero.
+    """
+    name = models.CharField(max_length=100, unique=True)  # Storage name, as saved in Attachment.file
+    size = models.BigIntegerField(default=0)
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # Last upload or reference change
+
+    class Meta:
+        indexes = [
+            # gc_attachment_blobs: unreferenced blobs past the grace period
+            models.Index(fields=['ref_count', 'updated_at'], name='blob_gc_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
+class Job(models.Model):
+    """
+    A unit of background work for `manage.py run_workers` (see autologx.api.jobs)
+    Created with jobs.enqueue(); finished jobs are deleted, failed ones are kept for inspection.
+    """
+    QUEUED, RUNNING, FAILED = 'queued', 'running', 'failed'
+    STATUSES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (FAILED, 'Failed')]
+    task = models.CharField(max_length=100)  # Name registered with @jobs.task
+    kwargs = models.JSONField(default=dict, blank=True)
+    priority = models.SmallIntegerField(default=0)  # Higher runs first
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED)
+    run_after = models.DateTimeField()
+    attempts = models.SmallIntegerField(default=0)
+    max_attempts = models.SmallIntegerField(default=5)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    unique_key = models.CharField(max_length=200, blank=True)  # At most one queued job per key (see jobs.enqueue)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Claiming: next ready job by priority, then age; only queued rows are indexed
+            models.Index(fields=['-priority', 'run_after', 'id'], condition=models.Q(status='queued'), name='job_ready_idx'),
+            # Requeueing jobs whose worker died
+            models.Index(fields=['status', 'locked_at'], name='job_lease_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['unique_key'], condition=models.Q(status='queued') & ~models.Q(unique_key=''),
+                                    name='job_unique_queued'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
+
 def attachment_upload_path(instance, filename):
     return os.path.join('vehicles', str(instance.service_record.vehicle.id), 'service_records', str(instance.service_record.id), filename)
 
@@ -69,5 +222,22 @@ class Attachment(models.Model):
     file = models.FileField(upload_to=attachment_upload_path) # Requires Pillow
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
+    def derivative_url(self, variant):
+        """URL of a thumbnail/preview variant (see thumbnails.py), or None for file types without one"""
+        from django.urls import reverse
+        from . import thumbnails
+        if not thumbnails.can_render(self.file.name): return None
+        return f"{reverse('attachment_derivative', args=[self.pk, variant])}?v={thumbnails.version(self.file.name)}"
+
+    @property
+    def thumbnail_url(self):
+        return self.derivative_url('thumb')
+
+    @property
+    def download_url(self):
+        """Authorized URL of the file itself (file.url is only served with DEBUG)"""
+        from django.urls import reverse
+        return reverse('attachment_download', args=[self.pk])
+
     def __str__(self):
         return f"{self.title} ({self.attachment_type}) for SR {self.service_record.id}"
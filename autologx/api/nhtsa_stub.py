@@ -0,0 +1,101 @@
+# AutoLogX/autologx/api/nhtsa_stub.py
+"""
+Local stand-in for the NHTSA vPIC API, for development, load tests and benchmarks.
+Point NHTSA_API_BASE at it, e.g. NHTSA_API_BASE=http://127.0.0.1:8765/api
+Answers DecodeVin/<vin> and DecodeVINValuesBatch/ with deterministic fake data
+derived from the VIN; VINs containing 'ZZZ' are reported as undecodable.
+"""
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+_MAKES = ['HONDA', 'TOYOTA', 'FORD', 'CHEVROLET', 'NISSAN', 'SUBARU']
+_MODELS = ['Civic', 'Camry', 'F-150', 'Silverado', 'Altima', 'Outback']
+
+def fake_vehicle(vin):
+    """Return the flat (DecodeVinValues-style) record the stub reports for a VIN."""
+    if 'ZZZ' in vin:
+        return {'VIN': vin, 'Make': '', 'Model': '', 'ModelYear': '', 'ErrorCode': '11'}
+    n = sum(ord(c) for c in vin)
+    return {
+        'VIN': vin,
+        'Make': _MAKES[n % len(_MAKES)],
+        'Model': _MODELS[n % len(_MODELS)],
+        'ModelYear': str(2000 + n % 25),
+        'Trim': 'Base',
+        'DisplacementCI': str(120 + n % 250),
+        'FuelTypePrimary': 'Gasoline',
+        'TransmissionStyle': 'Automatic',
+        'ErrorCode': '0',
+    }
+
+# Flat key -> DecodeVin 'Variable' name, as vPIC reports them
+_VARIABLES = {
+    'Make': 'Make', 'Model': 'Model', 'ModelYear': 'Model Year', 'Trim': 'Trim',
+    'DisplacementCI': 'Engine displacement (cubic inches)',
+    'FuelTypePrimary': 'Fuel Type - Primary', 'TransmissionStyle': 'Transmission Style',
+}
+
+class NhtsaStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+    def _reply(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _delay(self):
+        if self.server.delay: time.sleep(self.server.delay)
+        with self.server.lock:
+            self.server.request_count += 1
+
+    def do_GET(self):
+        self._delay()
+        path = urlparse(self.path).path.rstrip('/')
+        if '/vehicles/DecodeVin/' not in path:
+            return self._reply({'Message': 'Not found'}, status=404)
+        vin = path.rsplit('/', 1)[-1].upper()
+        record = fake_vehicle(vin)
+        results = [{'Variable': variable, 'Value': record.get(key) or None} for key, variable in _VARIABLES.items()]
+        self._reply({'Count': len(results), 'Message': 'Results returned successfully', 'Results': results})
+
+    def do_POST(self):
+        self._delay()
+        if not urlparse(self.path).path.rstrip('/').endswith('/vehicles/DecodeVINValuesBatch'):
+            return self._reply({'Message': 'Not found'}, status=404)
+        length = int(self.headers.get('Content-Length') or 0)
+        form = parse_qs(self.rfile.read(length).decode('utf-8'))
+        entries = [e for e in (form.get('data') or [''])[0].split(';') if e]
+        results = [fake_vehicle(entry.split(',')[0].strip().upper()) for entry in entries]
+        self._reply({'Count': len(results), 'Message': 'Results returned successfully', 'Results': results})
+
+    def log_message(self, format, *args):
+        logger.debug("nhtsa stub: " + format, *args)
+
+class NhtsaStubServer(ThreadingHTTPServer):
+    """Threaded stub server; delay (seconds) is added to every response to mimic a slow vPIC."""
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, delay=0.0):
+        super().__init__((host, port), NhtsaStubHandler)
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.request_count = 0
+
+    @property
+    def api_base(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api"
+
+    def start_in_thread(self):
+        """Serve from a daemon thread and return self; call shutdown() when done."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
@@ -0,0 +1,178 @@
+# AutoLogX/autologx/api/odometer.py
+"""
+Odometer ingest for telematics units (POST api/v1/odometer/).
+Units report every few minutes per vehicle: saving the Vehicle row for each reading
+would rewrite every column and queue requests up on its row lock. Instead:
+- ingest() coalesces a request's readings in memory to the highest one per vehicle
+  and bucket, and appends those to OdometerReading with one bulk_create; requests
+  only read the vehicles table (to resolve VINs) and never wait on each other: the
+  flush job is queued once their readings commit, unless one is queued already
+- flush() (the flush_odometer_readings task, queued FLUSH_INTERVAL seconds after the
+  first staged reading) claims staged rows, folds them into OdometerSample, the series
+  downsampled to one sample per vehicle and BUCKET_SECONDS, and raises current_mileage
+  of each batch of vehicles with one UPDATE. Odometers only go up: a lower or late
+  reading never lowers current_mileage, and vehicles it would not raise are not written.
+Flushes serialize on the staged rows' locks (SELECT ... FOR UPDATE; the write lock on SQLite).
+"""
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import Job, Vehicle, OdometerReading, OdometerSample
+from .query_cache import query_cache
+from .services import normalize_vin
+
+logger = logging.getLogger(__name__)
+
+MAX_MILEAGE = 10_000_000
+VEHICLE_BATCH = 500  # Vehicles per UPDATE (and per sample lookup)
+FLUSH_JOB_KEY = 'odometer-flush'
+
+def ingest_config():
+    config = getattr(settings, 'ODOMETER_INGEST', {})
+    return {
+        'flush_interval': config.get('FLUSH_INTERVAL', 30),
+        'flush_batch': config.get('FLUSH_BATCH', 20000),
+        'bucket_seconds': config.get('BUCKET_SECONDS', 3600),
+        'max_readings': config.get('MAX_READINGS', 5000),
+        'max_clock_skew': config.get('MAX_CLOCK_SKEW', 300),
+    }
+
+def bucket_of(moment, seconds):
+    """Start of the bucket (aligned on the Unix epoch) holding an aware datetime"""
+    stamp = int(moment.timestamp())
+    return datetime.fromtimestamp(stamp - stamp % seconds, tz=dt_timezone.utc)
+
+def parse_timestamp(value):
+    """An aware datetime from ISO 8601 (naive means UTC) or Unix seconds, or None"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        try:
+            return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            return None
+    try:
+        moment = parse_datetime(value) if isinstance(value, str) else None
+    except ValueError:
+        return None  # Well-formed but not a valid date-time
+    if moment is not None and timezone.is_naive(moment): moment = moment.replace(tzinfo=dt_timezone.utc)
+    return moment
+
+def _errors(item, now, skew):
+    """(vin, mileage, moment, errors) of one reading"""
+    if not isinstance(item, dict): return None, None, None, {'non_field_errors': ["Expected an object."]}
+    errors = {}
+    vin = normalize_vin(item.get('vin')) if isinstance(item.get('vin'), str) else ''
+    if not vin: errors['vin'] = ["This field is required."]
+    mileage = item.get('mileage')
+    if not isinstance(mileage, int) or isinstance(mileage, bool) or not 0 <= mileage <= MAX_MILEAGE:
+        errors['mileage'] = [f"Must be a whole number of miles from 0 to {MAX_MILEAGE}."]
+    moment = parse_timestamp(item.get('timestamp'))
+    if moment is None: errors['timestamp'] = ["Must be an ISO 8601 date-time or Unix seconds."]
+    elif moment > now + timedelta(seconds=skew): errors['timestamp'] = ["Must not be in the future."]
+    return vin, mileage, moment, errors
+
+def ingest(user, readings, now=None):
+    """
+    Stage {'vin', 'mileage', 'timestamp'} readings of user's vehicles; returns the number
+    accepted and a list of {'index', 'errors'} for the rejected ones
+    """
+    config = ingest_config()
+    now = now or timezone.now()
+    parsed, rejected = [], []
+    for index, item in enumerate(readings):
+        vin, mileage, moment, errors = _errors(item, now, config['max_clock_skew'])
+        if errors: rejected.append({'index': index, 'errors': errors})
+        else: parsed.append((index, vin, mileage, moment))
+    vehicle_ids = dict(Vehicle.objects.filter(user=user, vin__in={vin for _, vin, _, _ in parsed}).values_list('vin', 'pk'))
+    cells = {}
+    for index, vin, mileage, moment in parsed:
+        vehicle_id = vehicle_ids.get(vin)
+        if vehicle_id is None:
+            rejected.append({'index': index, 'errors': {'vin': ["No vehicle of yours has this VIN."]}})
+            continue
+        cell = cells.setdefault((vehicle_id, bucket_of(moment, config['bucket_seconds'])), [mileage, 0, moment])
+        cell[0], cell[1], cell[2] = max(cell[0], mileage), cell[1] + 1, max(cell[2], moment)
+    accepted = sum(count for _, count, _ in cells.values())
+    if cells:
+        with transaction.atomic():
+            OdometerReading.objects.bulk_create([
+                OdometerReading(vehicle_id=vehicle_id, bucket=bucket, mileage=mileage, reading_count=count, recorded_at=latest)
+                for (vehicle_id, bucket), (mileage, count, latest) in cells.items()
+            ])
+            transaction.on_commit(lambda: _schedule_flush(config))
+    rejected.sort(key=lambda item: item['index'])
+    return accepted, rejected
+
+def _schedule_flush(config):
+    # Runs once the staged rows are committed, so any flush that starts from now on sees
+    # them: a queued one is enough, found without a lock (locking it in every ingest
+    # transaction serialized them all on that one row). A flush already running gets a
+    # successor. Rows staged by a process that dies before this are flushed by the next one.
+    from . import jobs, tasks
+    if Job.objects.filter(unique_key=FLUSH_JOB_KEY, status=Job.QUEUED).exists(): return
+    jobs.enqueue(tasks.flush_odometer_readings, delay=config['flush_interval'], unique_key=FLUSH_JOB_KEY)
+
+def _fold(vehicle_ids, cells, now):
+    """Merge (vehicle_id, bucket) -> [mileage, count, latest] into the samples and current_mileage of vehicle_ids"""
+    existing = {
+        (s.vehicle_id, s.bucket): s
+        for s in OdometerSample.objects.filter(vehicle_id__in=vehicle_ids, bucket__in={bucket for _, bucket in cells})
+    }
+    updated, new, highest = [], [], {}
+    for (vehicle_id, bucket), (mileage, count, latest) in cells.items():
+        highest[vehicle_id] = max(highest.get(vehicle_id, 0), mileage)
+        sample = existing.get((vehicle_id, bucket))
+        if sample is None:
+            new.append(OdometerSample(vehicle_id=vehicle_id, bucket=bucket, mileage=mileage, reading_count=count, recorded_at=latest))
+            continue
+        sample.mileage, sample.reading_count = max(sample.mileage, mileage), sample.reading_count + count
+        sample.recorded_at = max(sample.recorded_at, latest)
+        updated.append(sample)
+    OdometerSample.objects.bulk_update(updated, ['mileage', 'reading_count', 'recorded_at'], batch_size=VEHICLE_BATCH)
+    OdometerSample.objects.bulk_create(new, batch_size=VEHICLE_BATCH)
+    reading = Case(*[When(pk=pk, then=Value(m)) for pk, m in sorted(highest.items())], output_field=IntegerField())
+    raised = Vehicle.objects.filter(pk__in=sorted(highest), current_mileage__lt=reading)
+    owners = list(raised.values_list('pk', 'user_id'))
+    if owners: raised.update(current_mileage=reading, updated_at=now)
+    return owners
+
+def flush(batch_size=None):
+    """
+    Apply staged readings, batch_size (FLUSH_BATCH) rows per transaction, until none are
+    left; returns the number of staged rows and of vehicles whose mileage went up
+    """
+    batch_size = batch_size or ingest_config()['flush_batch']
+    staged = raised = 0
+    while True:
+        with transaction.atomic():
+            rows = list(OdometerReading.objects.select_for_update().order_by('pk')
+                        .values_list('pk', 'vehicle_id', 'bucket', 'mileage', 'reading_count', 'recorded_at')[:batch_size])
+            if not rows: break
+            cells = {}
+            for _, vehicle_id, bucket, mileage, count, latest in rows:
+                cell = cells.setdefault((vehicle_id, bucket), [mileage, 0, latest])
+                cell[0], cell[1], cell[2] = max(cell[0], mileage), cell[1] + count, max(cell[2], latest)
+            by_vehicle = sorted({vehicle_id for vehicle_id, _ in cells})
+            now, owners = timezone.now(), []
+            for start in range(0, len(by_vehicle), VEHICLE_BATCH):
+                chunk = set(by_vehicle[start:start + VEHICLE_BATCH])
+                owners += _fold(chunk, {key: cell for key, cell in cells.items() if key[0] in chunk}, now)
+            pks = [row[0] for row in rows]
+            for start in range(0, len(pks), VEHICLE_BATCH):
+                OdometerReading.objects.filter(pk__in=pks[start:start + VEHICLE_BATCH]).delete()
+            query_cache.invalidate(user_ids={user_id for _, user_id in owners}, vehicle_ids=[pk for pk, _ in owners])
+        staged += len(rows)
+        raised += len(owners)
+        if len(rows) < batch_size: break
+    if staged: logger.info(f"Flushed {staged} staged odometer readings, {raised} vehicles' mileage raised")
+    return staged, raised
+
+def series(vehicle, since=None, limit=1000):
+    """The vehicle's newest `limit` samples (from since on), oldest first"""
+    samples = OdometerSample.objects.filter(vehicle=vehicle)
+    if since is not None: samples = samples.filter(bucket__gte=since)
+    newest = samples.order_by('-bucket').values('bucket', 'mileage', 'reading_count', 'recorded_at')[:limit]
+    return list(reversed(newest))
@@ -0,0 +1,102 @@
+# AutoLogX/autologx/api/pagination.py
+"""
+Keyset (cursor) pagination.
+Pages are selected with a WHERE on the ordering columns of the last row seen, so
+page N costs the same as page 1 (no OFFSET scan) and rows inserted meanwhile do
+not shift pages. The cursor is an opaque URL-safe token holding those values.
+"""
+import base64
+import json
+from django.db.models import Q
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':'), default=str).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Return the list of values in a cursor, or None if it is missing or malformed."""
+    if not cursor: return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw.decode('utf-8'))
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return values if isinstance(values, list) else None
+
+def keyset_queryset(queryset, ordering, cursor=None):
+    """
+    Order queryset by ordering and, if cursor is valid, restrict it to rows after it
+    ordering is a list of field names, each optionally prefixed with '-', all in
+    the same direction and ending in a unique field (e.g. ['-date', '-id']).
+    """
+    fields = [f.lstrip('-') for f in ordering]
+    queryset = queryset.order_by(*ordering)
+    values = decode_cursor(cursor)
+    if values is None or len(values) != len(fields):
+        return queryset
+    try:
+        values = [queryset.model._meta.get_field(f).to_python(v) for f, v in zip(fields, values)]
+    except Exception:
+        return queryset
+    return queryset.filter(_after(fields, values, ordering[0].startswith('-')))
+
+def keyset_page(queryset, ordering, cursor=None, page_size=25):
+    """
+    Return (rows, next_cursor) for one page of queryset (see keyset_queryset)
+    next_cursor is None on the last page. A malformed cursor restarts at page 1.
+    """
+    rows = list(keyset_queryset(queryset, ordering, cursor)[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor([_value(last, f.lstrip('-')) for f in ordering])
+    return rows, next_cursor
+
+def _after(fields, values, descending):
+    """(a, b, c) < (x, y, z) expanded into ORs, which every backend can index-seek."""
+    op = 'lt' if descending else 'gt'
+    condition = Q()
+    for i in range(len(fields)):
+        term = Q(**{f"{fields[i]}__{op}": values[i]})
+        for j in range(i):
+            term &= Q(**{fields[j]: values[j]})
+        condition |= term
+    return condition
+
+def _value(row, field):
+    value = row[field] if isinstance(row, dict) else getattr(row, field)
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+class KeysetPagination(BasePagination):
+    """
+    DRF pagination over keyset_page: ?cursor= continues from the previous page's
+    `next` link, ?page_size= (capped at max_page_size) sets the page length.
+    The view's `ordering` attribute supplies the keyset ordering.
+    """
+    ordering = ['-id']
+    page_size = 100
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = getattr(view, 'ordering', None) or self.ordering
+        try:
+            page_size = min(max(int(request.query_params.get('page_size', self.page_size)), 1), self.max_page_size)
+        except ValueError:
+            page_size = self.page_size
+        self.request = request
+        rows, self.next_cursor = keyset_page(queryset, ordering, request.query_params.get('cursor'), page_size)
+        return rows
+
+    def get_paginated_response(self, data):
+        next_url = None
+        if self.next_cursor:
+            next_url = replace_query_param(self.request.build_absolute_uri(), 'cursor', self.next_cursor)
+        return Response({'next': next_url, 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {'type': 'object', 'required': ['results'], 'properties': {
+            'next': {'type': 'string', 'nullable': True, 'format': 'uri'}, 'results': schema}}
@@ -0,0 +1,139 @@
+# AutoLogX/autologx/api/query_cache.py
+"""
+Per-user / per-vehicle cache of read-path query results (vehicle_list, vehicle_detail).
+Entries are keyed by the version tokens of the scopes they read from: 'u<id>' (a
+user's vehicles) and 'v<id>' (one vehicle with its summary, service records and
+attachments). invalidate() replaces those tokens once the writing transaction
+commits, so later reads miss and recompute; superseded entries simply expire.
+Tokens are random and written with set(), never incremented, so invalidation is
+race-free on backends without atomic incr (FileBasedCache).
+Writes that send no model signals (bulk_create/bulk_update/update) must call
+invalidate() themselves; summaries.py and the bulk API serializers do.
+"""
+import hashlib
+import logging
+import secrets
+import threading
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from .db_routing import current_replica, routing_config
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+def _token():
+    return secrets.token_hex(8)
+
+class QueryCache:
+    """
+    Versioned query-result cache on a Django cache alias
+    Hit/miss counters per entry name are available from stats().
+    """
+
+    def __init__(self, cache_alias='query_cache', timeout=300, enabled=True):
+        self.cache_alias = cache_alias
+        self.timeout = timeout
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def _cache(self):
+        return caches[self.cache_alias]
+
+    def _count(self, name, outcome):
+        with self._lock:
+            counters = self._counters.setdefault(name, {'hits': 0, 'misses': 0, 'errors': 0})
+            counters[outcome] += 1
+
+    def _versions(self, cache, scopes):
+        keys = [f"qc:ver:{scope}" for scope in scopes]
+        found = cache.get_many(keys)
+        for key in keys:
+            if key not in found:
+                # First use or evicted: start a fresh token (add() keeps one a concurrent reader set)
+                cache.add(key, _token(), None)
+                found[key] = cache.get(key)
+        return [found[key] for key in keys]
+
+    def get_or_compute(self, name, scopes, params, compute):
+        """
+        Cached compute() for this name/params, valid while the scopes' versions are unchanged
+        scopes: e.g. ['u12', 'v345']; params: anything with a stable repr (request filters, cursor).
+        """
+        if not self.enabled: return compute()
+        try:
+            cache = self._cache()
+            versions = self._versions(cache, scopes)
+            digest = hashlib.sha1(repr(params).encode('utf-8')).hexdigest()[:16]
+            key = f"qc:{name}:" + ':'.join(f"{scope}.{version}" for scope, version in zip(scopes, versions)) + f":{digest}"
+            value = cache.get(key, _MISSING)
+        except Exception as e:
+            logger.warning(f"Query cache '{self.cache_alias}' unavailable for {name}: {e}")
+            self._count(name, 'errors')
+            return compute()
+        if value is not _MISSING:
+            self._count(name, 'hits')
+            return value
+        self._count(name, 'misses')
+        value = compute()
+        # Read from a lagging replica it may predate the last invalidation: keep it only for the lag
+        timeout = self.timeout if current_replica() is None else min(self.timeout, routing_config()['pin_seconds'])
+        try:
+            cache.set(key, value, timeout)
+        except Exception as e:
+            logger.warning(f"Query cache set failed for {name}: {e}")
+        return value
+
+    def invalidate(self, user_ids=(), vehicle_ids=()):
+        """
+        Make cached reads of these users' vehicle lists and these vehicles stale
+        Applied when the current transaction commits (immediately outside one), once per
+        scope however many rows changed, so a cascade delete costs one cache write per vehicle.
+        """
+        if not self.enabled: return
+        scopes = {f"u{pk}" for pk in user_ids if pk} | {f"v{pk}" for pk in vehicle_ids if pk}
+        if not scopes: return
+        connection = transaction.get_connection()
+        if not connection.in_atomic_block:
+            self._bump(scopes)
+            return
+        # One pending set per transaction: run_on_commit is replaced (not appended to) on
+        # commit and on (savepoint) rollback, so a changed list means our hook may be gone
+        pending = getattr(connection, '_query_cache_pending', None)
+        if pending is None or pending[0] is not connection.run_on_commit:
+            keys = set()
+            transaction.on_commit(lambda: self._bump(keys), robust=True)
+            pending = connection._query_cache_pending = (connection.run_on_commit, keys)
+        pending[1].update(scopes)
+
+    def _bump(self, scopes):
+        try:
+            self._cache().set_many({f"qc:ver:{scope}": _token() for scope in scopes}, None)
+        except Exception as e:
+            # Entries of these scopes may now outlive the change by up to the timeout
+            logger.error(f"Query cache invalidation failed for {len(scopes)} scopes: {e}")
+
+    def stats(self):
+        """Return hit/miss/error counters and hit rate per entry name, and in total."""
+        with self._lock:
+            names = {name: dict(counters) for name, counters in self._counters.items()}
+        total = {'hits': 0, 'misses': 0, 'errors': 0}
+        for counters in names.values():
+            for k in total: total[k] += counters[k]
+        for counters in (*names.values(), total):
+            lookups = counters['hits'] + counters['misses']
+            counters['hit_rate'] = round(counters['hits'] / lookups, 4) if lookups else 0.0
+        return {'enabled': self.enabled, 'cache_alias': self.cache_alias, 'total': total, 'names': names}
+
+    def reset_stats(self):
+        with self._lock:
+            self._counters.clear()
+
+_query_cache_settings = getattr(settings, 'QUERY_CACHE', {})
+query_cache = QueryCache(
+    cache_alias=_query_cache_settings.get('CACHE_ALIAS', 'query_cache'),
+    timeout=_query_cache_settings.get('TIMEOUT', 300),
+    enabled=_query_cache_settings.get('ENABLED', True),
+)
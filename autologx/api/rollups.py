@@ -0,0 +1,228 @@
+# AutoLogX/autologx/api/rollups.py
+"""
+Incremental maintenance of MonthlyRollup, and the fleet analytics read from it.
+Each rollup holds the count, cost and mileage span of a vehicle's service records in
+one (month, service_type, shop_name) cell. A saved record adds to its cell with a
+single UPDATE (an INSERT for a new cell); edits and deletes subtract from the old
+cell, and only re-read that cell's records (through the (vehicle, -date, -id) index)
+when the removed mileage was its min or max. bulk_create paths call records_added(),
+bulk_update paths records_changed().
+fleet_analytics() aggregates a window of rollups, so it costs the same however long
+the service history is.
+"""
+import logging
+from datetime import date, timedelta
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Sum, Value
+from django.db.models.functions import Greatest, Least, TruncMonth
+from .models import Vehicle, ServiceRecord, MonthlyRollup
+from .summaries import record_values
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal('0.01')
+ROLLUP_FIELDS = ['record_count', 'total_cost', 'min_mileage', 'max_mileage']
+
+def month_of(day):
+    return day.replace(day=1)
+
+def next_month(month):
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def _cell(values):
+    """(vehicle_id, month, service_type, shop_name) of a record, given as a dict of its values"""
+    return values['vehicle_id'], month_of(values['date']), values['service_type'], values['shop_name'] or ''
+
+def _key(cell):
+    vehicle_id, month, service_type, shop_name = cell
+    return {'vehicle_id': vehicle_id, 'month': month, 'service_type': service_type, 'shop_name': shop_name}
+
+def _add(cell, count, cost, low, high):
+    updated = MonthlyRollup.objects.filter(**_key(cell)).update(
+        record_count=F('record_count') + count, total_cost=F('total_cost') + cost,
+        min_mileage=Least('min_mileage', Value(low)), max_mileage=Greatest('max_mileage', Value(high)),
+    )
+    if updated: return
+    user_id = Vehicle.objects.filter(pk=cell[0]).values_list('user_id', flat=True).first()
+    if user_id is None: return  # The vehicle is being deleted
+    try:
+        with transaction.atomic():
+            MonthlyRollup.objects.create(user_id=user_id, record_count=count, total_cost=cost,
+                                         min_mileage=low, max_mileage=high, **_key(cell))
+    except IntegrityError:
+        _add(cell, count, cost, low, high)  # Created concurrently: add to that row
+
+def _remove(cell, count, cost, low, high):
+    with transaction.atomic():
+        rollup = MonthlyRollup.objects.select_for_update().filter(**_key(cell)).first()
+        if rollup is None: return
+        rollup.record_count -= count
+        if rollup.record_count <= 0:
+            rollup.delete()
+            return
+        rollup.total_cost -= Decimal(cost)
+        if low <= rollup.min_mileage or high >= rollup.max_mileage:
+            vehicle_id, month, service_type, shop_name = cell
+            span = ServiceRecord.objects.filter(
+                vehicle_id=vehicle_id, date__gte=month, date__lt=next_month(month), service_type=service_type, shop_name=shop_name,
+            ).aggregate(low=Min('mileage'), high=Max('mileage'))
+            if span['low'] is not None: rollup.min_mileage, rollup.max_mileage = span['low'], span['high']
+        rollup.save(update_fields=ROLLUP_FIELDS)
+
+def record_saved(record, old=None):
+    """
+    Apply a created (old is None) or edited ServiceRecord to the rollups
+    old is a dict of the record's previous values (summaries.record_values).
+    """
+    new = record_values(record)
+    if old is not None:
+        if _cell(old) == _cell(new) and (Decimal(old['cost']), old['mileage']) == (new['cost'], new['mileage']): return
+        _remove(_cell(old), 1, old['cost'], old['mileage'], old['mileage'])
+    _add(_cell(new), 1, new['cost'], new['mileage'], new['mileage'])
+
+def record_deleted_values(old):
+    """Remove a deleted ServiceRecord (given as a dict of its values) from the rollups"""
+    _remove(_cell(old), 1, old['cost'], old['mileage'], old['mileage'])
+
+def records_added(records):
+    """
+    Apply bulk-created ServiceRecords (bulk_create sends no signals) to the rollups
+    set-wise: cells are summed in Python, then existing rows are locked, read and
+    bulk_updated and new ones bulk_created. Call it inside the creating transaction.
+    """
+    cells = {}
+    for r in records:
+        cell = _cell({'vehicle_id': r.vehicle_id, 'date': r.date, 'service_type': r.service_type, 'shop_name': r.shop_name})
+        totals = cells.setdefault(cell, [0, Decimal('0'), r.mileage, r.mileage])
+        totals[0] += 1
+        totals[1] += Decimal(r.cost)
+        totals[2], totals[3] = min(totals[2], r.mileage), max(totals[3], r.mileage)
+    if not cells: return
+    months = [cell[1] for cell in cells]
+    with transaction.atomic():
+        existing = {
+            (r.vehicle_id, r.month, r.service_type, r.shop_name): r
+            for r in MonthlyRollup.objects.select_for_update().filter(
+                vehicle_id__in={cell[0] for cell in cells}, month__range=(min(months), max(months)))
+        }
+        updated, new = [], []
+        for cell, (count, cost, low, high) in cells.items():
+            rollup = existing.get(cell)
+            if rollup is None:
+                new.append((cell, count, cost, low, high))
+                continue
+            rollup.record_count += count
+            rollup.total_cost += cost
+            rollup.min_mileage, rollup.max_mileage = min(rollup.min_mileage, low), max(rollup.max_mileage, high)
+            updated.append(rollup)
+        MonthlyRollup.objects.bulk_update(updated, ROLLUP_FIELDS, batch_size=1000)
+        owners = dict(Vehicle.objects.filter(pk__in={cell[0] for cell, *_ in new}).values_list('pk', 'user_id'))
+        try:
+            with transaction.atomic():
+                MonthlyRollup.objects.bulk_create([
+                    MonthlyRollup(user_id=owners[cell[0]], record_count=count, total_cost=cost, min_mileage=low, max_mileage=high, **_key(cell))
+                    for cell, count, cost, low, high in new if cell[0] in owners
+                ], batch_size=1000)
+        except IntegrityError:
+            # Some cell was created concurrently: fall back to one upsert per cell
+            for cell, count, cost, low, high in new: _add(cell, count, cost, low, high)
+
+def records_changed(changes):
+    """
+    Apply bulk-updated ServiceRecords (bulk_update sends no signals), given as (record,
+    previous values) pairs: the old values are subtracted once per old cell, then the
+    new ones added set-wise through records_added(). Call it inside the updating transaction.
+    """
+    removed, moved = {}, []
+    for record, old in changes:
+        new = record_values(record)
+        if _cell(old) == _cell(new) and (Decimal(old['cost']), old['mileage']) == (new['cost'], new['mileage']): continue
+        totals = removed.setdefault(_cell(old), [0, Decimal('0'), old['mileage'], old['mileage']])
+        totals[0] += 1
+        totals[1] += Decimal(old['cost'])
+        totals[2], totals[3] = min(totals[2], old['mileage']), max(totals[3], old['mileage'])
+        moved.append(record)
+    with transaction.atomic():
+        for cell in sorted(removed): _remove(cell, *removed[cell])
+        records_added(moved)
+
+def vehicle_owner_saved(vehicle):
+    """Move a vehicle's rollups to its current owner (a no-op unless the owner changed)"""
+    MonthlyRollup.objects.filter(vehicle_id=vehicle.pk).exclude(user_id=vehicle.user_id).update(user_id=vehicle.user_id)
+
+def rebuild_rollups(vehicles=None, batch_size=1000):
+    """
+    Recompute the rollups of vehicles (default: all) from their service records: one
+    grouped aggregate per batch of vehicles, replacing their rows. Returns the number
+    of vehicles processed.
+    """
+    vehicles = (vehicles if vehicles is not None else Vehicle.objects.all()).order_by('pk').values_list('pk', 'user_id')
+    processed, last_pk = 0, 0
+    while True:
+        batch = list(vehicles.filter(pk__gt=last_pk)[:batch_size])
+        if not batch: break
+        last_pk = batch[-1][0]
+        owners = dict(batch)
+        with transaction.atomic():
+            grouped = (ServiceRecord.objects.filter(vehicle_id__in=owners).order_by()
+                       .values('vehicle_id', 'service_type', 'shop_name', month=TruncMonth('date'))
+                       .annotate(n=Count('id'), cost=Sum('cost'), low=Min('mileage'), high=Max('mileage')))
+            rows = [MonthlyRollup(
+                user_id=owners[row['vehicle_id']], vehicle_id=row['vehicle_id'], month=row['month'],
+                service_type=row['service_type'], shop_name=row['shop_name'], record_count=row['n'],
+                # SQLite sums decimals as floats; round back to cents
+                total_cost=(row['cost'] or Decimal('0')).quantize(CENT), min_mileage=row['low'], max_mileage=row['high'],
+            ) for row in grouped]
+            MonthlyRollup.objects.filter(vehicle_id__in=owners).delete()
+            MonthlyRollup.objects.bulk_create(rows, batch_size=batch_size)
+        processed += len(batch)
+    return processed
+
+def fleet_analytics(user, months=12, today=None, top_vehicles=50, top_shops=10):
+    """
+    Fleet spend over the last `months` months (the current one included), from the rollups:
+    - months: per month, the total and the cost by service type (every month, zeros included)
+    - vehicles: the top_vehicles vehicles by spend, with cost per mile, the mileage covered
+      being the span between the vehicle's first and last service in the window (None below one mile)
+    - shops: the top_shops shops by spend (records without a shop name are left out)
+    """
+    first = month_of(today or date.today())
+    for _ in range(months - 1): first = month_of(first - timedelta(days=1))
+    rollups = MonthlyRollup.objects.filter(user=user, month__gte=first).order_by()
+    zero = Decimal('0.00')
+
+    by_month = {}
+    month = first
+    while month <= month_of(today or date.today()):
+        by_month[month] = {'month': month, 'count': 0, 'total': zero, 'by_type': {}}
+        month = next_month(month)
+    for row in rollups.values('month', 'service_type').annotate(count=Sum('record_count'), cost=Sum('total_cost')):
+        item = by_month.get(row['month'])
+        if item is None: continue  # Dated in the future
+        cost = (row['cost'] or zero).quantize(CENT)
+        item['count'] += row['count']
+        item['total'] += cost
+        item['by_type'][row['service_type']] = cost
+
+    spend = list(rollups.values('vehicle_id').annotate(
+        count=Sum('record_count'), cost=Sum('total_cost'), low=Min('min_mileage'), high=Max('max_mileage'))
+        .order_by('-cost', 'vehicle_id')[:top_vehicles])
+    names = {v.pk: str(v) for v in Vehicle.objects.filter(pk__in=[row['vehicle_id'] for row in spend]).only('id', 'year', 'make', 'model')}
+    vehicles = []
+    for row in spend:
+        cost, miles = (row['cost'] or zero).quantize(CENT), row['high'] - row['low']
+        vehicles.append({
+            'vehicle_id': row['vehicle_id'], 'vehicle': names.get(row['vehicle_id'], ''), 'count': row['count'], 'cost': cost,
+            'miles': miles, 'cost_per_mile': (cost / miles).quantize(Decimal('0.001')) if miles >= 1 else None,
+        })
+
+    shops = [
+        {'shop_name': row['shop_name'], 'count': row['count'], 'cost': (row['cost'] or zero).quantize(CENT)}
+        for row in rollups.exclude(shop_name='').values('shop_name')
+        .annotate(count=Sum('record_count'), cost=Sum('total_cost')).order_by('-cost', 'shop_name')[:top_shops]
+    ]
+    return {
+        'start': first, 'months': list(by_month.values()), 'vehicles': vehicles, 'shops': shops,
+        'total_cost': sum((item['total'] for item in by_month.values()), zero),
+    }
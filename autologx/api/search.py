@@ -0,0 +1,279 @@
+# AutoLogX/autologx/api/search.py
+"""
+Full-text search over service records: description, notes, shop name and attachment titles.
+The index lives in the database and is kept current by triggers, so every write path
+(ORM saves, bulk_create, queryset update/delete, imports) updates it:
+- SQLite: FTS5 table api_servicerecord_fts (rowid = record id) ranked with bm25()
+- PostgreSQL: api_servicerecord_search, a weighted tsvector per record with a GIN index,
+  ranked with ts_rank_cd()
+Each indexed record carries its owner, so a user's search only walks that user's
+postings. Other backends (or SQLite without FTS5) fall back to icontains scans.
+SQLite drops a table's triggers when a migration rebuilds it: after altering
+ServiceRecord, Attachment or Vehicle there, run `manage.py rebuild_search_index`.
+"""
+import html
+import logging
+import re
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.safestring import mark_safe
+from .models import ServiceRecord
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'api_servicerecord_fts'
+SEARCH_TABLE = 'api_servicerecord_search'
+MAX_TERMS = 8
+MAX_OFFSET = 1000
+# Only the newest MAX_CANDIDATES matches are ranked: a term in most of a user's records
+# would otherwise score every one of them
+MAX_CANDIDATES = 5000
+# Match markers placed by the database, turned into <mark> after HTML-escaping the text
+START, STOP = '⦃', '⦄'
+TERM_RE = re.compile(r'\w+')
+
+SQLITE_INSTALL = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        description, notes, shop_name, attachment_titles, owner,
+        tokenize = 'porter unicode61 remove_diacritics 2', prefix = '2 3')""",
+    f"""CREATE TRIGGER api_servicerecord_fts_insert AFTER INSERT ON api_servicerecord BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, description, notes, shop_name, attachment_titles, owner)
+        VALUES (new.id, new.description, new.notes, new.shop_name, '',
+                (SELECT 'u' || user_id FROM api_vehicle WHERE id = new.vehicle_id));
+    END""",
+    f"""CREATE TRIGGER api_servicerecord_fts_update AFTER UPDATE OF description, notes, shop_name, vehicle_id
+    ON api_servicerecord BEGIN
+        UPDATE {FTS_TABLE} SET description = new.description, notes = new.notes, shop_name = new.shop_name,
+            owner = (SELECT 'u' || user_id FROM api_vehicle WHERE id = new.vehicle_id)
+        WHERE rowid = new.id;
+    END""",
+    f"""CREATE TRIGGER api_servicerecord_fts_delete AFTER DELETE ON api_servicerecord BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END""",
+    *[f"""CREATE TRIGGER api_attachment_fts_{name} AFTER {event} ON api_attachment BEGIN
+        {' '.join(f'''UPDATE {FTS_TABLE} SET attachment_titles = (SELECT coalesce(group_concat(title, ' '), '')
+            FROM api_attachment WHERE service_record_id = {row}.service_record_id) WHERE rowid = {row}.service_record_id;'''
+            for row in rows)}
+    END""" for name, event, rows in [('insert', 'INSERT', ['new']), ('update', 'UPDATE OF title, service_record_id', ['new', 'old']),
+                                     ('delete', 'DELETE', ['old'])]],
+    f"""CREATE TRIGGER api_vehicle_fts_owner AFTER UPDATE OF user_id ON api_vehicle BEGIN
+        UPDATE {FTS_TABLE} SET owner = 'u' || new.user_id
+        WHERE rowid IN (SELECT id FROM api_servicerecord WHERE vehicle_id = new.id);
+    END""",
+]
+SQLITE_UNINSTALL = [
+    *[f"DROP TRIGGER IF EXISTS {name}" for name in (
+        'api_servicerecord_fts_insert', 'api_servicerecord_fts_update', 'api_servicerecord_fts_delete',
+        'api_attachment_fts_insert', 'api_attachment_fts_update', 'api_attachment_fts_delete', 'api_vehicle_fts_owner')],
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+SQLITE_REBUILD = [
+    f"DELETE FROM {FTS_TABLE}",
+    f"""INSERT INTO {FTS_TABLE} (rowid, description, notes, shop_name, attachment_titles, owner)
+        SELECT r.id, r.description, r.notes, r.shop_name,
+               coalesce((SELECT group_concat(title, ' ') FROM api_attachment WHERE service_record_id = r.id), ''),
+               'u' || v.user_id
+        FROM api_servicerecord r JOIN api_vehicle v ON v.id = r.vehicle_id""",
+    f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')",
+]
+
+# Weights: description A, shop name B, notes C, attachment titles D
+_PG_DOCUMENT = """setweight(to_tsvector('english', coalesce(r.description, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(r.shop_name, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(r.notes, '')), 'C') ||
+    setweight(to_tsvector('english', t.titles), 'D')"""
+_PG_SELECT = f"""SELECT r.id, v.user_id, t.titles, {_PG_DOCUMENT}
+    FROM api_servicerecord r JOIN api_vehicle v ON v.id = r.vehicle_id,
+    LATERAL (SELECT coalesce(string_agg(a.title, ' '), '') AS titles
+             FROM api_attachment a WHERE a.service_record_id = r.id) t"""
+POSTGRES_INSTALL = [
+    f"""CREATE TABLE {SEARCH_TABLE} (
+        record_id integer PRIMARY KEY, owner_id integer NOT NULL,
+        attachment_titles text NOT NULL DEFAULT '', document tsvector NOT NULL)""",
+    f"CREATE INDEX {SEARCH_TABLE}_document ON {SEARCH_TABLE} USING GIN (document)",
+    f"CREATE INDEX {SEARCH_TABLE}_owner ON {SEARCH_TABLE} (owner_id)",
+    f"""CREATE FUNCTION {SEARCH_TABLE}_refresh(rid integer) RETURNS void AS $$
+        INSERT INTO {SEARCH_TABLE} (record_id, owner_id, attachment_titles, document)
+        {_PG_SELECT} WHERE r.id = rid
+        ON CONFLICT (record_id) DO UPDATE SET owner_id = EXCLUDED.owner_id,
+            attachment_titles = EXCLUDED.attachment_titles, document = EXCLUDED.document
+    $$ LANGUAGE sql""",
+    f"""CREATE FUNCTION {SEARCH_TABLE}_record_trigger() RETURNS trigger AS $$ BEGIN
+        IF TG_OP = 'DELETE' THEN
+            DELETE FROM {SEARCH_TABLE} WHERE record_id = OLD.id;
+        ELSE
+            PERFORM {SEARCH_TABLE}_refresh(NEW.id);
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql""",
+    f"""CREATE TRIGGER {SEARCH_TABLE}_record AFTER INSERT OR DELETE OR UPDATE OF description, notes, shop_name, vehicle_id
+        ON api_servicerecord FOR EACH ROW EXECUTE FUNCTION {SEARCH_TABLE}_record_trigger()""",
+    f"""CREATE FUNCTION {SEARCH_TABLE}_attachment_trigger() RETURNS trigger AS $$ BEGIN
+        IF TG_OP <> 'DELETE' THEN PERFORM {SEARCH_TABLE}_refresh(NEW.service_record_id); END IF;
+        IF TG_OP <> 'INSERT' THEN PERFORM {SEARCH_TABLE}_refresh(OLD.service_record_id); END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql""",
+    f"""CREATE TRIGGER {SEARCH_TABLE}_attachment AFTER INSERT OR DELETE OR UPDATE OF title, service_record_id
+        ON api_attachment FOR EACH ROW EXECUTE FUNCTION {SEARCH_TABLE}_attachment_trigger()""",
+    f"""CREATE FUNCTION {SEARCH_TABLE}_owner_trigger() RETURNS trigger AS $$ BEGIN
+        UPDATE {SEARCH_TABLE} SET owner_id = NEW.user_id
+        WHERE record_id IN (SELECT id FROM api_servicerecord WHERE vehicle_id = NEW.id);
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql""",
+    f"""CREATE TRIGGER {SEARCH_TABLE}_owner AFTER UPDATE OF user_id ON api_vehicle
+        FOR EACH ROW EXECUTE FUNCTION {SEARCH_TABLE}_owner_trigger()""",
+]
+POSTGRES_UNINSTALL = [
+    f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_record ON api_servicerecord",
+    f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_attachment ON api_attachment",
+    f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_owner ON api_vehicle",
+    *[f"DROP FUNCTION IF EXISTS {SEARCH_TABLE}_{name}" for name in
+      ('record_trigger()', 'attachment_trigger()', 'owner_trigger()', 'refresh(integer)')],
+    f"DROP TABLE IF EXISTS {SEARCH_TABLE}",
+]
+POSTGRES_REBUILD = [
+    f"TRUNCATE {SEARCH_TABLE}",
+    f"INSERT INTO {SEARCH_TABLE} (record_id, owner_id, attachment_titles, document) {_PG_SELECT}",
+    f"ANALYZE {SEARCH_TABLE}",
+]
+
+def _sqlite_has_fts5(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+            cursor.execute("DROP TABLE temp.fts5_probe")
+        return True
+    except Exception:
+        return False
+
+def _run(connection, statements):
+    with connection.cursor() as cursor:
+        for sql in statements: cursor.execute(sql)
+
+def install(connection, rebuild=True):
+    """Create the index and its triggers (replacing any), then fill it; False if the backend has none"""
+    if connection.vendor == 'postgresql':
+        _run(connection, POSTGRES_UNINSTALL + POSTGRES_INSTALL + (POSTGRES_REBUILD if rebuild else []))
+    elif connection.vendor == 'sqlite' and _sqlite_has_fts5(connection):
+        _run(connection, SQLITE_UNINSTALL + SQLITE_INSTALL + (SQLITE_REBUILD if rebuild else []))
+    else:
+        logger.warning(f"No full-text index on {connection.vendor}: search falls back to icontains scans")
+        return False
+    _available.pop(connection.alias, None)
+    return True
+
+def uninstall(connection):
+    if connection.vendor == 'postgresql': _run(connection, POSTGRES_UNINSTALL)
+    elif connection.vendor == 'sqlite': _run(connection, SQLITE_UNINSTALL)
+    _available.pop(connection.alias, None)
+
+_available = {}  # alias -> whether the index table exists there
+
+def index_available(connection):
+    if connection.alias not in _available:
+        table = SEARCH_TABLE if connection.vendor == 'postgresql' else FTS_TABLE
+        _available[connection.alias] = (connection.vendor in ('postgresql', 'sqlite')
+                                         and table in connection.introspection.table_names(include_views=False))
+    return _available[connection.alias]
+
+def parse_terms(text):
+    """Lower-cased words of a free-text query (at most MAX_TERMS); operators are never passed through"""
+    return [term.lower() for term in TERM_RE.findall(text or '')][:MAX_TERMS]
+
+def highlight(text):
+    """Safe HTML of text with the database's match markers turned into <mark>"""
+    return mark_safe(html.escape(text or '').replace(START, '<mark>').replace(STOP, '</mark>'))
+
+def _sqlite_query(terms, user_id, vehicle_id, limit, offset):
+    # Every term must match in the searchable columns (the last one as a prefix, for
+    # search-as-you-type); owner narrows the postings to the user's records
+    match = f'owner : "u{user_id}" AND ' if user_id is not None else ''
+    match += '{description notes shop_name attachment_titles} : (' + ' '.join(f'"{t}"' for t in terms) + '*)'
+    vehicle = "AND rowid IN (SELECT id FROM api_servicerecord WHERE vehicle_id = %s)" if vehicle_id else ""
+    matches = f"{FTS_TABLE} MATCH %s {vehicle}"
+    # FTS5 applies the rowid bound inside the index scan, and walks rowids in order cheaply
+    sql = f"""SELECT rowid, bm25({FTS_TABLE}, 10.0, 3.0, 5.0, 2.0, 0.0) AS score,
+            snippet({FTS_TABLE}, 0, %s, %s, '…', 16), snippet({FTS_TABLE}, 1, %s, %s, '…', 16),
+            highlight({FTS_TABLE}, 2, %s, %s), highlight({FTS_TABLE}, 3, %s, %s)
+        FROM {FTS_TABLE} WHERE {matches} AND rowid >= (SELECT coalesce(min(rowid), 0) FROM (
+            SELECT rowid FROM {FTS_TABLE} WHERE {matches} ORDER BY rowid DESC LIMIT {MAX_CANDIDATES}))
+        ORDER BY score, rowid DESC LIMIT %s OFFSET %s"""
+    where = [match] + ([vehicle_id] if vehicle_id else [])
+    return sql, [START, STOP] * 4 + where * 2 + [limit, offset]
+
+def _postgres_query(terms, user_id, vehicle_id, limit, offset):
+    tsquery = ' & '.join(terms) + ':*'
+    fragments = f"StartSel={START}, StopSel={STOP}, MaxFragments=2, MaxWords=16, MinWords=4"
+    whole = f"StartSel={START}, StopSel={STOP}, HighlightAll=true"
+    where = ["s.document @@ q"] + (["s.owner_id = %s"] if user_id is not None else []) + (["r.vehicle_id = %s"] if vehicle_id else [])
+    # Headlines only for the page of results: ts_headline re-parses the text
+    sql = f"""SELECT m.record_id, m.score,
+            ts_headline('english', m.description, m.q, %s), ts_headline('english', m.notes, m.q, %s),
+            ts_headline('english', m.shop_name, m.q, %s), ts_headline('english', m.attachment_titles, m.q, %s)
+        FROM (SELECT s.record_id, ts_rank_cd(s.document, q) AS score, q, r.description, r.notes, r.shop_name, s.attachment_titles
+              FROM (SELECT s.record_id FROM {SEARCH_TABLE} s JOIN api_servicerecord r ON r.id = s.record_id,
+                        to_tsquery('english', %s) q
+                    WHERE {' AND '.join(where)} ORDER BY s.record_id DESC LIMIT {MAX_CANDIDATES}) c
+              JOIN {SEARCH_TABLE} s ON s.record_id = c.record_id JOIN api_servicerecord r ON r.id = s.record_id,
+              to_tsquery('english', %s) q
+              ORDER BY score DESC, s.record_id DESC LIMIT %s OFFSET %s) m
+        ORDER BY m.score DESC, m.record_id DESC"""
+    params = [fragments, fragments, whole, whole, tsquery] + ([user_id] if user_id is not None else []) + ([vehicle_id] if vehicle_id else [])
+    return sql, params + [tsquery, limit, offset]
+
+def _fallback(terms, user_id, vehicle_id, limit, offset):
+    records = ServiceRecord.objects.all()
+    if user_id is not None: records = records.filter(vehicle__user_id=user_id)
+    if vehicle_id: records = records.filter(vehicle_id=vehicle_id)
+    for term in terms:
+        records = records.filter(Q(description__icontains=term) | Q(notes__icontains=term) | Q(shop_name__icontains=term)
+                                 | Q(attachments__title__icontains=term))
+    marker = re.compile('|'.join(re.escape(t) for t in terms), re.IGNORECASE)
+    mark = lambda text: marker.sub(lambda m: f"{START}{m.group(0)}{STOP}", text or '')
+    rows = []
+    for record in records.distinct().order_by('-date', '-id').prefetch_related('attachments')[offset:offset + limit]:
+        titles = ' '.join(a.title for a in record.attachments.all())
+        rows.append((record.pk, 0.0, mark(record.description), mark(record.notes), mark(record.shop_name), mark(titles)))
+    return rows
+
+def search(text, user=None, vehicle_id=None, page=1, page_size=20):
+    """
+    Ranked matches for a free-text query: ([result dict, ...], has_next)
+    Restricted to user's records (all records for user=None). Each result has the record
+    (with its vehicle) and highlights: safe HTML of each matching field.
+    """
+    terms = parse_terms(text)
+    offset = (max(page, 1) - 1) * page_size
+    if not terms or offset > MAX_OFFSET: return [], False
+    connection = connections[router.db_for_read(ServiceRecord)]
+    user_id = user.pk if user is not None else None
+    args = (terms, user_id, vehicle_id, page_size + 1, offset)
+    if not index_available(connection):
+        rows = _fallback(*args)
+    else:
+        sql, params = (_postgres_query if connection.vendor == 'postgresql' else _sqlite_query)(*args)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+    has_next, rows = len(rows) > page_size, rows[:page_size]
+    records = ServiceRecord.objects.select_related('vehicle').in_bulk([row[0] for row in rows])
+    results = []
+    for pk, score, *fields in rows:
+        if pk not in records: continue  # Deleted since the index was read
+        highlights = {name: highlight(value) for name, value in zip(('description', 'notes', 'shop_name', 'attachments'), fields)
+                      if value and START in value}
+        results.append({'record': records[pk], 'score': round(abs(score), 4), 'highlights': highlights})
+    return results, has_next
+
+def filter_matching(queryset, text):
+    """ServiceRecord queryset narrowed through the index to records matching every word of text, or None without an index"""
+    terms = parse_terms(text)
+    connection = connections[queryset.db]
+    if not terms or not index_available(connection): return None
+    if connection.vendor == 'postgresql':
+        sql, params = f"SELECT record_id FROM {SEARCH_TABLE} WHERE document @@ to_tsquery('english', %s)", [' & '.join(terms) + ':*']
+    else:
+        sql = f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+        params = ['{description notes shop_name attachment_titles} : (' + ' '.join(f'"{t}"' for t in terms) + '*)']
+    return queryset.filter(pk__in=RawSQL(sql, params))
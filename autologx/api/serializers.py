@@ -0,0 +1,188 @@
+# AutoLogX/autologx/api/serializers.py
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from rest_framework import serializers
+from .models import Vehicle, ServiceRecord, Attachment, VehicleSummary
+from .query_cache import query_cache
+
+# Enough of each attachment for ServiceRecordSerializer.attachments
+ATTACHMENT_IDS = Prefetch('attachments', queryset=Attachment.objects.only('id', 'service_record_id'))
+
+class OwnedRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField limited to the requesting user's rows (owner is the lookup to User)
+    Lookups are memoized on the root serializer, so a bulk payload naming the same
+    vehicle a thousand times costs one query.
+    """
+
+    def __init__(self, owner, **kwargs):
+        self.owner = owner
+        super().__init__(**kwargs)
+
+    def get_queryset(self):
+        request = self.context.get('request')
+        queryset = super().get_queryset()
+        return queryset.filter(**{self.owner: request.user}) if request is not None else queryset.none()
+
+    def to_internal_value(self, data):
+        memo = self.root.__dict__.setdefault('_related_memo', {})
+        key = (self.field_name, str(data))
+        if key not in memo: memo[key] = super().to_internal_value(data)
+        return memo[key]
+
+class SparseFieldsMixin:
+    """
+    Sparse fieldsets: ?fields=id,make,model limits the output to those fields.
+    Unknown names are ignored; without the parameter all fields are returned.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        wanted = request.query_params.get('fields') if request is not None and request.method == 'GET' else None
+        if wanted:
+            keep = {name.strip() for name in wanted.split(',') if name.strip()}
+            for name in set(self.fields) - keep:
+                self.fields.pop(name)
+
+class BulkListSerializer(serializers.ListSerializer):
+    """
+    many=True serializer that writes with bulk_create / bulk_update.
+    For updates, pass the instances and give each item the id of the one it updates.
+    """
+
+    def run_child_validation(self, data):
+        if self.instance is not None:
+            if not hasattr(self, '_by_id'): self._by_id = {obj.pk: obj for obj in self.instance}
+            try:
+                instance = self._by_id.get(int(data.get('id')))
+            except (AttributeError, TypeError, ValueError):
+                instance = None
+            if instance is None:
+                raise serializers.ValidationError({'id': ["Missing or unknown id."]})
+            self.child.instance = instance
+            self.child.initial_data = data
+        return super().run_child_validation(data)
+
+    def create(self, validated_data):
+        model = self.child.Meta.model
+        objs = [model(**{k: v for k, v in attrs.items() if k != 'id'}) for attrs in validated_data]
+        with transaction.atomic():
+            created = model.objects.bulk_create(objs, batch_size=500)
+            self.child.after_bulk_write(created)
+        return created
+
+    def update(self, instances, validated_data):
+        model = self.child.Meta.model
+        by_id = {obj.pk: obj for obj in instances}
+        previous, fields = {}, set()
+        for attrs in validated_data:
+            obj = by_id[attrs.pop('id')]
+            attnames = [model._meta.get_field(field).attname for field in attrs]
+            previous[obj.pk] = {name: getattr(obj, name) for name in attnames}
+            for field, value in attrs.items(): setattr(obj, field, value)
+            fields.update(attrs)
+        if not fields: return instances
+        # bulk_update does not run pre_save, so stamp auto_now fields here
+        auto_now = [f for f in model._meta.concrete_fields if getattr(f, 'auto_now', False)]
+        updated = [by_id[pk] for pk in previous]
+        for obj in updated:
+            for field in auto_now: field.pre_save(obj, add=False)
+        fields.update(f.name for f in auto_now)
+        with transaction.atomic():
+            model.objects.bulk_update(updated, sorted(fields), batch_size=500)
+            self.child.after_bulk_write(updated, previous)
+        return instances
+
+class BulkModelSerializer(serializers.ModelSerializer):
+    # Writable so bulk update items can say which row they update; never saved
+    id = serializers.IntegerField(required=False)
+
+    class Meta:
+        list_serializer_class = BulkListSerializer
+
+    def create(self, validated_data):
+        validated_data.pop('id', None)
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        validated_data.pop('id', None)
+        return super().update(instance, validated_data)
+
+    def after_bulk_write(self, objs, previous=None):
+        """
+        Called inside the bulk write's transaction; bulk writes send no signals
+        previous is None for creates, else {pk: {attname: old value}} of changed fields.
+        """
+
+class VehicleSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = VehicleSummary
+        fields = ['record_count', 'lifetime_cost', 'cost_by_type', 'latest_mileage']
+
+class VehicleSerializer(SparseFieldsMixin, BulkModelSerializer):
+    summary = VehicleSummarySerializer(read_only=True)
+
+    class Meta(BulkModelSerializer.Meta):
+        model = Vehicle
+        fields = ['id', 'vin', 'make', 'model', 'year', 'trim', 'engine', 'engine_size', 'fuel_type',
+                  'transmission', 'oil_viscosity', 'current_mileage', 'last_oil_change_mileage',
+                  'last_oil_change_date', 'last_service_mileage', 'last_service_date', 'stock_tire_size',
+                  'stock_wheel_size', 'current_tire_size', 'current_wheel_size', 'summary',
+                  'created_at', 'updated_at']
+        # Maintained from service records (see summaries.py)
+        read_only_fields = ['last_oil_change_mileage', 'last_oil_change_date', 'last_service_mileage',
+                            'last_service_date', 'created_at', 'updated_at']
+
+    def after_bulk_write(self, objs, previous=None):
+        owners = {v.user_id for v in objs} | {old['user_id'] for old in (previous or {}).values() if 'user_id' in old}
+        query_cache.invalidate(user_ids=owners, vehicle_ids=[v.pk for v in objs])
+        if previous is None:
+            summaries = VehicleSummary.objects.bulk_create([VehicleSummary(vehicle=v) for v in objs], ignore_conflicts=True, batch_size=500)
+            for vehicle, summary in zip(objs, summaries): vehicle.summary = summary
+
+class ServiceRecordSerializer(SparseFieldsMixin, BulkModelSerializer):
+    vehicle = OwnedRelatedField(owner='user', queryset=Vehicle.objects.all())
+    attachments = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+
+    class Meta(BulkModelSerializer.Meta):
+        model = ServiceRecord
+        fields = ['id', 'vehicle', 'service_type', 'date', 'mileage', 'description', 'cost', 'shop_name',
+                  'notes', 'next_service_date', 'next_service_mileage', 'attachments', 'created_at']
+        read_only_fields = ['created_at']
+
+    def after_bulk_write(self, objs, previous=None):
+        from . import rollups, summaries
+        if previous is None:
+            summaries.records_added(objs)
+            rollups.records_added(objs)
+        else:
+            changes = [(r, {**summaries.record_values(r), **previous[r.pk]}) for r in objs]
+            summaries.records_changed(changes)
+            rollups.records_changed(changes)
+        prefetch_related_objects(objs, ATTACHMENT_IDS)
+
+class AttachmentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    service_record = OwnedRelatedField(owner='vehicle__user', queryset=ServiceRecord.objects.all())
+    vehicle = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
+    download = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Attachment
+        fields = ['id', 'service_record', 'vehicle', 'title', 'attachment_type', 'file', 'download', 'thumbnail', 'uploaded_at']
+        read_only_fields = ['uploaded_at']
+
+    def get_thumbnail(self, obj):
+        return self._absolute(obj.thumbnail_url)
+
+    def get_download(self, obj):
+        return self._absolute(obj.download_url)
+
+    def _absolute(self, url):
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if url and request is not None else url
+
+    def get_vehicle(self, obj):
+        # Annotated by the viewset's queryset; freshly created attachments fall back to the FK
+        return getattr(obj, 'vehicle_id', None) or obj.service_record.vehicle_id
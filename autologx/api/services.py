@@ -1,49 +1,599 @@
 # AutoLogX/autologx/api/services.py
+import asyncio
+import httpx
 import requests
+from asgiref.sync import sync_to_async
 import logging
+import random
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.conf import settings
+from django.core.cache import caches
+from .metrics import record_outbound
+from .vin_index import validate_vin, decode_vin_offline
 
 # Configure logger for this module
 logger = logging.getLogger(__name__)
 
-def decode_vin(vin):
+NHTSA_API_BASE = getattr(settings, 'NHTSA_API_BASE', 'https://vpic.nhtsa.dot.gov/api').rstrip('/')
+NHTSA_DECODE_URL = NHTSA_API_BASE + "/vehicles/DecodeVin/{vin}?format=json"
+NHTSA_BATCH_DECODE_URL = NHTSA_API_BASE + "/vehicles/DecodeVINValuesBatch/"
+# vPIC accepts at most 50 VINs per batch request
+NHTSA_BATCH_MAX_VINS = 50
+
+# Flat DecodeVINValuesBatch keys -> the DecodeVin 'Variable' names parse_vin_results understands
+BATCH_FIELD_VARIABLES = {
+    'Make': 'Make',
+    'Model': 'Model',
+    'ModelYear': 'Model Year',
+    'Trim': 'Trim',
+    'EngineModel': 'Engine Number 1',
+    'DisplacementCI': 'Engine displacement (cubic inches)',
+    'FuelTypePrimary': 'Fuel Type - Primary',
+    'TransmissionStyle': 'Transmission Style',
+}
+
+# Stored in place of vehicle data for VINs that NHTSA answered but could not decode
+_NEGATIVE = '__undecodable__'
+
+def normalize_vin(vin):
+    """Strip whitespace and uppercase a VIN so equal VINs share one cache entry."""
+    return (vin or '').strip().upper()
+
+class VinDecodeCache:
+    """
+    Two-level cache for decoded VINs.
+    Level 1 is a size-bounded in-process LRU, level 2 is a shared Django cache
+    so other workers (and restarts) reuse each other's lookups.
+    Failed decodes are cached for a shorter negative TTL.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60 * 60 * 24 * 30, negative_ttl=60 * 60, cache_alias='vin_decode'):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.cache_alias = cache_alias
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'lru_hits': 0, 'shared_hits': 0, 'negative_hits': 0, 'misses': 0, 'stores': 0}
+
+    def _shared(self):
+        if not self.cache_alias: return None
+        try:
+            return caches[self.cache_alias]
+        except Exception as e:
+            logger.warning(f"VIN cache: shared cache '{self.cache_alias}' unavailable: {e}")
+            return None
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _lru_get(self, key):
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is None: return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._lru[key]
+                return None
+            self._lru.move_to_end(key)
+            return value
+
+    def _lru_set(self, key, value, ttl):
+        with self._lock:
+            self._lru[key] = (time.monotonic() + ttl, value)
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.maxsize:
+                self._lru.popitem(last=False)
+
+    def get(self, vin):
+        """
+        Look up a VIN in both cache levels.
+        Returns (hit, vehicle_data); vehicle_data is None for a cached failure.
+        """
+        key = f"vin:{normalize_vin(vin)}"
+        value = self._lru_get(key)
+        if value is not None:
+            self._count('lru_hits')
+        else:
+            shared = self._shared()
+            try:
+                value = shared.get(key) if shared is not None else None
+            except Exception as e:
+                logger.warning(f"VIN cache: shared get failed for {vin}: {e}")
+                value = None
+            ttl = None
+            if isinstance(value, tuple):
+                # (wall-clock expiry, value): promote with the entry's remaining TTL, not a fresh one
+                expires_at, value = value
+                ttl = expires_at - time.time()
+                if ttl <= 0: value = None
+            if value is None:
+                self._count('misses')
+                return False, None
+            self._count('shared_hits')
+            if ttl is None: ttl = self.negative_ttl if value == _NEGATIVE else self.ttl  # Stored without an expiry
+            self._lru_set(key, value, ttl)
+        if value == _NEGATIVE:
+            self._count('negative_hits')
+            return True, None
+        return True, dict(value)
+
+    def set(self, vin, vehicle_data):
+        """Store a decode result; a falsy result is stored as a negative entry."""
+        key = f"vin:{normalize_vin(vin)}"
+        value = dict(vehicle_data) if vehicle_data else _NEGATIVE
+        ttl = self.ttl if vehicle_data else self.negative_ttl
+        self._lru_set(key, value, ttl)
+        shared = self._shared()
+        if shared is not None:
+            try:
+                shared.set(key, (time.time() + ttl, value), ttl)
+            except Exception as e:
+                logger.warning(f"VIN cache: shared set failed for {vin}: {e}")
+        self._count('stores')
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+            for name in self._counters: self._counters[name] = 0
+
+    def stats(self):
+        """Return a snapshot of the hit/miss counters and the current LRU size."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['lru_size'] = len(self._lru)
+        lookups = stats['lru_hits'] + stats['shared_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['lru_hits'] + stats['shared_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+_cache_settings = getattr(settings, 'VIN_DECODE_CACHE', {})
+vin_cache = VinDecodeCache(
+    maxsize=_cache_settings.get('MAXSIZE', 1024),
+    ttl=_cache_settings.get('TTL', 60 * 60 * 24 * 30),
+    negative_ttl=_cache_settings.get('NEGATIVE_TTL', 60 * 60),
+    cache_alias=_cache_settings.get('CACHE_ALIAS', 'vin_decode'),
+)
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of calling NHTSA while the circuit breaker is open."""
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+    After failure_threshold failures in a row the circuit opens and calls fail fast
+    for reset_timeout seconds; then a single trial call is let through (half-open)
+    and its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """Return True if a call may go upstream now."""
+        with self._lock:
+            if self._state == self.CLOSED: return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN  # let exactly one trial call through
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(f"NHTSA circuit breaker opened after {self._failures} consecutive failures")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+# Upper bounds (seconds) of the upstream latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+class NhtsaClient:
+    """
+    Shared HTTP client for NHTSA vPIC.
+    A pooled keep-alive requests.Session with separate connect/read timeouts, a total
+    time budget per call, jittered exponential-backoff retries for idempotent requests
+    on connection errors, timeouts, truncated bodies and 429/5xx responses, and a circuit breaker.
+    Latency and error counters are available from stats().
+    """
+
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+    def __init__(self, connect_timeout=3.05, read_timeout=6.0, total_timeout=10.0, retries=2,
+                 backoff=0.25, pool_size=20, breaker=None):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._lock = threading.Lock()
+        self._counters = {'requests': 0, 'errors': 0, 'retries': 0, 'short_circuits': 0}
+        self._latency = {'count': 0, 'sum': 0.0, 'max': 0.0, 'buckets': [0] * len(LATENCY_BUCKETS)}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def observe(self, seconds, error=False):
+        """Record one upstream attempt (also used by the async path)."""
+        record_outbound(seconds)
+        with self._lock:
+            self._counters['requests'] += 1
+            if error: self._counters['errors'] += 1
+            self._latency['count'] += 1
+            self._latency['sum'] += seconds
+            self._latency['max'] = max(self._latency['max'], seconds)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    self._latency['buckets'][i] += 1
+                    break
+
+    def _sleep_before_retry(self, attempt, deadline):
+        # Full jitter: uniform in [0, backoff * 2**attempt], never past the deadline
+        delay = random.uniform(0, self.backoff * (2 ** attempt))
+        delay = min(delay, max(0.0, deadline - time.monotonic()))
+        if delay: time.sleep(delay)
+
+    def request(self, method, url, idempotent=True, **kwargs):
+        """
+        Send a request and return the Response (raise_for_status already applied)
+        Raises CircuitOpenError while the breaker is open, otherwise the last
+        requests exception once retries or the time budget are exhausted.
+        """
+        if not self.breaker.allow():
+            self._count('short_circuits')
+            raise CircuitOpenError(f"NHTSA circuit open; not calling {url}")
+        deadline = time.monotonic() + self.total_timeout
+        attempts = 1 + (self.retries if idempotent else 0)
+        for attempt in range(attempts):
+            remaining = deadline - time.monotonic()
+            timeout = (min(self.connect_timeout, remaining), min(self.read_timeout, remaining))
+            start = time.monotonic()
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+                retryable = response.status_code in self.RETRY_STATUSES
+                self.observe(time.monotonic() - start, error=response.status_code >= 400)
+                if not retryable:
+                    response.raise_for_status()
+                    self.breaker.record_success()
+                    return response
+                error = requests.exceptions.HTTPError(f"{response.status_code} from NHTSA", response=response)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError) as e:
+                self.observe(time.monotonic() - start, error=True)
+                error = e
+            except requests.exceptions.HTTPError:
+                # Non-retryable 4xx: NHTSA is up, the request is bad
+                self.breaker.record_success()
+                raise
+            except requests.exceptions.RequestException:
+                # Not worth retrying (redirect loop, undecodable body, bad URL), but still an
+                # outcome: a half-open breaker left without one would never let a call through
+                self.observe(time.monotonic() - start, error=True)
+                self.breaker.record_failure()
+                raise
+            if attempt + 1 >= attempts or deadline - time.monotonic() <= 0: break
+            self._count('retries')
+            self._sleep_before_retry(attempt, deadline)
+        self.breaker.record_failure()
+        raise error
+
+    def get(self, url, **kwargs): return self.request('GET', url, **kwargs)
+    def post(self, url, **kwargs): return self.request('POST', url, **kwargs)
+
+    def stats(self):
+        """Return a snapshot of request/error/retry counters, latency and breaker state."""
+        with self._lock:
+            stats = dict(self._counters)
+            latency = dict(self._latency, buckets=list(self._latency['buckets']))
+        latency['avg'] = round(latency['sum'] / latency['count'], 4) if latency['count'] else 0.0
+        latency['buckets'] = dict(zip(LATENCY_BUCKETS, latency['buckets']))
+        stats['latency'] = latency
+        stats['breaker'] = self.breaker.state
+        return stats
+
+_client_settings = getattr(settings, 'NHTSA_CLIENT', {})
+nhtsa_client = NhtsaClient(
+    connect_timeout=_client_settings.get('CONNECT_TIMEOUT', 3.05),
+    read_timeout=_client_settings.get('READ_TIMEOUT', 6.0),
+    total_timeout=_client_settings.get('TOTAL_TIMEOUT', 10.0),
+    retries=_client_settings.get('RETRIES', 2),
+    backoff=_client_settings.get('BACKOFF', 0.25),
+    pool_size=_client_settings.get('POOL_SIZE', 20),
+    breaker=CircuitBreaker(
+        failure_threshold=_client_settings.get('BREAKER_FAILURES', 5),
+        reset_timeout=_client_settings.get('BREAKER_RESET', 30.0),
+    ),
+)
+
+def parse_vin_results(results):
+    """
+    Translate NHTSA vPIC 'Results' variables into Vehicle field values
+    Returns a dictionary (possibly empty) with vehicle information
+    """
+    vehicle_data = {}
+    for item in results:
+        variable_name = item.get('Variable')
+        value = item.get('Value')
+        if not value: continue
+        if variable_name == 'Make': vehicle_data['make'] = value
+        elif variable_name == 'Model': vehicle_data['model'] = value
+        elif variable_name == 'Model Year':
+            vehicle_data['year'] = int(value) if value.isdigit() else None
+        elif variable_name == 'Trim': vehicle_data['trim'] = value
+        elif variable_name == 'Engine Number 1': vehicle_data['engine'] = value
+        elif variable_name == 'Engine displacement (cubic inches)':
+            try:
+                cubic_inches = float(value)
+                liters = round(cubic_inches * 0.0163871, 1)
+                vehicle_data['engine_size'] = liters
+            except (ValueError, TypeError): pass
+        elif variable_name == 'Fuel Type - Primary': vehicle_data['fuel_type'] = value
+        elif variable_name == 'Transmission Style':
+            if 'automatic' in value.lower(): vehicle_data['transmission'] = 'automatic'
+            elif 'manual' in value.lower(): vehicle_data['transmission'] = 'manual'
+            elif 'cvt' in value.lower(): vehicle_data['transmission'] = 'cvt'
+            else: vehicle_data['transmission'] = 'other'
+    return vehicle_data
+
+def decode_vin(vin, use_cache=True, use_local=True):
     """
     Decode VIN using NHTSA API
     Returns a dictionary with vehicle information or None if failed
+    Invalid VINs fail without a network call. With use_local, VINs the offline
+    index fully decodes skip NHTSA, and partial local data is returned if NHTSA
+    is unreachable. Results (including VINs NHTSA could not decode) are served
+    from vin_cache when use_cache is set; network errors are never cached.
     """
+    vin = normalize_vin(vin)
+    error = validate_vin(vin)
+    if error:
+        logger.info(f"VIN Decode rejected {vin} locally: {error}")
+        return None
+    local_data = {}
+    if use_local:
+        local_data, complete = decode_vin_offline(vin)
+        if complete:
+            logger.debug(f"VIN Decode answered from local index for {vin}")
+            return local_data
+    if use_cache:
+        hit, cached = vin_cache.get(vin)
+        if hit:
+            logger.debug(f"VIN Decode cache hit for {vin}")
+            return cached
     try:
-        url = f"https://vpic.nhtsa.dot.gov/api/vehicles/DecodeVin/{vin}?format=json"
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
+        url = NHTSA_DECODE_URL.format(vin=vin)
+        response = nhtsa_client.get(url)
         data = response.json()
-        if data.get('Results'):
-            vehicle_data = {}
-            for item in data['Results']:
-                variable_name = item.get('Variable')
-                value = item.get('Value')
-                if not value: continue
-                if variable_name == 'Make': vehicle_data['make'] = value
-                elif variable_name == 'Model': vehicle_data['model'] = value
-                elif variable_name == 'Model Year':
-                    vehicle_data['year'] = int(value) if value.isdigit() else None
-                elif variable_name == 'Trim': vehicle_data['trim'] = value
-                elif variable_name == 'Engine Number 1': vehicle_data['engine'] = value
-                elif variable_name == 'Engine displacement (cubic inches)':
-                    try:
-                        cubic_inches = float(value)
-                        liters = round(cubic_inches * 0.0163871, 1)
-                        vehicle_data['engine_size'] = liters
-                    except (ValueError, TypeError): pass
-                elif variable_name == 'Fuel Type - Primary': vehicle_data['fuel_type'] = value
-                elif variable_name == 'Transmission Style':
-                    if 'automatic' in value.lower(): vehicle_data['transmission'] = 'automatic'
-                    elif 'manual' in value.lower(): vehicle_data['transmission'] = 'manual'
-                    elif 'cvt' in value.lower(): vehicle_data['transmission'] = 'cvt'
-                    else: vehicle_data['transmission'] = 'other'
-            return vehicle_data
-        return None
+        # A response that decodes to nothing is undecodable, now and on later cache hits
+        vehicle_data = parse_vin_results(data.get('Results') or []) or None
+        if use_cache: vin_cache.set(vin, vehicle_data)
+        return vehicle_data
+    except CircuitOpenError:
+        logger.warning(f"VIN Decode skipped NHTSA for {vin}: circuit open")
+        return local_data if local_data.get('make') else None
     except requests.exceptions.RequestException as e:
         logger.error(f"VIN Decode Network Error for {vin}: {e}")
-        return None
+        return local_data if local_data.get('make') else None
     except Exception as e:
         logger.error(f"VIN Decode Unexpected Error for {vin}: {e}")
         return None
+
+def _decode_vin_chunk(vins):
+    """
+    POST one chunk of VINs to the vPIC batch endpoint
+    Returns {vin: vehicle_data or None}; raises RequestException on network errors
+    """
+    # Decoding has no side effects, so the POST is safe to retry
+    response = nhtsa_client.post(
+        NHTSA_BATCH_DECODE_URL,
+        data={'format': 'json', 'data': ';'.join(vins)},
+        idempotent=True,
+    )
+    decoded = {vin: None for vin in vins}
+    for row in response.json().get('Results') or []:
+        vin = normalize_vin(row.get('VIN'))
+        if vin not in decoded: continue
+        results = [{'Variable': variable, 'Value': row.get(key)} for key, variable in BATCH_FIELD_VARIABLES.items()]
+        decoded[vin] = parse_vin_results(results) or None
+    return decoded
+
+def decode_vins(vins, chunk_size=NHTSA_BATCH_MAX_VINS, max_workers=4, use_cache=True, use_local=True):
+    """
+    Decode many VINs using the NHTSA batch API
+    VINs are normalized and de-duplicated; invalid ones map to None, the rest are
+    served from the offline index or vin_cache where possible and the remainder
+    sent in chunks of up to 50 with at most max_workers requests in flight.
+    Returns a dictionary {vin: vehicle_data or None}; chunks that fail on the
+    network map to None and are not cached.
+    """
+    chunk_size = max(1, min(chunk_size, NHTSA_BATCH_MAX_VINS))
+    results = {}
+    pending = []
+    for vin in dict.fromkeys(normalize_vin(v) for v in vins):
+        if not vin: continue
+        if validate_vin(vin):
+            results[vin] = None
+            continue
+        if use_local:
+            local_data, complete = decode_vin_offline(vin)
+            if complete:
+                results[vin] = local_data
+                continue
+        if use_cache:
+            hit, cached = vin_cache.get(vin)
+            if hit:
+                results[vin] = cached
+                continue
+        pending.append(vin)
+    chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+    if not chunks: return results
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as executor:
+        futures = {executor.submit(_decode_vin_chunk, chunk): chunk for chunk in chunks}
+        for future in as_completed(futures):
+            chunk = futures[future]
+            try:
+                decoded = future.result()
+            except requests.exceptions.RequestException as e:
+                logger.error(f"VIN Batch Decode Network Error for {len(chunk)} VINs starting {chunk[0]}: {e}")
+                decoded = dict.fromkeys(chunk)
+            except Exception as e:
+                logger.error(f"VIN Batch Decode Unexpected Error for {len(chunk)} VINs starting {chunk[0]}: {e}")
+                decoded = dict.fromkeys(chunk)
+            else:
+                if use_cache:
+                    for vin, vehicle_data in decoded.items(): vin_cache.set(vin, vehicle_data)
+            results.update(decoded)
+    return results
+
+# --- Async decoding (ASGI) ---
+# One pooled httpx.AsyncClient and one table of in-flight lookups per event loop:
+# under ASGI that is a single long-lived pool, under WSGI each async_to_sync call
+# gets its own short-lived state. Each client is closed when its loop shuts down
+# (see _client_lifetime), so short-lived loops do not leak connection pools.
+_async_state = weakref.WeakKeyDictionary()
+
+ASYNC_HTTP_LIMITS = getattr(settings, 'NHTSA_ASYNC_LIMITS', {'max_connections': 20, 'max_keepalive_connections': 10})
+
+# vin_cache's shared level is a file (or network) cache: run its calls off the event loop
+_acache_get = sync_to_async(vin_cache.get, thread_sensitive=False)
+_acache_set = sync_to_async(vin_cache.set, thread_sensitive=False)
+
+async def _client_lifetime(client):
+    # An async generator parked at its yield is closed by loop.shutdown_asyncgens(),
+    # which asyncio.run (and so async_to_sync, and ASGI servers) call before closing the loop
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+async def _loop_state():
+    loop = asyncio.get_running_loop()
+    state = _async_state.get(loop)
+    if state is None:
+        timeout = httpx.Timeout(nhtsa_client.read_timeout, connect=nhtsa_client.connect_timeout)
+        client = httpx.AsyncClient(timeout=timeout, limits=httpx.Limits(**ASYNC_HTTP_LIMITS))
+        state = _async_state[loop] = {'client': client, 'inflight': {}, 'lifetime': _client_lifetime(client)}
+        await anext(state['lifetime'])
+    return state
+
+async def _afetch_vin(client, vin, use_cache):
+    """
+    One upstream DecodeVin lookup; returns (vehicle_data, reached_nhtsa)
+    Follows nhtsa_client's policy and shares its circuit breaker and counters:
+    jittered backoff retries on transport errors and 429/5xx within total_timeout.
+    """
+    if not nhtsa_client.breaker.allow():
+        nhtsa_client._count('short_circuits')
+        logger.warning(f"VIN Decode skipped NHTSA for {vin}: circuit open")
+        return None, False
+    url = NHTSA_DECODE_URL.format(vin=vin)
+    deadline = time.monotonic() + nhtsa_client.total_timeout
+    attempts = 1 + nhtsa_client.retries
+    for attempt in range(attempts):
+        start = time.monotonic()
+        try:
+            async with asyncio.timeout(max(0.0, deadline - start)):
+                response = await client.get(url)
+        except (httpx.TransportError, TimeoutError) as e:
+            nhtsa_client.observe(time.monotonic() - start, error=True)
+            error = e
+        except Exception as e:
+            # Not worth retrying (redirect loop, bad URL), but the breaker needs an outcome
+            nhtsa_client.observe(time.monotonic() - start, error=True)
+            nhtsa_client.breaker.record_failure()
+            logger.error(f"VIN Decode Network Error for {vin}: {e!r}")
+            return None, False
+        else:
+            nhtsa_client.observe(time.monotonic() - start, error=response.is_error)
+            if response.status_code not in NhtsaClient.RETRY_STATUSES:
+                nhtsa_client.breaker.record_success()
+                if response.is_error:
+                    # Non-retryable 4xx: NHTSA is up, the request is bad
+                    logger.error(f"VIN Decode Network Error for {vin}: {response.status_code} from NHTSA")
+                    return None, False
+                try:
+                    data = response.json()
+                    vehicle_data = parse_vin_results(data.get('Results') or []) or None
+                except Exception as e:
+                    logger.error(f"VIN Decode Unexpected Error for {vin}: {e}")
+                    return None, True
+                if use_cache: await _acache_set(vin, vehicle_data)
+                return vehicle_data, True
+            error = f"{response.status_code} from NHTSA"
+        if attempt + 1 >= attempts or deadline - time.monotonic() <= 0: break
+        nhtsa_client._count('retries')
+        delay = random.uniform(0, nhtsa_client.backoff * (2 ** attempt))
+        await asyncio.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+    nhtsa_client.breaker.record_failure()
+    logger.error(f"VIN Decode Network Error for {vin}: {error!r}")
+    return None, False
+
+async def adecode_vin(vin, use_cache=True, use_local=True):
+    """
+    Async decode_vin for ASGI views: same validation, local index, cache, retry
+    policy, time budget and return value, but the upstream call goes through a
+    pooled httpx.AsyncClient and concurrent lookups of the same VIN share a single
+    request. Cache reads and writes run in a thread.
+    """
+    vin = normalize_vin(vin)
+    error = validate_vin(vin)
+    if error:
+        logger.info(f"VIN Decode rejected {vin} locally: {error}")
+        return None
+    local_data = {}
+    if use_local:
+        local_data, complete = decode_vin_offline(vin)
+        if complete:
+            logger.debug(f"VIN Decode answered from local index for {vin}")
+            return local_data
+    if use_cache:
+        hit, cached = await _acache_get(vin)
+        if hit:
+            logger.debug(f"VIN Decode cache hit for {vin}")
+            return cached
+    state = await _loop_state()
+    inflight = state['inflight']
+    task = inflight.get(vin)
+    if task is None:
+        task = asyncio.ensure_future(_afetch_vin(state['client'], vin, use_cache))
+        inflight[vin] = task
+        task.add_done_callback(lambda _: inflight.pop(vin, None))
+    else:
+        logger.debug(f"VIN Decode joined in-flight lookup for {vin}")
+    # Shielded so one cancelled caller does not cancel the lookup for the others
+    vehicle_data, reached_nhtsa = await asyncio.shield(task)
+    if vehicle_data is None and not reached_nhtsa:
+        return local_data if local_data.get('make') else None
+    return dict(vehicle_data) if vehicle_data else vehicle_data
@@ -0,0 +1,113 @@
+# AutoLogX/autologx/api/signals.py
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Vehicle, ServiceRecord, VehicleSummary, Attachment
+from .query_cache import query_cache
+from .storage import blob_referenced
+from . import jobs, rollups, summaries, tasks, thumbnails
+
+# --- Vehicle service summaries ---
+
+@receiver(post_save, sender=Vehicle)
+def create_vehicle_summary(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        VehicleSummary.objects.get_or_create(vehicle=instance)
+
+# --- VIN enrichment ---
+
+@receiver(post_save, sender=Vehicle)
+def enrich_new_vehicle(sender, instance, created, raw=False, **kwargs):
+    # Decoding may wait on NHTSA, so it runs in a worker, filling whatever details were left blank
+    if created and not raw and instance.vin and any(getattr(instance, f) in (None, '') for f in tasks.VIN_DETAIL_FIELDS):
+        jobs.enqueue(tasks.enrich_vehicle_from_vin, vehicle_id=instance.pk)
+
+@receiver(pre_save, sender=ServiceRecord)
+def remember_service_record_values(sender, instance, raw=False, **kwargs):
+    # Edits are applied as a difference, so keep the values being replaced
+    instance._summary_old = None
+    if instance.pk and not raw:
+        instance._summary_old = ServiceRecord.objects.filter(pk=instance.pk).values(
+            'vehicle_id', 'service_type', 'date', 'mileage', 'cost', 'shop_name').first()
+
+@receiver(post_save, sender=ServiceRecord)
+def update_summary_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw: return
+    summaries.record_saved(instance, None if created else getattr(instance, '_summary_old', None))
+
+@receiver(post_delete, sender=ServiceRecord)
+def update_summary_on_delete(sender, instance, **kwargs):
+    summaries.record_deleted_values(summaries.record_values(instance))
+
+# --- Monthly rollups (fleet analytics) ---
+
+@receiver(post_save, sender=ServiceRecord)
+def update_rollups_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw: return
+    rollups.record_saved(instance, None if created else getattr(instance, '_summary_old', None))
+
+@receiver(post_delete, sender=ServiceRecord)
+def update_rollups_on_delete(sender, instance, **kwargs):
+    rollups.record_deleted_values(summaries.record_values(instance))
+
+@receiver(post_save, sender=Vehicle)
+def move_rollups_with_vehicle(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw: rollups.vehicle_owner_saved(instance)
+
+# --- Attachment blob reference counts ---
+
+@receiver(pre_save, sender=Attachment)
+def remember_attachment_file(sender, instance, raw=False, **kwargs):
+    instance._blob_old = None
+    if instance.pk and not raw:
+        instance._blob_old = Attachment.objects.filter(pk=instance.pk).values_list('file', flat=True).first()
+
+@receiver(post_save, sender=Attachment)
+def count_attachment_blob(sender, instance, created, raw=False, **kwargs):
+    if raw: return
+    old = None if created else getattr(instance, '_blob_old', None)
+    if instance.file.name != old:
+        blob_referenced(instance.file.name, 1)
+        if old: blob_referenced(old, -1)
+
+@receiver(post_delete, sender=Attachment)
+def release_attachment_blob(sender, instance, **kwargs):
+    blob_referenced(instance.file.name, -1)
+
+# --- Attachment thumbnails/previews ---
+
+@receiver(post_save, sender=Attachment)
+def schedule_attachment_derivatives(sender, instance, created, raw=False, **kwargs):
+    name = instance.file.name
+    if raw or not thumbnails.can_render(name): return
+    if created or name != getattr(instance, '_blob_old', None):
+        # Queued in this transaction: no job if the upload rolls back
+        jobs.enqueue(tasks.render_attachment_derivatives, name=name)
+
+# --- Query cache invalidation (see query_cache.py) ---
+
+@receiver(pre_save, sender=Vehicle)
+def remember_vehicle_owner(sender, instance, raw=False, **kwargs):
+    # A vehicle given to another user must drop out of the previous owner's cached lists
+    instance._owner_old = None
+    if instance.pk and not raw:
+        instance._owner_old = Vehicle.objects.filter(pk=instance.pk).values_list('user_id', flat=True).first()
+
+@receiver(post_save, sender=Vehicle)
+@receiver(post_delete, sender=Vehicle)
+def invalidate_vehicle_reads(sender, instance, **kwargs):
+    query_cache.invalidate(user_ids=[instance.user_id, getattr(instance, '_owner_old', None)], vehicle_ids=[instance.pk])
+
+@receiver(post_save, sender=ServiceRecord)
+@receiver(post_delete, sender=ServiceRecord)
+def invalidate_service_record_reads(sender, instance, **kwargs):
+    old = getattr(instance, '_summary_old', None)  # Set on edits; the record may have changed vehicle
+    query_cache.invalidate(vehicle_ids=[instance.vehicle_id, old and old['vehicle_id']])
+
+@receiver(post_save, sender=Attachment)
+@receiver(post_delete, sender=Attachment)
+def invalidate_attachment_reads(sender, instance, **kwargs):
+    if Attachment.service_record.is_cached(instance):
+        vehicle_id = instance.service_record.vehicle_id
+    else:
+        vehicle_id = ServiceRecord.objects.filter(pk=instance.service_record_id).values_list('vehicle_id', flat=True).first()
+    query_cache.invalidate(vehicle_ids=[vehicle_id])
@@ -0,0 +1,125 @@
+# AutoLogX/autologx/api/storage.py
+"""
+Content-addressed storage for attachments.
+An upload is hashed while it is streamed to a temporary file, then kept once at
+cas/<aa>/<bb>/<sha256><ext>; uploading the same bytes again reuses that blob and
+discards the copy. Each blob has a StoredBlob row whose ref_count follows the
+Attachment rows pointing at it (see signals.py), and `manage.py gc_attachment_blobs`
+removes blobs nobody references any more.
+Names outside cas/ (files saved before this storage was enabled) are handled
+exactly like FileSystemStorage handles them.
+"""
+import hashlib
+import logging
+import os
+import uuid
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+CAS_PREFIX = 'cas/'
+CAS_TMP = CAS_PREFIX + 'tmp/'
+HASH_NAME = 'sha256'
+MAX_EXT_LENGTH = 10
+
+def is_blob_name(name):
+    return bool(name) and name.startswith(CAS_PREFIX) and not name.startswith(CAS_TMP)
+
+def blob_name(digest, ext=''):
+    return f"{CAS_PREFIX}{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+def _extension(name):
+    # Kept so URLs and downloads keep a meaningful type; identical bytes with different
+    # extensions are stored once per extension
+    ext = os.path.splitext(name)[1].lower()
+    return ext if 1 < len(ext) <= MAX_EXT_LENGTH and ext[1:].isalnum() else ''
+
+def blob_referenced(name, delta):
+    """Add delta to the reference count of the blob stored under name (no-op for non-CAS names)"""
+    from .models import StoredBlob
+    if not is_blob_name(name): return
+    updated = StoredBlob.objects.filter(name=name).update(ref_count=F('ref_count') + delta, updated_at=timezone.now())
+    if not updated and delta > 0:
+        # Blob written before its row existed (or the row was lost): adopt it
+        StoredBlob.objects.get_or_create(name=name, defaults={'ref_count': delta, 'size': _size_or_zero(name)})
+
+def _size_or_zero(name):
+    from django.core.files.storage import default_storage
+    try:
+        return default_storage.size(name)
+    except OSError:
+        return 0
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Drop-in FileSystemStorage that deduplicates saved files by content
+    The name passed to save() (e.g. from upload_to) only contributes its extension.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is chosen from the content in _save, so no exists() probing here
+        return name
+
+    def _save(self, name, content):
+        ext = _extension(name)
+        if hasattr(content, 'temporary_file_path'):
+            # Already on disk (large upload): hash it in place, then move it or drop it
+            digest = hashlib.new(HASH_NAME)
+            size = 0
+            for chunk in content.chunks():
+                digest.update(chunk)
+                size += len(chunk)
+            source = content.temporary_file_path()
+        else:
+            # Hash while streaming to a temporary file: one pass over the data
+            source = self.path(f"{CAS_TMP}{uuid.uuid4().hex}")
+            self._makedirs(os.path.dirname(source))
+            digest = hashlib.new(HASH_NAME)
+            size = 0
+            with open(source, 'wb') as f:
+                for chunk in content.chunks():
+                    if isinstance(chunk, str): chunk = chunk.encode('utf-8')
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+        name = blob_name(digest.hexdigest(), ext)
+        full_path = self.path(name)
+        # Register before looking at the disk: a concurrent gc_attachment_blobs only removes
+        # a blob whose row is unreferenced and untouched, so either it sees this touch and
+        # keeps the file, or it has already moved the file away and we write it again below
+        self._register(name, size)
+        if os.path.exists(full_path):
+            logger.debug(f"Deduplicated upload into {name}")
+            if not hasattr(content, 'temporary_file_path'): os.remove(source)
+        else:
+            self._makedirs(os.path.dirname(full_path))
+            if hasattr(content, 'temporary_file_path'):
+                file_move_safe(source, full_path, allow_overwrite=True)
+            else:
+                os.replace(source, full_path)
+            if self.file_permissions_mode is not None:
+                os.chmod(full_path, self.file_permissions_mode)
+        return name
+
+    def delete(self, name):
+        # Blobs are shared; they are only removed by gc_attachment_blobs once unreferenced
+        if is_blob_name(name): return
+        super().delete(name)
+
+    def _register(self, name, size):
+        from .models import StoredBlob
+        if not StoredBlob.objects.filter(name=name).update(updated_at=timezone.now()):
+            StoredBlob.objects.get_or_create(name=name, defaults={'size': size})
+
+    def _makedirs(self, directory):
+        if self.directory_permissions_mode is not None:
+            old_umask = os.umask(0o777 & ~self.directory_permissions_mode)
+            try:
+                os.makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+            finally:
+                os.umask(old_umask)
+        else:
+            os.makedirs(directory, exist_ok=True)
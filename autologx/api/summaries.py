@@ -0,0 +1,260 @@
+# AutoLogX/autologx/api/summaries.py
+"""
+Incremental maintenance of per-vehicle service summaries.
+Creating a ServiceRecord adds its cost/count to VehicleSummary and advances the
+Vehicle last_* fields in O(1). Edits and deletes apply the difference, and only
+re-query a vehicle's records (through the (vehicle, -date, -id) index) when the
+changed record could have been the latest one. All updates lock the summary row.
+"""
+import logging
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Lower
+from django.utils import timezone
+from .models import Vehicle, ServiceRecord, VehicleSummary
+from .query_cache import query_cache
+
+logger = logging.getLogger(__name__)
+
+OIL_CHANGE = 'oil_change'
+CENT = Decimal('0.01')
+RECORD_FIELDS = ['vehicle_id', 'service_type', 'date', 'mileage', 'cost', 'shop_name']
+
+def _latest(queryset):
+    """(date, mileage) of the newest record in queryset, using the (vehicle, -date, -id) index."""
+    row = queryset.order_by('-date', '-id').values_list('date', 'mileage').first()
+    return row or (None, None)
+
+def _oil_changes(records):
+    # Compared through an expression so the planner walks the vehicle's (vehicle, -date, -id)
+    # index rather than every oil change in the (service_type, date) one
+    return records.alias(service_type_key=Lower('service_type')).filter(service_type_key=OIL_CHANGE)
+
+def _recompute_last_fields(vehicle_id):
+    records = ServiceRecord.objects.filter(vehicle_id=vehicle_id)
+    last_service_date, last_service_mileage = _latest(records)
+    last_oil_change_date, last_oil_change_mileage = _latest(_oil_changes(records))
+    return {
+        'last_service_date': last_service_date, 'last_service_mileage': last_service_mileage,
+        'last_oil_change_date': last_oil_change_date, 'last_oil_change_mileage': last_oil_change_mileage,
+    }
+
+def _add_cost(cost_by_type, service_type, amount):
+    total = Decimal(cost_by_type.get(service_type, '0')) + amount
+    if total: cost_by_type[service_type] = str(total)
+    else: cost_by_type.pop(service_type, None)
+
+def _locked_summary(vehicle_id):
+    """Lock and return the vehicle's summary row, or None if it has none (e.g. mid-delete)."""
+    return VehicleSummary.objects.select_for_update().filter(vehicle_id=vehicle_id).first()
+
+def record_saved(record, old=None):
+    """
+    Apply a created (old is None) or edited ServiceRecord to its vehicle's summary
+    old is a dict of the record's previous vehicle_id/service_type/date/mileage/cost.
+    """
+    new = record_values(record)
+    if old and old['vehicle_id'] != new['vehicle_id']:
+        # Moved to another vehicle: remove it there, add it here
+        record_deleted_values(old)
+        old = None
+    with transaction.atomic():
+        summary = _locked_summary(new['vehicle_id'])
+        if summary is None:
+            if not Vehicle.objects.filter(pk=new['vehicle_id']).exists(): return
+            rebuild_vehicle_summary(new['vehicle_id'])
+            return
+        cost = new['cost']
+        vehicle_fields = {}
+        if old is None:
+            summary.record_count += 1
+            summary.lifetime_cost += cost
+            _add_cost(summary.cost_by_type, new['service_type'], cost)
+            if summary.latest_mileage is None or new['mileage'] > summary.latest_mileage:
+                summary.latest_mileage = new['mileage']
+            vehicle = Vehicle.objects.only('last_service_date', 'last_oil_change_date').get(pk=new['vehicle_id'])
+            # Ties on date go to the newer record, matching the ('-date', '-id') ordering
+            if vehicle.last_service_date is None or new['date'] >= vehicle.last_service_date:
+                vehicle_fields.update(last_service_date=new['date'], last_service_mileage=new['mileage'])
+            if new['service_type'] == OIL_CHANGE and (vehicle.last_oil_change_date is None or new['date'] >= vehicle.last_oil_change_date):
+                vehicle_fields.update(last_oil_change_date=new['date'], last_oil_change_mileage=new['mileage'])
+        else:
+            old_cost = Decimal(old['cost'])
+            summary.lifetime_cost += cost - old_cost
+            _add_cost(summary.cost_by_type, old['service_type'], -old_cost)
+            _add_cost(summary.cost_by_type, new['service_type'], cost)
+            if summary.latest_mileage is None or new['mileage'] >= summary.latest_mileage:
+                summary.latest_mileage = new['mileage']
+            elif old['mileage'] >= summary.latest_mileage:
+                summary.latest_mileage = ServiceRecord.objects.filter(vehicle_id=new['vehicle_id']).aggregate(m=Max('mileage'))['m']
+            # Any change of date, mileage or type can move "latest"; the indexed re-query is cheap
+            if (old['date'], old['mileage'], old['service_type']) != (new['date'], new['mileage'], new['service_type']):
+                vehicle_fields = _recompute_last_fields(new['vehicle_id'])
+        summary.save()
+        if vehicle_fields:
+            Vehicle.objects.filter(pk=new['vehicle_id']).update(**vehicle_fields)
+
+def record_deleted_values(old):
+    """Remove a deleted ServiceRecord (given as a dict of its values) from its vehicle's summary."""
+    with transaction.atomic():
+        summary = _locked_summary(old['vehicle_id'])
+        if summary is None:
+            # No summary yet (vehicle older than summaries): build it from the remaining records
+            if Vehicle.objects.filter(pk=old['vehicle_id']).exists(): rebuild_vehicle_summary(old['vehicle_id'])
+            return
+        cost = Decimal(old['cost'])
+        summary.record_count = max(0, summary.record_count - 1)
+        summary.lifetime_cost -= cost
+        _add_cost(summary.cost_by_type, old['service_type'], -cost)
+        if summary.latest_mileage is not None and old['mileage'] >= summary.latest_mileage:
+            summary.latest_mileage = ServiceRecord.objects.filter(vehicle_id=old['vehicle_id']).aggregate(m=Max('mileage'))['m']
+        summary.save()
+        vehicle = Vehicle.objects.filter(pk=old['vehicle_id']).values('last_service_date', 'last_oil_change_date').first()
+        if vehicle is None: return  # the vehicle itself is being deleted
+        if (vehicle['last_service_date'] and old['date'] >= vehicle['last_service_date']) or \
+           (old['service_type'] == OIL_CHANGE and vehicle['last_oil_change_date'] and old['date'] >= vehicle['last_oil_change_date']):
+            Vehicle.objects.filter(pk=old['vehicle_id']).update(**_recompute_last_fields(old['vehicle_id']))
+
+def records_added(records):
+    """
+    Apply bulk-created ServiceRecords (bulk_create sends no signals) to their vehicles'
+    summaries and last_* fields set-wise: totals are summed in Python, then a few
+    queries lock, read and bulk_update the affected rows. Call it inside the
+    transaction that created the records, passing them in insertion order.
+    """
+    totals = {}
+    for seq, record in enumerate(records):
+        t = totals.setdefault(record.vehicle_id, {'count': 0, 'cost': Decimal('0'), 'by_type': {}, 'mileage': None,
+                                                  'service': None, 'oil_change': None})
+        cost = Decimal(record.cost)
+        t['count'] += 1
+        t['cost'] += cost
+        t['by_type'][record.service_type] = t['by_type'].get(record.service_type, Decimal('0')) + cost
+        if t['mileage'] is None or record.mileage > t['mileage']: t['mileage'] = record.mileage
+        # Insertion order stands in for id order to break date ties, as in ('-date', '-id')
+        latest = (record.date, seq, record.mileage)
+        if t['service'] is None or latest > t['service']: t['service'] = latest
+        if record.service_type == OIL_CHANGE and (t['oil_change'] is None or latest > t['oil_change']): t['oil_change'] = latest
+    if not totals: return
+    query_cache.invalidate(vehicle_ids=totals)
+    now = timezone.now()
+    with transaction.atomic():
+        summaries = list(VehicleSummary.objects.select_for_update().filter(vehicle_id__in=totals))
+        for summary in summaries:
+            t = totals[summary.vehicle_id]
+            summary.updated_at = now  # bulk_update does not apply auto_now
+            summary.record_count += t['count']
+            summary.lifetime_cost += t['cost']
+            for service_type, cost in t['by_type'].items(): _add_cost(summary.cost_by_type, service_type, cost)
+            if summary.latest_mileage is None or t['mileage'] > summary.latest_mileage: summary.latest_mileage = t['mileage']
+        VehicleSummary.objects.bulk_update(summaries, ['record_count', 'lifetime_cost', 'cost_by_type', 'latest_mileage', 'updated_at'])
+        last_fields = ['last_service_date', 'last_service_mileage', 'last_oil_change_date', 'last_oil_change_mileage']
+        vehicles = list(Vehicle.objects.filter(pk__in=totals).only(*last_fields))
+        for vehicle in vehicles:
+            t = totals[vehicle.pk]
+            if vehicle.last_service_date is None or t['service'][0] >= vehicle.last_service_date:
+                vehicle.last_service_date, vehicle.last_service_mileage = t['service'][0], t['service'][2]
+            if t['oil_change'] and (vehicle.last_oil_change_date is None or t['oil_change'][0] >= vehicle.last_oil_change_date):
+                vehicle.last_oil_change_date, vehicle.last_oil_change_mileage = t['oil_change'][0], t['oil_change'][2]
+        Vehicle.objects.bulk_update(vehicles, last_fields)
+        missing = set(totals) - {summary.vehicle_id for summary in summaries}
+        if missing: rebuild_summaries(Vehicle.objects.filter(pk__in=missing))
+
+def records_changed(changes):
+    """
+    Apply bulk-updated ServiceRecords (bulk_update sends no signals), given as (record,
+    previous values) pairs, set-wise: count and cost differences are summed per vehicle
+    and applied to the locked summaries; latest_mileage and the last_* fields are only
+    re-read (through the index) for vehicles where a record changed date, mileage, type
+    or vehicle. Call it inside the updating transaction.
+    """
+    deltas, requery = {}, set()
+    for record, old in changes:
+        new = record_values(record)
+        moved = (old['vehicle_id'], old['date'], old['mileage'], old['service_type']) != \
+                (new['vehicle_id'], new['date'], new['mileage'], new['service_type'])
+        if not moved and Decimal(old['cost']) == Decimal(new['cost']): continue
+        for values, sign in ((old, -1), (new, 1)):
+            d = deltas.setdefault(values['vehicle_id'], {'count': 0, 'cost': Decimal('0'), 'by_type': {}})
+            cost = Decimal(values['cost']) * sign
+            d['count'] += sign
+            d['cost'] += cost
+            d['by_type'][values['service_type']] = d['by_type'].get(values['service_type'], Decimal('0')) + cost
+        if moved: requery.update((old['vehicle_id'], new['vehicle_id']))
+    if not deltas: return
+    query_cache.invalidate(vehicle_ids=deltas)
+    now = timezone.now()
+    with transaction.atomic():
+        summaries = list(VehicleSummary.objects.select_for_update().filter(vehicle_id__in=deltas).order_by('vehicle_id'))
+        highest = dict(ServiceRecord.objects.filter(vehicle_id__in=requery).order_by().values('vehicle_id')
+                       .annotate(m=Max('mileage')).values_list('vehicle_id', 'm')) if requery else {}
+        for summary in summaries:
+            d = deltas[summary.vehicle_id]
+            summary.updated_at = now  # bulk_update does not apply auto_now
+            summary.record_count = max(0, summary.record_count + d['count'])
+            summary.lifetime_cost += d['cost']
+            for service_type, cost in d['by_type'].items(): _add_cost(summary.cost_by_type, service_type, cost)
+            if summary.vehicle_id in requery: summary.latest_mileage = highest.get(summary.vehicle_id)
+        VehicleSummary.objects.bulk_update(summaries, ['record_count', 'lifetime_cost', 'cost_by_type', 'latest_mileage', 'updated_at'])
+        for vehicle_id in sorted(requery):
+            Vehicle.objects.filter(pk=vehicle_id).update(**_recompute_last_fields(vehicle_id))
+        missing = set(deltas) - {summary.vehicle_id for summary in summaries}
+        if missing: rebuild_summaries(Vehicle.objects.filter(pk__in=missing))
+
+def record_values(record):
+    """
+    A record's summarized values as the database holds them: its attributes may still be
+    raw input, as in ServiceRecord.objects.create(date='2024-01-02', cost='50')
+    """
+    values = {name: ServiceRecord._meta.get_field(name).to_python(getattr(record, name)) for name in RECORD_FIELDS}
+    values['cost'] = values['cost'].quantize(CENT)  # Stored with two decimal places
+    return values
+
+def rebuild_vehicle_summary(vehicle_id):
+    """Recompute one vehicle's summary and last_* fields from its records."""
+    rebuild_summaries(Vehicle.objects.filter(pk=vehicle_id))
+
+def rebuild_summaries(vehicles=None, batch_size=1000):
+    """
+    Recompute summaries and last_* fields for vehicles (default: all) set-wise:
+    one grouped aggregate and one annotated vehicle query per batch, written with
+    bulk_update/bulk_create. Returns the number of vehicles processed.
+    """
+    vehicles = (vehicles if vehicles is not None else Vehicle.objects.all()).order_by('pk')
+    latest = ServiceRecord.objects.filter(vehicle=OuterRef('pk')).order_by('-date', '-id')
+    latest_oil = _oil_changes(latest)
+    annotated = vehicles.annotate(
+        ls_date=Subquery(latest.values('date')[:1]), ls_mileage=Subquery(latest.values('mileage')[:1]),
+        lo_date=Subquery(latest_oil.values('date')[:1]), lo_mileage=Subquery(latest_oil.values('mileage')[:1]),
+    ).only('pk', 'last_service_date', 'last_service_mileage', 'last_oil_change_date', 'last_oil_change_mileage')
+    processed, last_pk = 0, 0
+    while True:
+        batch = list(annotated.filter(pk__gt=last_pk)[:batch_size])
+        if not batch: break
+        last_pk = batch[-1].pk
+        ids = [v.pk for v in batch]
+        totals = {vid: {'record_count': 0, 'lifetime_cost': Decimal('0'), 'cost_by_type': {}, 'latest_mileage': None} for vid in ids}
+        grouped = (ServiceRecord.objects.filter(vehicle_id__in=ids).order_by()
+                   .values('vehicle_id', 'service_type').annotate(n=Count('id'), cost=Sum('cost'), mileage=Max('mileage')))
+        for row in grouped:
+            t = totals[row['vehicle_id']]
+            # SQLite sums decimals as floats; round back to cents
+            cost = (row['cost'] or Decimal('0')).quantize(CENT)
+            t['record_count'] += row['n']
+            t['lifetime_cost'] += cost
+            if cost: t['cost_by_type'][row['service_type']] = str(cost)
+            if t['latest_mileage'] is None or row['mileage'] > t['latest_mileage']: t['latest_mileage'] = row['mileage']
+        for v in batch:
+            v.last_service_date, v.last_service_mileage = v.ls_date, v.ls_mileage
+            v.last_oil_change_date, v.last_oil_change_mileage = v.lo_date, v.lo_mileage
+        with transaction.atomic():
+            Vehicle.objects.bulk_update(batch, ['last_service_date', 'last_service_mileage', 'last_oil_change_date', 'last_oil_change_mileage'])
+            VehicleSummary.objects.bulk_create(
+                [VehicleSummary(vehicle_id=vid, **t) for vid, t in totals.items()],
+                update_conflicts=True, unique_fields=['vehicle'],
+                update_fields=['record_count', 'lifetime_cost', 'cost_by_type', 'latest_mileage', 'updated_at'],
+            )
+            query_cache.invalidate(vehicle_ids=ids)
+        processed += len(batch)
+    return processed
@@ -0,0 +1,72 @@
+# AutoLogX/autologx/api/tasks.py
+"""Background tasks run by `manage.py run_workers` (see jobs.py); enqueue with jobs.enqueue(task, **kwargs)"""
+import logging
+from django.db import transaction
+from django.utils import timezone
+from .jobs import task
+from .models import Vehicle
+from .query_cache import query_cache
+from .services import decode_vin, normalize_vin, vin_cache
+from .vin_index import validate_vin
+from .rollups import rebuild_rollups
+from .summaries import rebuild_summaries
+from . import deletion, odometer, thumbnails
+
+logger = logging.getLogger(__name__)
+
+# Details a VIN decode may fill in when the user left them blank
+VIN_DETAIL_FIELDS = ['trim', 'engine', 'engine_size', 'fuel_type', 'transmission']
+
+@task(priority=10)
+def enrich_vehicle_from_vin(vehicle_id):
+    """Fill blank vehicle details from the decoded VIN; retried while NHTSA is unreachable"""
+    vin = Vehicle.objects.filter(pk=vehicle_id).values_list('vin', flat=True).first()
+    if not vin: return
+    error = validate_vin(normalize_vin(vin))
+    if error:
+        # Never decodable, so not worth a lookup (or a retry)
+        logger.info(f"VIN {vin} of vehicle {vehicle_id} not decoded: {error}")
+        return
+    vehicle_data = decode_vin(vin)
+    if vehicle_data is None:
+        # Undecodable VINs are cached as such; anything else was a network failure worth retrying
+        hit, _ = vin_cache.get(vin)
+        if not hit: raise RuntimeError(f"VIN decode unavailable for {vin}")
+        logger.info(f"VIN {vin} of vehicle {vehicle_id} could not be decoded")
+        return
+    with transaction.atomic():
+        # Re-read under lock after the (slow) decode: only fields still blank are filled
+        vehicle = Vehicle.objects.select_for_update().only('id', *VIN_DETAIL_FIELDS).filter(pk=vehicle_id).first()
+        if vehicle is None: return
+        updates = {}
+        for field in VIN_DETAIL_FIELDS:
+            value = vehicle_data.get(field)
+            if value in (None, '') or getattr(vehicle, field) not in (None, ''): continue
+            max_length = Vehicle._meta.get_field(field).max_length
+            updates[field] = value[:max_length] if max_length else value
+        if updates:
+            Vehicle.objects.filter(pk=vehicle_id).update(**updates, updated_at=timezone.now())
+            query_cache.invalidate(vehicle_ids=[vehicle_id])
+            logger.info(f"Vehicle {vehicle_id} details filled from VIN: {', '.join(updates)}")
+
+@task(priority=5)
+def rebuild_vehicle_summaries(vehicle_ids):
+    """Summaries and monthly rollups of vehicles, rebuilt from their service records"""
+    rebuild_summaries(Vehicle.objects.filter(pk__in=vehicle_ids))
+    rebuild_rollups(Vehicle.objects.filter(pk__in=vehicle_ids))
+
+@task()
+def render_attachment_derivatives(name, variants=None):
+    """Thumbnails/previews (default: every variant) of a stored attachment file (see thumbnails.py)"""
+    thumbnails.generate(name, variants=variants)
+
+@task()
+def sweep_vehicle_media(vehicle_ids):
+    """Files of vehicles removed by deletion.delete_vehicles"""
+    removed = deletion.sweep_vehicle_media(vehicle_ids)
+    if removed: logger.info(f"Swept {removed} files of {len(vehicle_ids)} deleted vehicles")
+
+@task(priority=5)
+def flush_odometer_readings():
+    """Staged telematics readings into the odometer series and current mileage (see odometer.py)"""
+    odometer.flush()
@@ -1,3 +1,1247 @@
-from django.test import TestCase
+import io
+import json
+import math
+import os
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock, skipIf
+import httpx
+import requests
+from PIL import Image
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.contrib.sessions.models import Session
+from django.db import IntegrityError, connection, connections, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template import engines
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from .downloads import parse_range, serve_file
+from .exports import _text
+from .management.commands.build_vin_index import vehicle_records
+from . import admin, db_routing, deletion, forecasting, jobs, metrics, odometer, rollups, search, services, tasks, thumbnails
+from .models import (Attachment, Job, MonthlyRollup, OdometerReading, OdometerSample, ServiceRecord, StoredBlob,
+                     Vehicle, VehicleSummary)
+from .nhtsa_stub import fake_vehicle
+from .pagination import encode_cursor, keyset_page, keyset_queryset
+from .query_cache import QueryCache
+from .rollups import rebuild_rollups
+from .services import CircuitBreaker, NhtsaClient
+from .summaries import rebuild_summaries
+from .views import SERVICE_RECORD_LIST_FIELDS, SERVICE_RECORD_ORDERING, VEHICLE_LIST_FIELDS, VEHICLE_ORDERING
+from .vin_index import compute_check_digit, vds_key, wmi_key
 
-# Create your tests here.
+# --- NHTSA client and circuit breaker ---
+
+def _response(status):
+    response = requests.Response()
+    response.status_code = status
+    return response
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = mock.patch('autologx.api.services.time.monotonic', return_value=1000.0)
+        self.now = self.clock.start()
+        self.addCleanup(self.clock.stop)
+
+    def test_opens_after_threshold_and_half_opens_after_reset(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+        self.now.return_value += 30
+        self.assertTrue(breaker.allow())  # The one trial call
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_failed_trial_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        self.now.return_value += 30
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+    def test_recovers_after_trial_raising_unexpected_request_exception(self):
+        client = NhtsaClient(retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=30))
+        with mock.patch.object(client.session, 'request', side_effect=requests.exceptions.ConnectionError):
+            with self.assertRaises(requests.exceptions.ConnectionError): client.get('https://nhtsa.test/')
+        self.now.return_value += 30
+        with mock.patch.object(client.session, 'request', side_effect=requests.exceptions.TooManyRedirects):
+            with self.assertRaises(requests.exceptions.TooManyRedirects): client.get('https://nhtsa.test/')
+        # The trial's outcome was recorded: open again, then another trial after the reset
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+        self.now.return_value += 30
+        with mock.patch.object(client.session, 'request', return_value=_response(200)):
+            self.assertEqual(client.get('https://nhtsa.test/').status_code, 200)
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_client_error_counts_as_success(self):
+        client = NhtsaClient(retries=2, breaker=CircuitBreaker(failure_threshold=1))
+        with mock.patch.object(client.session, 'request', return_value=_response(404)) as request:
+            with self.assertRaises(requests.exceptions.HTTPError): client.get('https://nhtsa.test/')
+        self.assertEqual(request.call_count, 1)
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_retries_server_errors_then_opens(self):
+        client = NhtsaClient(retries=2, backoff=0, breaker=CircuitBreaker(failure_threshold=1))
+        with mock.patch.object(client.session, 'request', return_value=_response(503)) as request:
+            with self.assertRaises(requests.exceptions.HTTPError): client.get('https://nhtsa.test/')
+        self.assertEqual(request.call_count, 3)
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+
+class AsyncDecodeTests(SimpleTestCase):
+    VIN = '1HGCM82633A004352'
+
+    def setUp(self):
+        for patch in (mock.patch.object(services.nhtsa_client, 'breaker', CircuitBreaker()),
+                      mock.patch.object(services.nhtsa_client, 'backoff', 0)):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def decode(self, responses):
+        clients, calls = [], iter(responses)
+        async def get(client, url):
+            clients.append(client)
+            outcome = next(calls)
+            if isinstance(outcome, Exception): raise outcome
+            status, body = outcome
+            return httpx.Response(status, json=body, request=httpx.Request('GET', url))
+        with mock.patch.object(httpx.AsyncClient, 'get', get):
+            result = async_to_sync(services.adecode_vin)(self.VIN, use_cache=False, use_local=False)
+        return result, clients
+
+    def test_retries_like_the_sync_client(self):
+        honda = {'Results': [{'Variable': 'Make', 'Value': 'HONDA'}]}
+        result, clients = self.decode([httpx.ConnectError('down'), (503, {}), (200, honda)])
+        self.assertEqual(result, {'make': 'HONDA'})
+        self.assertEqual(len(clients), 3)
+
+    def test_gives_up_and_opens_breaker(self):
+        with mock.patch.object(services.nhtsa_client.breaker, 'failure_threshold', 1):
+            result, clients = self.decode([(503, {})] * 3)
+        self.assertIsNone(result)
+        self.assertEqual(services.nhtsa_client.breaker.state, CircuitBreaker.OPEN)
+
+    def test_client_closed_with_its_loop(self):
+        _, clients = self.decode([(200, {'Results': []})])
+        self.assertTrue(clients[0].is_closed)
+
+# --- Exports ---
+
+class CsvCellTests(SimpleTestCase):
+    def test_formula_cells_are_quoted(self):
+        for value in ('=HYPERLINK("x")', '+1', '-2+3', '@SUM(A1)', '\tx'):
+            self.assertEqual(_text(value), "'" + value)
+
+    def test_other_values_unchanged(self):
+        self.assertEqual(_text('Oil change'), 'Oil change')
+        self.assertEqual(_text(Decimal('-5.00')), Decimal('-5.00'))  # Numbers are not text cells
+        self.assertEqual(_text(date(2024, 1, 2)), '2024-01-02')
+        self.assertEqual(_text(None), '')
+
+# --- Offline VIN index ---
+
+def _vin(serial):
+    vin = f'1HGCM82603A{serial:06d}'  # Position 9 (weight 0) filled in with the check digit
+    return vin[:8] + compute_check_digit(vin) + vin[9:]
+
+class LearnedVinPatternTests(TestCase):
+    def add(self, owner, serial, model='Accord'):
+        Vehicle.objects.create(user=owner, vin=_vin(serial), make='Honda', model=model, year=2003)
+
+    def learned(self):
+        return dict(vehicle_records(min_owners=2))
+
+    def test_needs_agreeing_vehicles_of_several_owners(self):
+        owner = User.objects.create_user('fleet')
+        for serial in range(3): self.add(owner, serial)
+        self.assertEqual(self.learned(), {})
+        self.add(User.objects.create_user('other'), 3)
+        self.assertEqual(self.learned()[vds_key(_vin(0))]['model'], 'Accord')
+        self.assertEqual(self.learned()[wmi_key(_vin(0))], {'make': 'HONDA'})
+
+    def test_disagreement_drops_pattern(self):
+        self.add(User.objects.create_user('a'), 0)
+        self.add(User.objects.create_user('b'), 1, model='Civic')
+        self.assertNotIn(vds_key(_vin(0)), self.learned())
+
+# --- VIN decode cache ---
+
+class VinDecodeCacheTests(SimpleTestCase):
+    VIN = '1HGCM82633A004352'
+
+    def setUp(self):
+        caches['default'].clear()
+        self.cache = services.VinDecodeCache(maxsize=2, ttl=600, negative_ttl=60, cache_alias='default')
+
+    def test_shared_level_refills_the_lru(self):
+        self.cache.set(self.VIN, {'make': 'HONDA'})
+        self.cache._lru.clear()  # As in another worker process
+        self.assertEqual(self.cache.get(self.VIN.lower()), (True, {'make': 'HONDA'}))
+        self.assertEqual(self.cache.get(self.VIN), (True, {'make': 'HONDA'}))
+        stats = self.cache.stats()
+        self.assertEqual((stats['shared_hits'], stats['lru_hits'], stats['misses']), (1, 1, 0))
+
+    def test_lru_is_bounded(self):
+        for serial in range(3): self.cache.set(_vin(serial), {'make': 'HONDA'})
+        self.assertEqual(self.cache.stats()['lru_size'], 2)
+        self.assertEqual(self.cache.get(_vin(0)), (True, {'make': 'HONDA'}))  # Evicted, still shared
+
+    def test_undecodable_vin_is_cached_as_negative(self):
+        self.cache.set(self.VIN, None)
+        self.assertEqual(self.cache.get(self.VIN), (True, None))
+        self.assertEqual(self.cache.stats()['negative_hits'], 1)
+
+    def test_negative_entries_expire_sooner(self):
+        with mock.patch('autologx.api.services.time.monotonic', return_value=1000.0) as now, \
+             mock.patch.object(self.cache, '_shared', return_value=None):
+            self.cache.set(self.VIN, None)
+            self.cache.set(_vin(1), {'make': 'HONDA'})
+            now.return_value += 61
+            self.assertEqual(self.cache.get(self.VIN), (False, None))
+            self.assertEqual(self.cache.get(_vin(1)), (True, {'make': 'HONDA'}))
+
+    def test_promoted_entry_keeps_its_remaining_ttl(self):
+        with mock.patch('autologx.api.services.time.time', return_value=1000.0):
+            self.cache.set(self.VIN, {'make': 'HONDA'})
+        self.cache._lru.clear()
+        with mock.patch('autologx.api.services.time.time', return_value=1590.0), \
+             mock.patch('autologx.api.services.time.monotonic', return_value=5000.0) as now:
+            self.assertEqual(self.cache.get(self.VIN), (True, {'make': 'HONDA'}))
+            now.return_value += 11
+            self.assertEqual(self.cache._lru_get(f'vin:{self.VIN}'), None)
+
+    def test_empty_decode_is_negative_when_fresh_and_cached(self):
+        response = mock.Mock(**{'json.return_value': {'Results': [{'Variable': 'Make', 'Value': ''}]}})
+        with mock.patch.object(services, 'vin_cache', self.cache), \
+             mock.patch.object(services.nhtsa_client, 'get', return_value=response) as get:
+            self.assertIsNone(services.decode_vin(self.VIN, use_local=False))
+            self.assertIsNone(services.decode_vin(self.VIN, use_local=False))
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(self.cache.stats()['negative_hits'], 1)
+
+# --- Batch VIN decoding ---
+
+class DecodeVinsTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        cache = services.VinDecodeCache(cache_alias='default')
+        for patch in (mock.patch.object(services, 'vin_cache', cache),
+                      mock.patch.object(services.nhtsa_client, 'post', side_effect=self.post)):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.sent = []
+
+    def post(self, url, data, **kwargs):
+        vins = data['data'].split(';')
+        self.sent.append(vins)
+        return mock.Mock(**{'json.return_value': {'Results': [fake_vehicle(vin) for vin in vins]}})
+
+    def test_chunks_cache_and_invalid_vins(self):
+        undecodable = _vin(9).replace('1HGCM', '1ZZZM')
+        undecodable = undecodable[:8] + compute_check_digit(undecodable) + undecodable[9:]
+        vins = [_vin(1), _vin(2).lower(), undecodable, _vin(1), '1HGCM82633A004353']  # Repeat; bad check digit
+        decoded = services.decode_vins(vins, chunk_size=2, max_workers=1, use_local=False)
+        self.assertEqual(sorted(map(sorted, self.sent)), sorted([sorted([_vin(1), _vin(2)]), [undecodable]]))
+        self.assertEqual(decoded[_vin(1)]['make'], fake_vehicle(_vin(1))['Make'])
+        self.assertEqual(decoded[_vin(2)]['year'], int(fake_vehicle(_vin(2))['ModelYear']))
+        self.assertEqual((decoded[undecodable], decoded['1HGCM82633A004353']), (None, None))
+        self.sent.clear()
+        self.assertEqual(services.decode_vins(vins, use_local=False), decoded)  # Answered from the cache
+        self.assertEqual(self.sent, [])
+
+class DecodeVinsCommandTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('fleet')
+        self.mine = Vehicle.objects.create(user=self.owner, vin=_vin(1), make='Honda', model='Accord', year=2003)
+        self.theirs = Vehicle.objects.create(user=User.objects.create_user('other'), vin=_vin(2), make='Honda', model='Civic', year=2005)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = f'{directory}/vins.csv'
+        with open(self.path, 'w') as f: f.write(f'vin\n{_vin(1)}\n{_vin(2)}\n{_vin(3)}\nshort\n')
+
+    def test_updates_own_vehicles_creates_new_ones_and_skips_others(self):
+        decoded = {vin: {'make': 'HONDA', 'model': 'Fit', 'year': 2010, 'trim': 'LX'} for vin in (_vin(1), _vin(2), _vin(3))}
+        out, err = io.StringIO(), io.StringIO()
+        with mock.patch('autologx.api.management.commands.decode_vins.decode_vins', return_value=decoded):
+            call_command('decode_vins', self.path, user='fleet', stdout=out, stderr=err)
+        self.assertIn('Created 1, updated 1, failed 0, conflicts 1, invalid 1.', out.getvalue())
+        self.assertIn(f'Skipped {_vin(2)}', err.getvalue())
+        self.mine.refresh_from_db()
+        self.assertEqual((self.mine.model, self.mine.trim), ('Fit', 'LX'))
+        self.theirs.refresh_from_db()
+        self.assertEqual((self.theirs.model, self.theirs.user.username), ('Civic', 'other'))
+        created = Vehicle.objects.get(vin=_vin(3))
+        self.assertEqual(created.user, self.owner)
+        self.assertEqual(VehicleSummary.objects.get(vehicle=created).record_count, 0)
+
+# --- Keyset pagination ---
+
+class KeysetPaginationTests(TestCase):
+    ORDERING = ['-date', '-id']
+
+    def setUp(self):
+        self.vehicle = Vehicle.objects.create(user=User.objects.create_user('owner'), make='Honda', model='Accord', year=2003)
+        for day in (1, 1, 1, 2, 3):  # Ties on date are broken by id
+            self.add(date(2024, 1, day))
+        self.records = ServiceRecord.objects.all()
+        self.expected = list(self.records.order_by(*self.ORDERING).values_list('pk', flat=True))
+
+    def add(self, day):
+        return ServiceRecord.objects.create(vehicle=self.vehicle, service_type='other', date=day, mileage=day.day,
+                                            cost=Decimal('1.00'), description='Service')
+
+    def page(self, cursor=None, page_size=2):
+        rows, cursor = keyset_page(self.records, self.ORDERING, cursor, page_size)
+        return [row.pk for row in rows], cursor
+
+    def pages(self, page_size):
+        pages, cursor = [], None
+        while True:
+            rows, cursor = self.page(cursor, page_size)
+            pages.append(rows)
+            if cursor is None: return pages
+
+    def test_pages_cover_ties_without_gaps_or_repeats(self):
+        for page_size in (1, 2, 4):
+            self.assertEqual(sum(self.pages(page_size), []), self.expected)
+
+    def test_exact_multiple_ends_without_an_empty_page(self):
+        self.assertEqual(self.pages(5), [self.expected])
+
+    def test_malformed_cursor_restarts(self):
+        for cursor in ('%%%', encode_cursor([1]), encode_cursor(['not-a-date', 1]), encode_cursor({'id': 1})):
+            self.assertEqual(self.page(cursor)[0], self.expected[:2])
+
+    def test_rows_added_meanwhile_do_not_shift_pages(self):
+        _, cursor = self.page()
+        self.add(date(2024, 2, 1))
+        self.assertEqual(self.page(cursor)[0], self.expected[2:4])
+
+# --- Hot query indexes ---
+
+@skipIf(connection.vendor != 'sqlite', "Plans are checked on SQLite")
+class HotQueryPlanTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+        self.vehicle = Vehicle.objects.create(user=self.owner, make='Honda', model='Accord', year=2003)
+        self.record = ServiceRecord.objects.create(vehicle=self.vehicle, service_type='oil_change', date=date(2024, 1, 10),
+                                                   mileage=1000, cost=Decimal('40'), description='Oil change')
+
+    def assertUses(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(f'USING INDEX {index} ', plan)
+        self.assertNotIn('USE TEMP B-TREE', plan)  # The index order is the result order
+
+    def test_lists_and_pages_use_the_composite_indexes(self):
+        vehicles = Vehicle.objects.filter(user=self.owner).only(*VEHICLE_LIST_FIELDS)
+        records = ServiceRecord.objects.filter(vehicle=self.vehicle).only(*SERVICE_RECORD_LIST_FIELDS)
+        self.assertUses(vehicles.order_by(*VEHICLE_ORDERING), 'vehicle_user_created_idx')
+        self.assertUses(keyset_queryset(vehicles, VEHICLE_ORDERING, encode_cursor([self.vehicle.created_at, self.vehicle.pk])),
+                        'vehicle_user_created_idx')
+        self.assertUses(records.order_by(*SERVICE_RECORD_ORDERING), 'sr_vehicle_date_idx')
+        self.assertUses(keyset_queryset(records, SERVICE_RECORD_ORDERING, encode_cursor([self.record.date, self.record.pk])),
+                        'sr_vehicle_date_idx')
+        self.assertUses(ServiceRecord.objects.filter(service_type='oil_change', date__gte='2020-01-01').order_by('date'),
+                        'sr_type_date_idx')
+
+    def test_explain_hot_queries(self):
+        out = io.StringIO()
+        call_command('explain_hot_queries', stdout=out)
+        headers = [line for line in out.getvalue().splitlines() if line.startswith('== ')]
+        self.assertEqual(len(headers), 7)
+        self.assertIn('== vehicle_list [sqlite] ok', headers)
+        self.assertIn('== service history next page [sqlite] ok', headers)
+        # The make filter reads a join, whose rows are then sorted by id: flagged, and fatal with --fail-on-scan
+        self.assertEqual([line for line in headers if not line.endswith(' ok')], ['== admin filter vehicle__make [sqlite] SCAN/SORT'])
+        with self.assertRaisesMessage(CommandError, "1 hot queries scan or sort: admin filter vehicle__make"):
+            call_command('explain_hot_queries', '--fail-on-scan', stdout=io.StringIO())
+        with self.assertRaisesMessage(CommandError, "Unknown database alias 'nope'"):
+            call_command('explain_hot_queries', '--database', 'nope', stdout=io.StringIO())
+
+# --- Vehicle summaries and rollups ---
+
+def _maintained(vehicle_ids):
+    """Incrementally maintained state of vehicles: summaries, last_* fields and rollup cells"""
+    summaries = {
+        s.vehicle_id: (s.record_count, s.lifetime_cost, {k: Decimal(v) for k, v in s.cost_by_type.items()}, s.latest_mileage)
+        for s in VehicleSummary.objects.filter(vehicle_id__in=vehicle_ids)
+    }
+    last = list(Vehicle.objects.filter(pk__in=vehicle_ids).order_by('pk').values_list(
+        'last_service_date', 'last_service_mileage', 'last_oil_change_date', 'last_oil_change_mileage'))
+    cells = sorted(MonthlyRollup.objects.filter(vehicle_id__in=vehicle_ids).values_list(
+        'vehicle_id', 'month', 'service_type', 'shop_name', 'record_count', 'total_cost', 'min_mileage', 'max_mileage'))
+    return summaries, last, cells
+
+class SummaryTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+        self.vehicle, self.other = (Vehicle.objects.create(user=self.owner, make='Honda', model=model, year=2003) for model in ('Accord', 'Civic'))
+
+    def add(self, vehicle=None, **values):
+        values = {'service_type': 'oil_change', 'date': date(2024, 1, 1), 'mileage': 1000, 'cost': Decimal('50.00'), **values}
+        return ServiceRecord.objects.create(vehicle=vehicle or self.vehicle, description='Service', **values)
+
+    def assertConsistent(self):
+        """The incremental state equals a rebuild from the records"""
+        ids = [self.vehicle.pk, self.other.pk]
+        maintained = _maintained(ids)
+        rebuild_summaries(Vehicle.objects.filter(pk__in=ids))
+        rebuild_rollups(Vehicle.objects.filter(pk__in=ids))
+        self.assertEqual(maintained, _maintained(ids))
+
+    def test_create_edit_delete(self):
+        first = self.add(shop_name='Quick Lube')
+        latest = self.add(date=date(2024, 3, 5), mileage=4000, cost=Decimal('120.00'), service_type='brake_service')
+        self.add(self.other, date=date(2024, 3, 9), mileage=900)
+        self.assertConsistent()
+        first.cost, first.mileage = Decimal('65.50'), 1200
+        first.save()
+        self.assertConsistent()
+        latest.service_type, latest.date = 'oil_change', date(2024, 1, 20)  # Another cell, no longer the latest
+        latest.save()
+        self.assertConsistent()
+        first.vehicle = self.other
+        first.save()
+        self.assertConsistent()
+        latest.delete()
+        self.assertConsistent()
+        summary = VehicleSummary.objects.get(vehicle=self.vehicle)
+        self.assertEqual((summary.record_count, summary.lifetime_cost, summary.latest_mileage), (0, Decimal('0'), None))
+
+    def test_bulk_create_and_update(self):
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        items = [{'vehicle': vehicle.pk, 'service_type': service_type, 'date': day, 'mileage': mileage, 'cost': cost,
+                  'description': 'Service', 'shop_name': shop}
+                 for vehicle, service_type, day, mileage, cost, shop in (
+                     (self.vehicle, 'oil_change', '2024-01-05', 1000, '40.00', 'A'),
+                     (self.vehicle, 'oil_change', '2024-01-25', 1800, '45.00', 'A'),
+                     (self.vehicle, 'tire_rotation', '2024-02-02', 2100, '25.00', ''),
+                     (self.other, 'inspection', '2024-02-10', 500, '30.00', 'B'))]
+        response = client.post('/api/v1/service-records/bulk/', items, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertConsistent()
+        ids = [item['id'] for item in response.json()]
+        response = client.patch('/api/v1/service-records/bulk/', [
+            {'id': ids[0], 'cost': '42.00'},                            # Cost only
+            {'id': ids[1], 'mileage': 900, 'date': '2024-03-01'},      # No longer the highest mileage; now the latest
+            {'id': ids[2], 'vehicle': self.other.pk},                   # Moved
+            {'id': ids[3], 'service_type': 'oil_change', 'shop_name': 'A'},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertConsistent()
+        self.assertFalse(Job.objects.filter(task=tasks.rebuild_vehicle_summaries.task_name).exists())
+
+    def test_raw_string_values_from_the_orm(self):
+        self.add(date=date(2024, 3, 1), mileage=3000)
+        record = self.add(date='2024-02-01', mileage='2500', cost='19.95')  # Converted on save, not on assignment
+        self.add(date='2024-04-01', mileage='4000', cost='10', service_type='tire_rotation')
+        self.assertConsistent()
+        self.vehicle.refresh_from_db()
+        self.assertEqual((self.vehicle.last_service_date, self.vehicle.last_oil_change_date), (date(2024, 4, 1), date(2024, 3, 1)))
+        record.date, record.mileage, record.cost = '2024-05-01', '5000', '21'
+        record.save()
+        self.assertConsistent()
+        self.assertEqual(VehicleSummary.objects.get(vehicle=self.vehicle).lifetime_cost, Decimal('81.00'))
+
+    def test_delete_builds_missing_summary(self):
+        self.add()
+        record = self.add(date=date(2024, 6, 1), mileage=5000, cost=Decimal('80.00'))
+        VehicleSummary.objects.filter(vehicle=self.vehicle).delete()  # As for vehicles older than summaries
+        record.delete()
+        summary = VehicleSummary.objects.get(vehicle=self.vehicle)
+        self.assertEqual((summary.record_count, summary.lifetime_cost, summary.latest_mileage), (1, Decimal('50.00'), 1000))
+        self.vehicle.refresh_from_db()
+        self.assertEqual(self.vehicle.last_oil_change_date, date(2024, 1, 1))
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+        self.accord, self.civic = (Vehicle.objects.create(user=self.owner, make='Honda', model=model, year=2003) for model in ('Accord', 'Civic'))
+
+    def add(self, vehicle, service_type, day, mileage, cost, shop=''):
+        return ServiceRecord.objects.create(vehicle=vehicle, service_type=service_type, date=day, mileage=mileage, cost=cost,
+                                            description='Service', shop_name=shop)
+
+    def cells(self):
+        return sorted(MonthlyRollup.objects.values_list('vehicle_id', 'month', 'service_type', 'shop_name', 'record_count',
+                                                        'total_cost', 'min_mileage', 'max_mileage'))
+
+    def test_raw_string_values_from_the_orm(self):
+        record = self.add(self.accord, 'oil_change', '2024-01-10', '1000', '40', 'Quick Lube')
+        self.assertEqual(self.cells(), [(self.accord.pk, date(2024, 1, 1), 'oil_change', 'Quick Lube', 1, Decimal('40.00'), 1000, 1000)])
+        record = ServiceRecord.objects.get(pk=record.pk)
+        record.date, record.cost = '2024-02-03', '45.50'
+        record.save()
+        self.assertEqual(self.cells(), [(self.accord.pk, date(2024, 2, 1), 'oil_change', 'Quick Lube', 1, Decimal('45.50'), 1000, 1000)])
+
+    def test_rebuild_replaces_drifted_rows(self):
+        self.add(self.accord, 'oil_change', date(2024, 1, 10), 1000, Decimal('40.00'))
+        self.add(self.accord, 'oil_change', date(2024, 1, 28), 1400, Decimal('42.00'))
+        self.add(self.civic, 'inspection', date(2024, 2, 5), 700, Decimal('20.00'))
+        expected = self.cells()
+        MonthlyRollup.objects.filter(vehicle=self.accord).update(record_count=9, total_cost=Decimal('1.00'))
+        MonthlyRollup.objects.filter(vehicle=self.civic).delete()
+        self.assertEqual(rebuild_rollups(Vehicle.objects.filter(pk__in=[self.accord.pk, self.civic.pk])), 2)
+        self.assertEqual(self.cells(), expected)
+        self.assertEqual(expected[0][4:], (2, Decimal('82.00'), 1000, 1400))
+
+    def test_fleet_analytics(self):
+        self.add(self.accord, 'oil_change', date(2023, 12, 20), 900, Decimal('35.00'), 'Quick Lube')  # Before the window
+        self.add(self.accord, 'oil_change', date(2024, 1, 10), 1000, Decimal('40.00'), 'Quick Lube')
+        self.add(self.accord, 'brake_service', date(2024, 3, 2), 4000, Decimal('200.00'), 'Dealer')
+        self.add(self.civic, 'oil_change', date(2024, 1, 20), 500, Decimal('30.00'))
+        self.add(self.civic, 'inspection', date(2024, 2, 5), 700, Decimal('20.00'), 'Dealer')
+        stranger = Vehicle.objects.create(user=User.objects.create_user('stranger'), make='Ford', model='F-150', year=2015)
+        self.add(stranger, 'oil_change', date(2024, 2, 1), 100, Decimal('999.00'), 'Dealer')
+        analytics = rollups.fleet_analytics(self.owner, months=3, today=date(2024, 3, 15))
+        self.assertEqual(analytics['start'], date(2024, 1, 1))
+        self.assertEqual([(m['month'], m['count'], m['total'], m['by_type']) for m in analytics['months']], [
+            (date(2024, 1, 1), 2, Decimal('70.00'), {'oil_change': Decimal('70.00')}),
+            (date(2024, 2, 1), 1, Decimal('20.00'), {'inspection': Decimal('20.00')}),
+            (date(2024, 3, 1), 1, Decimal('200.00'), {'brake_service': Decimal('200.00')}),
+        ])
+        self.assertEqual(analytics['total_cost'], Decimal('290.00'))
+        self.assertEqual([(v['vehicle_id'], v['count'], v['cost'], v['miles'], v['cost_per_mile']) for v in analytics['vehicles']], [
+            (self.accord.pk, 2, Decimal('240.00'), 3000, Decimal('0.080')),
+            (self.civic.pk, 2, Decimal('50.00'), 200, Decimal('0.250')),
+        ])
+        self.assertEqual(analytics['shops'], [{'shop_name': 'Dealer', 'count': 2, 'cost': Decimal('220.00')},
+                                              {'shop_name': 'Quick Lube', 'count': 1, 'cost': Decimal('40.00')}])
+
+# --- Maintenance forecasting ---
+
+def _forecast_per_vehicle(today, horizon_days):
+    """The forecast computed one vehicle and one service type at a time, to check the vectorized engine against"""
+    intervals, today_day, results = forecasting.get_intervals(), forecasting._day_number(today), []
+    for vehicle in Vehicle.objects.order_by('pk'):
+        records = list(vehicle.service_records.all())
+        if not records: continue
+        points = [(forecasting._day_number(r.date), r.mileage) for r in records]
+        current_day = forecasting._day_number(vehicle.updated_at.date())
+        if vehicle.current_mileage > 0: points.append((current_day, vehicle.current_mileage))
+        n, mean_x = len(points), sum(x for x, _ in points) / len(points)
+        mean_y = sum(y for _, y in points) / n
+        spread = sum((x - mean_x) ** 2 for x, _ in points)
+        slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / spread if n >= 2 and spread else 0
+        rate = slope if slope > 0 else forecasting.DEFAULT_DAILY_MILES
+        newest_day = max([forecasting._day_number(r.date) for r in records] + [current_day])
+        estimated = max([r.mileage for r in records] + [vehicle.current_mileage]) + rate * max(today_day - newest_day, 0)
+        for code, service_type in enumerate(forecasting.SERVICE_TYPE_KEYS):
+            of_type = [r for r in records if r.service_type == service_type]
+            if not of_type: continue
+            last = max(of_type, key=lambda r: (r.date, r.mileage))
+            interval = intervals.get(service_type) or {}
+            due_mileage = last.next_service_mileage or (last.mileage + interval['miles'] if interval.get('miles') else None)
+            by_date = last.next_service_date or (last.date + timedelta(days=interval['days']) if interval.get('days') else None)
+            by_mileage = today + timedelta(days=math.ceil((due_mileage - estimated) / rate)) if due_mileage is not None else None
+            due = min(d for d in (by_mileage, by_date) if d is not None) if by_mileage or by_date else None
+            if due is None or due > today + timedelta(days=horizon_days): continue
+            results.append((due, vehicle.pk, code, {
+                'vehicle_id': vehicle.pk, 'service_type': service_type, 'due_date': due, 'due_mileage': due_mileage,
+                'estimated_mileage': int(estimated), 'daily_miles': round(rate, 1),
+                'due_by': 'mileage' if due == by_mileage else 'date', 'last_service_date': last.date,
+            }))
+    return [result for *_, result in sorted(results, key=lambda item: item[:3])]
+
+class ForecastTests(TestCase):
+    today = date(2024, 6, 1)
+
+    def setUp(self):
+        self.owner, other = User.objects.create_user('owner'), User.objects.create_user('other')
+        self.steady, self.single, self.empty, self.paired, self.typo = (
+            Vehicle.objects.create(user=user, make='Honda', model='Accord', year=2003) for user in (self.owner,) * 4 + (other,))
+        def record(vehicle, service_type, day, mileage, **fields):
+            return ServiceRecord(vehicle=vehicle, service_type=service_type, date=date.fromisoformat(day), mileage=mileage,
+                                 cost=Decimal('50'), description='Service', **fields)
+        ServiceRecord.objects.bulk_create([  # No signals: current_mileage stays as set below
+            # 40 miles a day, the current reading included
+            record(self.steady, 'oil_change', '2024-01-01', 10000),
+            record(self.steady, 'oil_change', '2024-03-01', 12400),
+            record(self.steady, 'oil_change', '2024-04-30', 14810),
+            record(self.steady, 'tire_rotation', '2024-02-01', 11240, next_service_mileage=16500),
+            record(self.steady, 'inspection', '2023-06-10', 1800),
+            record(self.steady, 'other', '2023-12-01', 8760),  # No interval: never due
+            # One reading: the default rate
+            record(self.single, 'brake_service', '2022-01-01', 50000),
+            # One record and the current reading: 10 miles a day
+            record(self.paired, 'oil_change', '2024-05-01', 20000),
+            # Mileage going down: a non-positive fit falls back to the default rate
+            record(self.typo, 'oil_change', '2024-01-01', 30000),
+            record(self.typo, 'oil_change', '2024-02-01', 29000, next_service_date=date(2024, 6, 20)),
+        ])
+        for vehicle, mileage, updated in ((self.steady, 16000, '2024-05-30'), (self.single, 0, '2024-05-01'),
+                                          (self.empty, 5000, '2024-05-01'), (self.paired, 20300, '2024-05-31'),
+                                          (self.typo, 0, '2024-05-01')):
+            updated_at = datetime.fromisoformat(f'{updated}T12:00:00+00:00')  # The day of the current reading
+            Vehicle.objects.filter(pk=vehicle.pk).update(current_mileage=mileage, updated_at=updated_at)
+
+    def test_matches_the_per_vehicle_forecast(self):
+        fields = ('vehicle_id', 'service_type', 'due_date', 'due_mileage', 'estimated_mileage', 'daily_miles', 'due_by', 'last_service_date')
+        for horizon in (0, 30, 200, 1000):
+            with self.subTest(horizon=horizon):
+                results = forecasting.forecast(today=self.today, horizon_days=horizon)
+                self.assertEqual([{k: r[k] for k in fields} for r in results], _forecast_per_vehicle(self.today, horizon))
+        results = forecasting.forecast(today=self.today, horizon_days=200)
+        self.assertEqual([(r['vehicle_id'], r['service_type'], r['due_date'], r['due_by'], r['daily_miles']) for r in results], [
+            (self.single.pk, 'brake_service', date(2024, 1, 1), 'date', 37.0),  # Overdue
+            (self.steady.pk, 'inspection', date(2024, 6, 9), 'date', 40.0),
+            (self.steady.pk, 'tire_rotation', date(2024, 6, 12), 'mileage', 40.0),  # next_service_mileage, 420 miles out
+            (self.typo.pk, 'oil_change', date(2024, 6, 20), 'date', 37.0),  # next_service_date
+            (self.steady.pk, 'oil_change', date(2024, 9, 3), 'mileage', 40.0),
+            (self.paired.pk, 'oil_change', date(2024, 10, 30), 'date', 10.0),
+        ])
+        self.assertNotIn(self.empty.pk, {r['vehicle_id'] for r in results})
+
+    def test_limit_and_vehicle_subset(self):
+        everything = forecasting.forecast(today=self.today, horizon_days=200)
+        self.assertEqual(forecasting.forecast(today=self.today, horizon_days=200, limit=2), everything[:2])
+        mine = forecasting.forecast(Vehicle.objects.filter(user=self.owner), today=self.today, horizon_days=200)
+        self.assertEqual(mine, [r for r in everything if r['vehicle_id'] != self.typo.pk])
+        self.assertEqual(forecasting.forecast(Vehicle.objects.filter(pk=self.empty.pk), today=self.today), [])
+
+    def test_command(self):
+        def run(*args):
+            out = io.StringIO()
+            with mock.patch.object(forecasting, 'date') as today:
+                today.today.return_value = self.today
+                call_command('forecast_maintenance', '--days', '200', *args, stdout=out, stderr=io.StringIO())
+            return out.getvalue().splitlines()
+        expected = forecasting.forecast(today=self.today, horizon_days=200)
+        self.assertEqual([json.loads(line) for line in run('--format', 'jsonl')], json.loads(json.dumps(expected, default=str)))
+        rows = [json.loads(line) for line in run('--format', 'jsonl', '--user', 'owner', '--service-type', 'oil_change', '--limit', '1')]
+        self.assertEqual([(r['vehicle_id'], r['service_type']) for r in rows], [(self.steady.pk, 'oil_change')])
+        csv_rows = run('--format', 'csv')
+        self.assertEqual(csv_rows[0].split(','), list(expected[0]))
+        self.assertEqual(len(csv_rows), len(expected) + 1)
+        self.assertEqual(len(run()), len(expected))
+
+# --- Service record import ---
+
+class ImportTests(TestCase):
+    HEADER = b'vin,service_type,date,mileage,description,cost\n'
+
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+        Vehicle.objects.create(user=self.owner, vin=_vin(1), make='Honda', model='Accord', year=2003)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def upload(self, *lines):
+        content = self.HEADER + b''.join(line + b'\n' for line in lines)
+        response = self.client.post('/api/v1/service-records/import/', {'file': SimpleUploadedFile('history.csv', content)})
+        return response.status_code, response.json()
+
+    def row(self, description):
+        return f'{_vin(1)},oil_change,2024-01-02,1000,'.encode() + description + b',40.00'
+
+    def test_latin1_line_stops_the_import_there(self):
+        status, result = self.upload(self.row(b'Oil'), self.row('Caf\xe9 visit'.encode('latin-1')), self.row(b'Oil'))
+        self.assertEqual(status, 201)
+        self.assertEqual((result['created'], result['failed'], result['stopped_at_line']), (1, 1, 3))
+        self.assertEqual(result['errors'][0]['line'], 3)
+        self.assertIn('UTF-8', result['errors'][0]['error'])
+        self.assertEqual(ServiceRecord.objects.count(), 1)
+
+    def test_unclosed_quote_is_reported_at_its_row(self):
+        status, result = self.upload(self.row(b'Oil'), self.row(b'"Oil'), self.row(b'Oil'))
+        self.assertEqual(status, 201)
+        self.assertEqual((result['created'], result['stopped_at_line']), (1, 3))
+        self.assertIn('Malformed CSV', result['errors'][0]['error'])
+
+    def test_readable_file_imports_fully(self):
+        status, result = self.upload(self.row(b'Oil'), self.row(b'"Oil, filter"'))
+        self.assertEqual((status, result['created'], result['failed'], result['stopped_at_line']), (201, 2, 0, None))
+
+# --- Query cache ---
+
+class QueryCacheTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.cache = QueryCache(cache_alias='default')
+        self.computed = 0
+
+    def read(self):
+        def compute():
+            self.computed += 1
+            return self.computed
+        return self.cache.get_or_compute('vehicle_detail', ['u1', 'v1'], {'cursor': None}, compute)
+
+    def test_invalidated_once_the_write_commits(self):
+        self.assertEqual(self.read(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cache.invalidate(vehicle_ids=[1])
+            self.assertEqual(self.read(), 1)  # Not before the commit: other readers still see the old rows
+        self.assertEqual(self.read(), 2)
+        self.assertEqual(self.read(), 2)
+
+    def test_rolled_back_write_keeps_entries(self):
+        self.read()
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                self.cache.invalidate(user_ids=[1], vehicle_ids=[1])
+                raise IntegrityError
+        self.assertEqual(self.read(), 1)
+
+    def test_invalidation_after_a_rolled_back_savepoint(self):
+        self.read()
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                self.cache.invalidate(vehicle_ids=[2])
+                raise IntegrityError
+            self.cache.invalidate(vehicle_ids=[1])  # Its hook went with the savepoint: a new one is needed
+        self.assertEqual(self.read(), 2)
+
+    def test_owner_change_invalidates_both_owners(self):
+        previous, new = User.objects.create_user('previous'), User.objects.create_user('new')
+        # Without signals: the test transaction never commits, so only one set of hooks can run
+        [vehicle] = Vehicle.objects.bulk_create([Vehicle(user=previous, make='Honda', model='Accord', year=2003)])
+        computed = iter(range(4))
+        def page(user):
+            return self.cache.get_or_compute('vehicle_page', [f'u{user.pk}'], None, lambda: next(computed))
+        self.assertEqual((page(previous), page(new)), (0, 1))
+        with mock.patch('autologx.api.signals.query_cache', self.cache), self.captureOnCommitCallbacks(execute=True):
+            vehicle.user = new
+            vehicle.save()
+        self.assertEqual((page(previous), page(new)), (2, 3))
+
+# --- Background jobs ---
+
+class JobQueueTests(TestCase):
+    def enqueue(self, **kwargs):
+        return jobs.enqueue(tasks.render_attachment_derivatives, name='a.jpg', **kwargs)
+
+    def test_claims_by_priority_then_age(self):
+        low, high, later = self.enqueue(), self.enqueue(priority=9), self.enqueue(priority=9)
+        self.enqueue(delay=60)
+        self.assertEqual([jobs.claim('worker').pk for _ in range(3)], [high.pk, later.pk, low.pk])
+        self.assertIsNone(jobs.claim('worker'))  # The delayed one is not ready
+        self.assertEqual(Job.objects.filter(status=Job.RUNNING, locked_by='worker', attempts=1).count(), 3)
+
+    def test_success_deletes_the_job(self):
+        self.enqueue()
+        with mock.patch.object(tasks.thumbnails, 'generate') as generate:
+            self.assertTrue(jobs.run_job(jobs.claim('worker')))
+        generate.assert_called_once_with('a.jpg', variants=None)
+        self.assertFalse(Job.objects.exists())
+
+    def test_failures_back_off_then_fail(self):
+        job = self.enqueue()
+        Job.objects.update(max_attempts=2)
+        with mock.patch.object(tasks.thumbnails, 'generate', side_effect=OSError('disk full')):
+            self.assertFalse(jobs.run_job(jobs.claim('worker')))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts, job.locked_by), (Job.QUEUED, 1, ''))
+            self.assertGreater(job.run_after, timezone.now())
+            self.assertIn('disk full', job.last_error)
+            self.assertIsNone(jobs.claim('worker'))  # Backing off
+            Job.objects.update(run_after=timezone.now())
+            self.assertFalse(jobs.run_job(jobs.claim('worker')))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_expired_lease_is_requeued(self):
+        job = self.enqueue()
+        jobs.claim('crashed')
+        self.assertEqual(jobs.requeue_expired(600), 0)
+        Job.objects.update(locked_at=timezone.now() - timedelta(seconds=601))
+        self.assertEqual(jobs.requeue_expired(600), 1)
+        self.assertEqual(jobs.claim('worker').pk, job.pk)
+
+class UniqueJobTests(TestCase):
+    def enqueue(self):
+        return jobs.enqueue(tasks.render_attachment_derivatives, name='a.jpg', variants=['thumb'], unique_key='derivative:1:thumb')
+
+    def test_one_queued_job_per_key(self):
+        self.assertEqual(self.enqueue().pk, self.enqueue().pk)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_running_job_does_not_absorb_new_work(self):
+        first = self.enqueue()
+        self.assertEqual(jobs.claim('worker').pk, first.pk)
+        second = self.enqueue()
+        self.assertNotEqual(second.pk, first.pk)
+        self.assertEqual(second.status, Job.QUEUED)
+
+    def test_failed_attempt_yields_to_queued_job(self):
+        first = self.enqueue()
+        job = jobs.claim('worker')
+        self.enqueue()
+        with mock.patch.object(tasks.thumbnails, 'generate', side_effect=OSError('disk full')):
+            self.assertFalse(jobs.run_job(job))
+        self.assertFalse(Job.objects.filter(pk=first.pk).exists())
+        self.assertEqual(Job.objects.filter(status=Job.QUEUED).count(), 1)
+
+class EnrichVehicleTests(TestCase):
+    def test_invalid_vin_is_not_looked_up(self):
+        user = User.objects.create_user('owner')
+        vehicle = Vehicle.objects.create(user=user, vin='1HGCM82633A004353', make='Honda', model='Accord', year=2003)
+        with mock.patch.object(tasks, 'decode_vin') as decode:
+            tasks.enrich_vehicle_from_vin(vehicle_id=vehicle.pk)  # Returns, so the job is not retried
+        decode.assert_not_called()
+
+# --- Attachment downloads ---
+
+class RangeTests(SimpleTestCase):
+    def test_parse_range(self):
+        cases = {
+            'bytes=0-9': (0, 9), 'bytes=5-': (5, 99), 'bytes=-10': (90, 99), 'bytes=90-500': (90, 99),
+            'bytes=-500': (0, 99), 'Bytes = 1 - 2': (1, 2),
+            # Ignored: the whole file is sent
+            'bytes=9-5': None, 'bytes=0-1,5-6': None, 'items=0-1': None, 'bytes=-': None, '': None,
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header): self.assertEqual(parse_range(header, 100), expected)
+
+    def test_unsatisfiable_ranges(self):
+        for header, size in (('bytes=100-', 100), ('bytes=-0', 100), ('bytes=-5', 0)):
+            with self.subTest(header=header), self.assertRaises(ValueError): parse_range(header, size)
+
+    def serve(self, **headers):
+        response = serve_file(RequestFactory().get('/', **headers), self.path, 'notes.txt')
+        self.addCleanup(response.close)
+        return response
+
+    def test_serves_partial_content(self):
+        with tempfile.NamedTemporaryFile(suffix='.txt') as f:
+            f.write(b'0123456789')
+            f.flush()
+            self.path = f.name
+            response = self.serve(HTTP_RANGE='bytes=2-4')
+            self.assertEqual((response.status_code, response['Content-Range']), (206, 'bytes 2-4/10'))
+            self.assertEqual(b''.join(response.streaming_content), b'234')
+            self.assertEqual(self.serve(HTTP_RANGE='bytes=2-4', HTTP_IF_RANGE='"changed"').status_code, 200)
+            response = self.serve(HTTP_RANGE='bytes=10-')
+            self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */10'))
+
+# --- Attachment blobs and vehicle deletion ---
+
+class TempMediaMixin:
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        override = self.settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.owner = User.objects.create_user('owner')
+
+    def add_record(self, vehicle):
+        return ServiceRecord.objects.create(vehicle=vehicle, service_type='other', date=date(2024, 1, 1), mileage=1000,
+                                            cost=Decimal('10.00'), description='Service')
+
+    def attach(self, record, content=b'receipt'):
+        return Attachment.objects.create(service_record=record, title='Receipt', attachment_type='receipt',
+                                         file=SimpleUploadedFile('receipt.txt', content))
+
+class BlobTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.record = self.add_record(Vehicle.objects.create(user=self.owner, make='Honda', model='Accord', year=2003))
+
+    def test_same_content_is_stored_once_and_counted(self):
+        first, second = self.attach(self.record), self.attach(self.record)
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(StoredBlob.objects.get().ref_count, 2)
+        first.delete()
+        self.assertEqual(StoredBlob.objects.get().ref_count, 1)
+
+    def test_gc_collects_unreferenced_blobs_only(self):
+        kept, dropped = self.attach(self.record, b'kept'), self.attach(self.record, b'dropped')
+        name = dropped.file.name
+        dropped.delete()
+        call_command('gc_attachment_blobs', grace_hours=1, stdout=io.StringIO())
+        self.assertEqual(StoredBlob.objects.count(), 2)  # Within the grace period
+        call_command('gc_attachment_blobs', grace_hours=0, stdout=io.StringIO())
+        self.assertEqual(list(StoredBlob.objects.values_list('name', flat=True)), [kept.file.name])
+        self.assertFalse(default_storage.exists(name))
+        self.assertTrue(default_storage.exists(kept.file.name))
+
+    def test_recount_repairs_ref_counts(self):
+        self.attach(self.record)
+        StoredBlob.objects.update(ref_count=0)
+        call_command('gc_attachment_blobs', recount=True, grace_hours=0, stdout=io.StringIO())
+        self.assertEqual(StoredBlob.objects.get().ref_count, 1)
+
+class DeleteVehiclesTests(TempMediaMixin, TestCase):
+    def test_counts_and_side_effects(self):
+        doomed = [Vehicle.objects.create(user=self.owner, make='Honda', model=model, year=2003) for model in ('Accord', 'Civic')]
+        kept = Vehicle.objects.create(user=self.owner, make='Honda', model='Fit', year=2010)
+        records = [self.add_record(doomed[0]), self.add_record(doomed[0]), self.add_record(doomed[1]), self.add_record(kept)]
+        self.attach(records[0])
+        self.attach(records[1])
+        self.attach(records[3])  # Same content: one blob, three references
+        Job.objects.all().delete()
+        total, counts = deletion.delete_vehicles(Vehicle.objects.filter(pk__in=[v.pk for v in doomed]))
+        self.assertEqual(counts, {'api.Attachment': 2, 'api.MonthlyRollup': 2, 'api.VehicleSummary': 2,
+                                  'api.ServiceRecord': 3, 'api.Vehicle': 2})
+        self.assertEqual(total, 11)
+        self.assertEqual(list(Vehicle.objects.values_list('pk', flat=True)), [kept.pk])
+        self.assertEqual(StoredBlob.objects.get().ref_count, 1)
+        self.assertEqual(Job.objects.get().kwargs, {'vehicle_ids': sorted(v.pk for v in doomed)})
+
+    def test_nothing_to_delete(self):
+        self.assertEqual(deletion.delete_vehicles(Vehicle.objects.none()), (0, {}))
+
+# --- Attachment thumbnails ---
+
+def _image_bytes(size, fmt='JPEG', mode='RGB'):
+    buffer = io.BytesIO()
+    Image.new(mode, size, 'red').save(buffer, fmt)
+    return buffer.getvalue()
+
+class ThumbnailTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        vehicle = Vehicle.objects.create(user=self.owner, make='Honda', model='Accord', year=2003)
+        self.record = self.add_record(vehicle)
+        Job.objects.all().delete()
+
+    def upload(self, filename, content):
+        return Attachment.objects.create(service_record=self.record, title='Receipt', attachment_type='receipt',
+                                         file=SimpleUploadedFile(filename, content))
+
+    def test_render_downscales_each_variant_from_the_previous(self):
+        media = default_storage.location
+        source = f'{media}/photo.png'
+        with open(source, 'wb') as f: f.write(_image_bytes((1600, 800), 'PNG', 'RGBA'))
+        targets = [(f'{media}/out/small.jpg', 100), (f'{media}/out/large.jpg', 400)]
+        self.assertEqual(thumbnails.render(source, targets, fmt='JPEG'), [targets[1][0], targets[0][0]])
+        for path, size in ((targets[0][0], (100, 50)), (targets[1][0], (400, 200))):
+            with Image.open(path) as image:
+                self.assertEqual((image.format, image.mode, image.size), ('JPEG', 'RGB', size))  # Alpha flattened
+        self.assertEqual(sorted(os.listdir(f'{media}/out')), ['large.jpg', 'small.jpg'])  # No temporary files left
+
+    @skipIf(thumbnails.pdfium is None, "pypdfium2 is not installed")
+    def test_pdf_first_page_preview(self):
+        pdf = thumbnails.pdfium.PdfDocument.new()
+        pdf.new_page(600, 300)
+        buffer = io.BytesIO()
+        pdf.save(buffer)
+        pdf.close()
+        attachment = self.upload('invoice.pdf', buffer.getvalue())
+        self.assertTrue(thumbnails.can_render(attachment.file.name))
+        thumbnails.generate(attachment.file.name, variants=['thumb'])
+        with default_storage.open(thumbnails.derivative_name(attachment.file.name, 'thumb')) as f, Image.open(f) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (320, 160)))
+
+    def test_upload_queues_every_variant_and_the_worker_renders_them(self):
+        attachment = self.upload('photo.jpg', _image_bytes((2000, 1000)))
+        self.upload('notes.txt', b'no preview')
+        job = Job.objects.get()
+        self.assertEqual((job.task, job.kwargs), ('render_attachment_derivatives', {'name': attachment.file.name}))
+        self.assertTrue(jobs.run_job(jobs.claim('worker')))
+        for variant, size in (('thumb', (320, 160)), ('preview', (1280, 640))):
+            with default_storage.open(thumbnails.derivative_name(attachment.file.name, variant)) as f, Image.open(f) as image:
+                self.assertEqual(image.size, size)
+
+    def test_derivative_view_queues_a_miss_once_then_serves_it(self):
+        attachment = self.upload('photo.jpg', _image_bytes((2000, 1000)))
+        Job.objects.all().delete()
+        client = Client()
+        client.force_login(self.owner)
+        url = reverse('attachment_derivative', args=[attachment.pk, 'thumb'])
+        for _ in range(2):
+            response = client.get(url)
+            self.assertEqual((response.status_code, response['Cache-Control']), (404, 'private, no-cache'))
+        job = Job.objects.get()  # One per attachment and variant
+        self.assertEqual((job.unique_key, job.kwargs), (f'attachment-derivative:{attachment.pk}:thumb',
+                                                        {'name': attachment.file.name, 'variants': ['thumb']}))
+        jobs.run_job(jobs.claim('worker'))
+        self.assertFalse(default_storage.exists(thumbnails.derivative_name(attachment.file.name, 'preview')))
+        response = client.get(attachment.thumbnail_url)
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'image/webp'))
+        self.assertEqual(response['Cache-Control'], 'private, max-age=31536000, immutable')
+        self.assertEqual(client.get(url)['Cache-Control'], 'private, no-cache')  # Without the version
+        self.assertEqual(client.get(reverse('attachment_derivative', args=[attachment.pk, 'huge'])).status_code, 404)
+        client.force_login(User.objects.create_user('other'))
+        self.assertEqual(client.get(attachment.thumbnail_url).status_code, 404)
+        self.assertEqual(Job.objects.count(), 0)
+
+# --- Replica routing ---
+
+@override_settings(DATABASE_ROUTING={'REPLICA_VIEWS': ['vehicle_list'], 'PIN_SECONDS': 10, 'PIN_COOKIE': 'db_primary'})
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        patch = mock.patch.object(db_routing, 'replica_aliases', return_value=['replica1'])
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.seen = []
+
+    def test_router(self):
+        router = db_routing.PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_read(Vehicle), 'default')
+        with db_routing.replica_reads():
+            self.assertEqual(router.db_for_read(Vehicle), 'replica1')
+            self.assertEqual(router.db_for_read(Session), 'default')
+            self.assertEqual(router.db_for_write(Vehicle), 'default')
+            with mock.patch.object(connections['default'], 'in_atomic_block', True):
+                self.assertEqual(router.db_for_read(Vehicle), 'default')  # Reads its own uncommitted writes
+        self.assertIsNone(db_routing.current_replica())
+
+    def request(self, method='get', url_name='vehicle_list', cookies=None, response=None):
+        def view(request):
+            middleware.process_view(request, view, (), {})  # Called by the handler once the URL is resolved
+            self.seen.append(db_routing.current_replica())
+            return response or HttpResponse()
+        middleware = db_routing.ReplicaRoutingMiddleware(view)
+        request = getattr(RequestFactory(), method)('/')
+        request.resolver_match = mock.Mock(url_name=url_name)
+        request.COOKIES.update(cookies or {})
+        return middleware(request)
+
+    def test_replica_views_read_from_a_replica_for_the_request_only(self):
+        self.request()
+        self.request(url_name='vehicle_create')
+        self.request(cookies={'db_primary': '1'})  # Wrote moments ago
+        self.assertEqual(self.seen, ['replica1', None, None])
+        self.assertIsNone(db_routing.current_replica())
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        response = self.request(method='post')
+        self.assertEqual(self.seen, [None])
+        self.assertEqual(response.cookies['db_primary']['max-age'], 10)
+        self.assertNotIn('db_primary', self.request().cookies)
+
+    def test_streamed_body_reads_from_the_request_replica(self):
+        def body():
+            yield str(db_routing.current_replica()).encode()
+        response = self.request(response=StreamingHttpResponse(body()))
+        self.assertIsNone(db_routing.current_replica())
+        self.assertEqual(b''.join(response.streaming_content), b'replica1')
+        self.assertIsNone(db_routing.current_replica())
+
+    def test_async_requests_reset_the_replica(self):
+        async def view(request):
+            middleware.process_view(request, view, (), {})
+            self.seen.append(db_routing.current_replica())
+            return HttpResponse()
+        middleware = db_routing.ReplicaRoutingMiddleware(view)
+        request = RequestFactory().get('/')
+        request.resolver_match = mock.Mock(url_name='vehicle_list')
+        async_to_sync(middleware)(request)
+        self.assertEqual(self.seen, ['replica1'])
+        self.assertIsNone(db_routing.current_replica())
+
+# --- Full-text search ---
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.owner, self.other = User.objects.create_user('owner'), User.objects.create_user('other')
+        self.vehicle = Vehicle.objects.create(user=self.owner, make='Honda', model='Accord', year=2003)
+        self.others = Vehicle.objects.create(user=self.other, make='Honda', model='Civic', year=2005)
+
+    def add(self, vehicle=None, description='Service', notes='', shop_name=''):
+        return ServiceRecord.objects.create(vehicle=vehicle or self.vehicle, service_type='other', date=date(2024, 1, 10), mileage=1000,
+                                            cost=Decimal('10'), description=description, notes=notes, shop_name=shop_name)
+
+    def found(self, text, user=None, **kwargs):
+        return [r['record'].pk for r in search.search(text, user=user or self.owner, **kwargs)[0]]
+
+    def test_ranked_by_field_weight_and_restricted_to_the_user(self):
+        in_notes = self.add(notes='Squealing brakes checked')
+        in_description = self.add(description='Front brake pads replaced')
+        in_shop = self.add(shop_name='Brake Masters')
+        self.add(self.others, description='Brake pads replaced')
+        self.add(description='Oil change')
+        self.assertEqual(self.found('brake'), [in_description.pk, in_shop.pk, in_notes.pk])
+        self.assertEqual(self.found('pads brak'), [in_description.pk])  # Every term, the last one as a prefix
+        results, has_next = search.search('brake', user=self.owner, page_size=2)
+        self.assertTrue(has_next)
+        self.assertEqual(results[0]['highlights'], {'description': 'Front <mark>brake</mark> pads replaced'})
+        self.assertEqual(len(self.found('brake', user=self.other)), 1)
+        self.assertEqual(self.found('"brake" OR oil'), [])  # Operators are words, not FTS syntax
+
+    def test_index_follows_updates_and_deletes(self):
+        record = self.add(description='Oil change')
+        ServiceRecord.objects.filter(pk=record.pk).update(description='Coolant flush')  # No signals: the triggers do it
+        self.assertEqual(self.found('oil'), [])
+        self.assertEqual(self.found('coolant'), [record.pk])
+        Attachment.objects.bulk_create([Attachment(service_record=record, title='Dealer invoice', attachment_type='invoice', file='x.pdf')])
+        self.assertEqual(self.found('invoice'), [record.pk])
+        Attachment.objects.filter(service_record=record).delete()
+        self.assertEqual(self.found('invoice'), [])
+        Vehicle.objects.filter(pk=self.vehicle.pk).update(user=self.other)
+        self.assertEqual(self.found('coolant'), [])
+        self.assertEqual(self.found('coolant', user=self.other), [record.pk])
+        ServiceRecord.objects.filter(pk=record.pk).delete()
+        self.assertEqual(self.found('coolant', user=self.other), [])
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {search.FTS_TABLE}")
+            self.assertEqual(cursor.fetchone(), (0,))
+
+    def test_icontains_fallback_without_an_index(self):
+        brakes = self.add(description='Front brake pads replaced')
+        self.add(self.others, description='Brake pads replaced')
+        with mock.patch.object(search, 'index_available', return_value=False):
+            results, _ = search.search('BRAKE pads', user=self.owner)
+            self.assertIsNone(search.filter_matching(ServiceRecord.objects.all(), 'brake'))
+        self.assertEqual([r['record'].pk for r in results], [brakes.pk])
+        self.assertEqual(results[0]['highlights'], {'description': 'Front <mark>brake</mark> <mark>pads</mark> replaced'})
+        self.assertEqual(list(search.filter_matching(ServiceRecord.objects.filter(vehicle=self.vehicle), 'brake')), [brakes])
+
+# --- Request metrics ---
+
+class RequestMetricsTests(TestCase):
+    def request(self, view_name, view):
+        request = RequestFactory().get('/')
+        request.resolver_match = mock.Mock(view_name=view_name)
+        return metrics.RequestMetricsMiddleware(view)(request)
+
+    def test_queries_outbound_calls_and_templates_are_attributed_to_the_view(self):
+        def view(request):
+            for _ in range(3): User.objects.count()
+            metrics.record_outbound(0.25)
+            engines.all()[0].from_string('{{ n }}').render({'n': 1})  # The TimedDjangoTemplates backend
+            return HttpResponse(status=201)
+        with self.assertLogs('autologx.api.metrics', 'WARNING') as logs, \
+                override_settings(METRICS={'SLOW_REQUEST_MS': 0}):
+            self.request('metrics-test', view)
+        self.assertIn(('metrics-test', 'GET', '201'), metrics.REQUESTS._values)
+        self.assertEqual(metrics.DB_QUERIES._series[('metrics-test',)][-2:], [3, 1])
+        self.assertEqual(metrics.OUTBOUND_DURATION._series[('metrics-test',)][-2:], [0.25, 1])
+        self.assertEqual(metrics.TEMPLATE_DURATION._series[('metrics-test',)][-1], 1)
+        self.assertIn('3x', logs.output[0])  # The repeated statement, grouped
+        metrics.record_outbound(1.0)  # Outside a request: ignored
+        self.assertEqual(metrics.OUTBOUND_DURATION._series[('metrics-test',)][-1], 1)
+        rendered = metrics.render_metrics()
+        self.assertIn('autologx_db_queries_per_request_bucket{view="metrics-test",le="5"} 1', rendered)
+        self.assertIn('autologx_http_requests_total{view="metrics-test",method="GET",status="201"} 1', rendered)
+
+    def test_async_requests_are_counted(self):
+        async def view(request):
+            return HttpResponse()
+        request = RequestFactory().get('/')
+        request.resolver_match = None
+        async_to_sync(metrics.RequestMetricsMiddleware(view))(request)
+        self.assertIn(('<unmatched>', 'GET', '200'), metrics.REQUESTS._values)
+        self.assertIsNone(metrics._current.get())
+
+    def test_scrape_allowed(self):
+        staff = User.objects.create_user('staff', is_staff=True)
+        client = Client()
+        self.assertEqual(client.get('/metrics').status_code, 403)
+        client.force_login(User.objects.create_user('driver'))
+        self.assertEqual(client.get('/metrics').status_code, 403)
+        client.force_login(staff)
+        response = client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE autologx_http_requests_total counter', response.content)
+        with override_settings(METRICS={'TOKEN': 'secret'}):
+            self.assertEqual(client.get('/metrics').status_code, 403)  # A token replaces the staff session
+            self.assertEqual(Client().get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code, 403)
+            self.assertEqual(Client().get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code, 200)
+
+# --- Admin on large tables ---
+
+class LargeTableAdminTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_superuser('admin'))
+        owner = User.objects.create_user('owner')
+        self.vehicles = [Vehicle.objects.create(user=owner, make=make, model='Model', year=2003) for make in ('Honda', 'Honda', 'Toyota')]
+
+    def test_estimated_count(self):
+        Vehicle.objects.filter(pk=self.vehicles[0].pk).delete()
+        queryset = Vehicle.objects.all()
+        self.assertEqual(admin.EstimatedCountPaginator(queryset, 10).count, 2)  # Small table: counted
+        with mock.patch.object(admin, 'EXACT_COUNT_BELOW', 1):
+            self.assertEqual(admin.EstimatedCountPaginator(queryset, 10).count, self.vehicles[-1].pk)  # max(rowid) on SQLite
+            with mock.patch.object(admin, 'COUNT_LIMIT', 1):
+                self.assertEqual(admin.EstimatedCountPaginator(queryset.filter(make='Honda'), 10).count, 1)  # Filtered: capped
+
+    def make_choices(self):
+        response = self.client.get('/admin/api/vehicle/')
+        self.assertEqual(response.status_code, 200)
+        [spec] = [spec for spec in response.context['cl'].filter_specs if getattr(spec, 'field_path', '') == 'make']
+        return list(spec.lookup_choices)
+
+    def test_filter_choices_are_cached(self):
+        self.assertEqual(self.make_choices(), ['Honda', 'Toyota'])
+        Vehicle.objects.create(user=self.vehicles[0].user, make='Ford', model='F-150', year=2015)
+        self.assertEqual(self.make_choices(), ['Honda', 'Toyota'])
+        cache.clear()
+        self.assertEqual(self.make_choices(), ['Ford', 'Honda', 'Toyota'])
+
+    def test_retry_skips_jobs_whose_key_is_queued(self):
+        Job.objects.all().delete()
+        queued = jobs.enqueue(tasks.flush_odometer_readings, unique_key=odometer.FLUSH_JOB_KEY)
+        failed = [jobs.enqueue(tasks.flush_odometer_readings) for _ in range(2)]
+        Job.objects.filter(pk=failed[0].pk).update(status=Job.FAILED, unique_key=odometer.FLUSH_JOB_KEY)
+        Job.objects.filter(pk=failed[1].pk).update(status=Job.FAILED)
+        response = self.client.post('/admin/api/job/', {'action': 'retry_now', '_selected_action': [j.pk for j in (queued, *failed)]},
+                                    follow=True)
+        self.assertContains(response, "2 jobs queued, 1 skipped")
+        self.assertEqual(dict(Job.objects.values_list('pk', 'status')),
+                         {queued.pk: Job.QUEUED, failed[0].pk: Job.FAILED, failed[1].pk: Job.QUEUED})
+
+# --- Odometer ingest ---
+
+class OdometerTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('fleet')
+        self.vehicle = Vehicle.objects.create(user=self.owner, vin=_vin(1), make='Honda', model='Accord', year=2003, current_mileage=1000)
+        Job.objects.all().delete()  # VIN enrichment
+        self.now = timezone.now()
+
+    def ingest(self, *mileages):
+        with self.captureOnCommitCallbacks(execute=True):
+            return odometer.ingest(self.owner, [{'vin': _vin(1), 'mileage': m, 'timestamp': self.now.isoformat()} for m in mileages], now=self.now)
+
+    def test_readings_coalesce_to_the_highest_per_bucket(self):
+        self.assertEqual(self.ingest(1100, 1500, 1300), (3, []))
+        self.assertEqual(list(OdometerReading.objects.values_list('mileage', 'reading_count')), [(1500, 3)])
+
+    def test_flush_raises_but_never_lowers_mileage(self):
+        self.ingest(1500)
+        self.assertEqual(odometer.flush(), (1, 1))
+        self.ingest(1200)  # Late, or a faulty unit
+        self.assertEqual(odometer.flush(), (1, 0))
+        self.vehicle.refresh_from_db()
+        self.assertEqual(self.vehicle.current_mileage, 1500)
+        self.assertEqual(list(OdometerSample.objects.values_list('mileage', 'reading_count')), [(1500, 2)])
+        self.assertFalse(OdometerReading.objects.exists())
+
+    def test_rejected_readings(self):
+        future = (self.now + timedelta(hours=1)).isoformat()
+        accepted, rejected = odometer.ingest(self.owner, [
+            {'vin': _vin(2), 'mileage': 5, 'timestamp': self.now.isoformat()},
+            {'vin': _vin(1), 'mileage': -1, 'timestamp': self.now.isoformat()},
+            {'vin': _vin(1), 'mileage': 5, 'timestamp': future},
+        ], now=self.now)
+        self.assertEqual(accepted, 0)
+        self.assertEqual([(item['index'], list(item['errors'])) for item in rejected], [(0, ['vin']), (1, ['mileage']), (2, ['timestamp'])])
+
+    def test_one_queued_flush_and_a_successor_while_one_runs(self):
+        self.ingest(1100)
+        self.ingest(1200)
+        self.assertEqual(Job.objects.filter(status=Job.QUEUED).count(), 1)
+        Job.objects.update(run_after=timezone.now())
+        jobs.claim('worker')
+        self.ingest(1300)  # The running flush may already have read the staged rows
+        self.assertEqual(Job.objects.filter(status=Job.QUEUED).count(), 1)
+        self.assertEqual(Job.objects.filter(status=Job.RUNNING).count(), 1)
+
+    def test_flush_is_scheduled_after_commit_without_locking_the_queued_job(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            odometer.ingest(self.owner, [{'vin': _vin(1), 'mileage': 1100, 'timestamp': self.now.isoformat()}], now=self.now)
+            self.assertFalse(Job.objects.exists())  # Nothing for the ingest transaction to lock
+        callbacks[0]()
+        self.assertEqual(Job.objects.filter(unique_key=odometer.FLUSH_JOB_KEY, status=Job.QUEUED).count(), 1)
+        with mock.patch.object(jobs, 'enqueue') as enqueue:
+            self.ingest(1200)
+        enqueue.assert_not_called()
@@ -0,0 +1,106 @@
+# AutoLogX/autologx/api/thumbnails.py
+"""
+Thumbnails and previews for photo and PDF attachments.
+Uploads queue a render_attachment_derivatives job (tasks.py), so render() runs in
+a `manage.py run_workers` process rather than the request, and writes each variant
+next to the original as <name>.<variant>.<ext>; content-addressed originals
+therefore share derivatives too.
+Variants are served by views.attachment_derivative with long-lived cache headers,
+and queued for a worker on a miss (e.g. attachments uploaded before this existed).
+render() needs no Django setup, so benchmark pools can import this module alone.
+"""
+import hashlib
+import os
+import uuid
+from PIL import Image, ImageOps
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # Optional: without it PDFs get no preview
+    pdfium = None
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.tif', '.tiff'}
+PDF_EXTENSIONS = {'.pdf'}
+CONTENT_TYPES = {'WEBP': ('image/webp', 'webp'), 'JPEG': ('image/jpeg', 'jpg')}
+
+def derivative_config():
+    from django.conf import settings
+    config = getattr(settings, 'ATTACHMENT_DERIVATIVES', {})
+    return {
+        'sizes': config.get('SIZES', {'thumb': 320, 'preview': 1280}),
+        'format': config.get('FORMAT', 'WEBP').upper(),
+        'quality': config.get('QUALITY', 80),
+    }
+
+def can_render(name):
+    ext = os.path.splitext(name or '')[1].lower()
+    return ext in IMAGE_EXTENSIONS or (ext in PDF_EXTENSIONS and pdfium is not None)
+
+def derivative_name(name, variant, fmt=None):
+    return f"{name}.{variant}.{CONTENT_TYPES[fmt or derivative_config()['format']][1]}"
+
+def derivative_prefix(name):
+    """Every derivative of name starts with this (used by blob GC)"""
+    return name + '.'
+
+def version(name):
+    """Short token that changes when the attachment's file does, for cache-busting URLs"""
+    return hashlib.sha1(name.encode('utf-8')).hexdigest()[:12]
+
+# --- Rendering (no Django needed) ---
+
+def _open(source_path, max_px):
+    if os.path.splitext(source_path)[1].lower() in PDF_EXTENSIONS:
+        pdf = pdfium.PdfDocument(source_path)
+        try:
+            page = pdf[0]
+            width, height = page.get_size()
+            # Render the first page straight at the largest size needed, not at full resolution
+            image = page.render(scale=max_px / max(width, height, 1)).to_pil()
+        finally:
+            pdf.close()
+        return image
+    image = Image.open(source_path)
+    # JPEG: let libjpeg decode at 1/2, 1/4 or 1/8 scale; most of the speedup on phone photos
+    image.draft('RGB', (max_px, max_px))
+    return ImageOps.exif_transpose(image)
+
+def render(source_path, targets, fmt='WEBP', quality=80):
+    """
+    Write downscaled copies of source_path; targets is [(dest_path, max edge px)]
+    Each size is reduced from the previous (larger) one. Returns the paths written.
+    """
+    targets = sorted(targets, key=lambda t: -t[1])
+    image = _open(source_path, targets[0][1])
+    if fmt == 'JPEG' and image.mode in ('RGBA', 'LA', 'PA', 'P'):
+        # No alpha in JPEG: flatten onto white
+        rgba = image.convert('RGBA')
+        image = Image.new('RGB', rgba.size, 'white')
+        image.paste(rgba, mask=rgba.getchannel('A'))
+    elif image.mode not in ('RGB', 'RGBA'):
+        transparent = image.mode in ('LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if transparent else 'RGB')
+    written = []
+    for dest_path, max_px in targets:
+        image.thumbnail((max_px, max_px), Image.Resampling.LANCZOS, reducing_gap=2.0)
+        tmp = f"{dest_path}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        image.save(tmp, fmt, quality=quality, **({'method': 4} if fmt == 'WEBP' else {'optimize': True}))
+        os.replace(tmp, dest_path)
+        written.append(dest_path)
+    return written
+
+# --- Storage names to render() arguments ---
+
+def render_args(name, storage=None, variants=None):
+    """Arguments for render() producing the variants (default: all) of the stored file name"""
+    from django.core.files.storage import default_storage
+    storage = storage or default_storage
+    config = derivative_config()
+    sizes = config['sizes'] if variants is None else {v: config['sizes'][v] for v in variants}
+    targets = [(storage.path(derivative_name(name, variant, config['format'])), px) for variant, px in sizes.items()]
+    return storage.path(name), targets, config['format'], config['quality']
+
+def generate(name, storage=None, variants=None):
+    """Render variants of name in this process; returns the paths written"""
+    return render(*render_args(name, storage, variants))
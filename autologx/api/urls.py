@@ -1,7 +1,15 @@
 # C:\Users\MY-PC\Desktop\unit 4\Autologx\autologx\api\urls.py
-from django.urls import path
+from django.urls import path, include
 from django.contrib.auth import views as auth_views
-from . import views
+from rest_framework.routers import DefaultRouter
+from . import views, viewsets
+
+# REST API (JWT or session auth), see viewsets.py
+router = DefaultRouter()
+router.register('vehicles', viewsets.VehicleViewSet, basename='api-vehicle')
+router.register('service-records', viewsets.ServiceRecordViewSet, basename='api-service-record')
+router.register('attachments', viewsets.AttachmentViewSet, basename='api-attachment')
+router.register('odometer', viewsets.OdometerViewSet, basename='api-odometer')
 
 # Optional: Define an app_name for namespacing (good practice if you have multiple apps)
 # app_name = 'api'
@@ -17,6 +25,9 @@ urlpatterns = [
 
     # Vehicle Management
     path('vehicles/', views.vehicle_list, name='vehicle_list'),
+    path('vehicles/page/', views.vehicle_list_page, name='vehicle_list_page'),
+    path('vehicles/forecast/', views.maintenance_forecast, name='maintenance_forecast'),
+    path('vehicles/analytics/', views.fleet_analytics, name='fleet_analytics'),
     path('vehicles/create/', views.vehicle_create, name='vehicle_create'),
     path('vehicles/<int:pk>/', views.vehicle_detail, name='vehicle_detail'),
     path('vehicles/<int:pk>/edit/', views.vehicle_edit, name='vehicle_edit'),
@@ -24,7 +35,17 @@ urlpatterns = [
 
     # Service Record Management (nested under vehicles)
     path('vehicles/<int:vehicle_pk>/service-records/create/', views.service_record_create, name='service_record_create'),
+    path('vehicles/<int:pk>/service-records/', views.service_record_page, name='service_record_page'),
+    path('service-records/search/', views.service_record_search, name='service_record_search'),
+    path('service-records/export/', views.service_record_export, name='service_record_export'),
+    path('attachments/<int:pk>/download/', views.attachment_download, name='attachment_download'),
+    path('attachments/<int:pk>/<slug:variant>/', views.attachment_derivative, name='attachment_derivative'),
 
     # API Endpoints (AJAX)
     path('api/vin-lookup/', views.vin_lookup, name='vin_lookup'),
+    path('api/vin-lookup/async/', views.vin_lookup_async, name='vin_lookup_async'),
+    path('api/v1/', include(router.urls)),
+
+    # Monitoring
+    path('metrics', views.metrics, name='metrics'),
 ]
@@ -1,16 +1,30 @@
 # AutoLogX/autologx/api/views.py
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotFound, JsonResponse, StreamingHttpResponse, Http404
+from django.core.files.storage import default_storage
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from django.views.decorators.http import require_http_methods
 import json
 import logging
+import os
+from datetime import date
 from .models import Vehicle, ServiceRecord, Attachment # Ensure Attachment is imported
 from .forms import VehicleForm, ServiceRecordForm
-from .services import decode_vin
+from .pagination import keyset_page
+from .forecasting import forecast
+from .exports import EXPORT_CONTENT_TYPES, export_queryset, stream_export
+from .downloads import serve_file
+from .query_cache import query_cache
+from . import deletion, jobs, metrics as request_metrics, rollups, search, tasks, thumbnails
+from .services import decode_vin, adecode_vin
+from .vin_index import validate_vin
 
 # Configure logger for this module
 logger = logging.getLogger(__name__)
@@ -30,20 +44,95 @@ def signup(request):
         form = UserCreationForm()
     return render(request, 'registration/signup.html', {'form': form})
 
+# Keyset pagination: orderings end in 'id' so the cursor is unique,
+# and only the columns the templates display are fetched.
+VEHICLE_PAGE_SIZE = 24
+VEHICLE_ORDERING = ['created_at', 'id']
+VEHICLE_LIST_FIELDS = ('id', 'year', 'make', 'model', 'vin', 'current_mileage', 'created_at')
+SERVICE_RECORD_PAGE_SIZE = 25
+SERVICE_RECORD_ORDERING = ['-date', '-id']
+SERVICE_RECORD_LIST_FIELDS = ('id', 'vehicle_id', 'service_type', 'date', 'mileage', 'description', 'cost')
+# Attachment thumbnails shown under each service record in the HTML history
+SERVICE_RECORD_ATTACHMENTS = Prefetch('attachments', queryset=Attachment.objects.only('id', 'title', 'file', 'service_record_id'))
+
+def _wants_json(request):
+    return request.GET.get('format') == 'json' or 'application/json' in request.headers.get('Accept', '')
+
+# Read paths go through query_cache: lists are cached per user ('u<id>' scope), a vehicle's
+# page per vehicle ('v<id>'), and both are invalidated by the model signals (signals.py)
+
+def _vehicle_page(request):
+    cursor = request.GET.get('cursor')
+    def compute():
+        vehicles = Vehicle.objects.filter(user=request.user).only(*VEHICLE_LIST_FIELDS)
+        return keyset_page(vehicles, VEHICLE_ORDERING, cursor, VEHICLE_PAGE_SIZE)
+    return query_cache.get_or_compute('vehicle_page', [f"u{request.user.pk}"], cursor, compute)
+
+def _service_record_page(request, vehicle):
+    service_records = ServiceRecord.objects.filter(vehicle=vehicle).only(*SERVICE_RECORD_LIST_FIELDS)
+    return keyset_page(service_records, SERVICE_RECORD_ORDERING, request.GET.get('cursor'), SERVICE_RECORD_PAGE_SIZE)
+
+def _vehicle_history(request, pk, name, vehicles):
+    """
+    (vehicle, page of its service records with attachments, next cursor) for one of the user's
+    vehicles; raises Http404 for anyone else's
+    """
+    def compute():
+        vehicle = vehicles.filter(pk=pk, user=request.user).first()
+        if vehicle is None: return None
+        service_records, next_cursor = _service_record_page(request, vehicle)
+        prefetch_related_objects(service_records, SERVICE_RECORD_ATTACHMENTS)
+        return vehicle, service_records, next_cursor
+    history = query_cache.get_or_compute(name, [f"v{pk}"], (request.user.pk, request.GET.get('cursor')), compute)
+    if history is None: raise Http404("No Vehicle matches the given query.")
+    return history
+
 @login_required
 def vehicle_list(request):
-    vehicles = Vehicle.objects.filter(user=request.user)
-    return render(request, 'vehicles/list.html', {'vehicles': vehicles})
+    vehicles, next_cursor = _vehicle_page(request)
+    return render(request, 'vehicles/list.html', {'vehicles': vehicles, 'next_cursor': next_cursor})
+
+@login_required
+def vehicle_list_page(request):
+    """'Load more' endpoint for vehicle_list: partial HTML, or JSON with ?format=json."""
+    vehicles, next_cursor = _vehicle_page(request)
+    if _wants_json(request):
+        return JsonResponse({
+            'results': [{
+                'id': v.id, 'year': v.year, 'make': v.make, 'model': v.model, 'vin': v.vin,
+                'current_mileage': v.current_mileage, 'url': reverse('vehicle_detail', args=[v.pk]),
+            } for v in vehicles],
+            'next_cursor': next_cursor,
+        })
+    response = render(request, 'vehicles/_vehicle_cards.html', {'vehicles': vehicles})
+    if next_cursor: response['X-Next-Cursor'] = next_cursor
+    return response
 
 @login_required
 def vehicle_detail(request, pk):
-    vehicle = get_object_or_404(Vehicle, pk=pk, user=request.user)
-    service_records = ServiceRecord.objects.filter(vehicle=vehicle).order_by('-date')
+    vehicle, service_records, next_cursor = _vehicle_history(request, pk, 'vehicle_detail', Vehicle.objects.select_related('summary'))
     return render(request, 'vehicles/detail.html', {
         'vehicle': vehicle,
-        'service_records': service_records
+        'service_records': service_records,
+        'next_cursor': next_cursor,
     })
 
+@login_required
+def service_record_page(request, pk):
+    """'Load more' endpoint for a vehicle's service history: partial HTML, or JSON with ?format=json."""
+    _, service_records, next_cursor = _vehicle_history(request, pk, 'service_record_page', Vehicle.objects.only('id'))
+    if _wants_json(request):
+        return JsonResponse({
+            'results': [{
+                'id': r.id, 'service_type': r.service_type, 'service_type_display': r.get_service_type_display(),
+                'date': r.date.isoformat(), 'mileage': r.mileage, 'description': r.description, 'cost': str(r.cost),
+            } for r in service_records],
+            'next_cursor': next_cursor,
+        })
+    response = render(request, 'vehicles/_service_records.html', {'service_records': service_records})
+    if next_cursor: response['X-Next-Cursor'] = next_cursor
+    return response
+
 @login_required
 @require_http_methods(["GET", "POST"])
 def vehicle_create(request):
@@ -85,7 +174,7 @@ def vehicle_edit(request, pk):
 def vehicle_delete(request, pk):
     vehicle = get_object_or_404(Vehicle, pk=pk, user=request.user)
     if request.method == 'POST':
-        vehicle.delete()
+        deletion.delete_vehicles(Vehicle.objects.filter(pk=vehicle.pk))  # Set-based; files are swept by a task
         messages.success(request, 'Vehicle deleted successfully!')
         return redirect('vehicle_list')
     return render(request, 'vehicles/confirm_delete.html', {'vehicle': vehicle})
@@ -97,24 +186,26 @@ def service_record_create(request, vehicle_pk):
         # Important: Include request.FILES to handle uploaded files
         form = ServiceRecordForm(request.POST, request.FILES)
         if form.is_valid():
-            service_record = form.save(commit=False)
-            service_record.vehicle = vehicle
-            service_record.save()
-
-            # --- Handle file attachments ---
-            # Get the list of uploaded files from request.FILES
-            uploaded_files = request.FILES.getlist('attachments')
-            for uploaded_file in uploaded_files:
-                # Create an Attachment instance for each file
-                # We'll use a generic title and type for simplicity.
-                # You can enhance this later to allow users to specify title/type per file.
-                Attachment.objects.create(
-                    service_record=service_record,
-                    title=uploaded_file.name[:199], # Truncate filename to fit max_length
-                    attachment_type='other', # Default type
-                    file=uploaded_file
-                )
-            # --- End Handle file attachments ---
+            # One transaction for the record, its vehicle summary update and its attachments
+            with transaction.atomic():
+                service_record = form.save(commit=False)
+                service_record.vehicle = vehicle
+                service_record.save()
+
+                # --- Handle file attachments ---
+                # Get the list of uploaded files from request.FILES
+                uploaded_files = request.FILES.getlist('attachments')
+                for uploaded_file in uploaded_files:
+                    # Create an Attachment instance for each file
+                    # We'll use a generic title and type for simplicity.
+                    # You can enhance this later to allow users to specify title/type per file.
+                    Attachment.objects.create(
+                        service_record=service_record,
+                        title=uploaded_file.name[:199], # Truncate filename to fit max_length
+                        attachment_type='other', # Default type
+                        file=uploaded_file
+                    )
+                # --- End Handle file attachments ---
 
             messages.success(request, 'Service record added successfully!')
             return redirect('vehicle_detail', pk=vehicle.pk)
@@ -126,30 +217,171 @@ def service_record_create(request, vehicle_pk):
         'vehicle': vehicle
     })
 
+@login_required
+def maintenance_forecast(request):
+    """Services coming due across the user's vehicles (HTML, or JSON with ?format=json)."""
+    try:
+        horizon_days = max(0, min(int(request.GET.get('days', 30)), 3650))
+    except ValueError:
+        horizon_days = 30
+    vehicles = Vehicle.objects.filter(user=request.user)
+    due = forecast(vehicles, horizon_days=horizon_days)
+    if _wants_json(request):
+        return JsonResponse({'horizon_days': horizon_days, 'results': due})
+    names = {v.pk: str(v) for v in vehicles.only('id', 'year', 'make', 'model').filter(pk__in={d['vehicle_id'] for d in due})}
+    for item in due: item['vehicle_name'] = names.get(item['vehicle_id'], '')
+    return render(request, 'vehicles/forecast.html', {'due': due, 'horizon_days': horizon_days})
+
+@login_required
+def fleet_analytics(request):
+    """Spend by month and service type, cost per mile and top shops, from the monthly rollups (HTML, or JSON with ?format=json)."""
+    try:
+        months = max(1, min(int(request.GET.get('months', 12)), 120))
+    except ValueError:
+        months = 12
+    analytics = rollups.fleet_analytics(request.user, months=months)
+    if _wants_json(request):
+        return JsonResponse(analytics)
+    type_labels = dict(ServiceRecord.SERVICE_TYPES)
+    for item in analytics['months']:
+        item['by_type_display'] = [(type_labels[key], item['by_type'][key]) for key in type_labels if key in item['by_type']]
+    return render(request, 'vehicles/analytics.html', {'analytics': analytics, 'months': months})
+
+@login_required
+def service_record_export(request):
+    """
+    Stream service history as CSV (default) or JSONL (?format=jsonl)
+    Filters: vehicle, service_type, date_from, date_to. Staff may add ?all=1 for every user's records.
+    """
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in EXPORT_CONTENT_TYPES:
+        return JsonResponse({'error': f"Unsupported format '{fmt}'"}, status=400)
+    records = ServiceRecord.objects.all()
+    if not (request.user.is_staff and request.GET.get('all') == '1'):
+        # A subquery rather than a join on the owner: the join makes the planner drive from
+        # the user's vehicles and sort every record before the first row streams
+        records = records.filter(vehicle__in=Vehicle.objects.filter(user=request.user).values('pk'))
+    try:
+        rows = export_queryset(records, request.GET)
+    except ValidationError as e:
+        return JsonResponse({'error': e.messages[0]}, status=400)
+    response = StreamingHttpResponse(stream_export(rows, fmt), content_type=EXPORT_CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="service-history-{date.today().isoformat()}.{fmt}"'
+    return response
+
+SEARCH_PAGE_SIZE = 20
+
+def _search_results(request):
+    """(query, page, results, has_next) for ?q=&page=&vehicle= over the user's service records"""
+    query = request.GET.get('q', '').strip()[:200]
+    try:
+        page = max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        page = 1
+    vehicle = request.GET.get('vehicle', '')
+    results, has_next = search.search(query, user=request.user, vehicle_id=int(vehicle) if vehicle.isdigit() else None,
+                                      page=page, page_size=SEARCH_PAGE_SIZE)
+    return query, page, results, has_next
+
+@login_required
+def service_record_search(request):
+    """Ranked full-text search of the user's service history (HTML, or JSON with ?format=json)."""
+    query, page, results, has_next = _search_results(request)
+    if _wants_json(request):
+        return JsonResponse({
+            'query': query, 'page': page, 'next_page': page + 1 if has_next else None,
+            'results': [{
+                'id': r['record'].id, 'vehicle_id': r['record'].vehicle_id, 'vehicle': str(r['record'].vehicle),
+                'service_type': r['record'].service_type, 'date': r['record'].date.isoformat(),
+                'description': r['record'].description, 'score': r['score'], 'highlights': r['highlights'],
+                'url': reverse('vehicle_detail', args=[r['record'].vehicle_id]),
+            } for r in results],
+        })
+    return render(request, 'service_records/search.html', {
+        'query': query, 'page': page, 'results': results, 'has_next': has_next,
+    })
+
+@login_required
+def attachment_derivative(request, pk, variant):
+    """
+    Thumbnail/preview of one of the user's attachments
+    Cacheable for a year when ?v= matches the current file (Attachment.derivative_url builds it).
+    A variant not rendered yet is queued for a worker (one job per attachment and variant)
+    and answered with an uncached 404 meanwhile.
+    """
+    attachment = get_object_or_404(Attachment.objects.only('id', 'file'), pk=pk, service_record__vehicle__user=request.user)
+    name = attachment.file.name
+    config = thumbnails.derivative_config()
+    if variant not in config['sizes'] or not thumbnails.can_render(name):
+        raise Http404("No such preview")
+    derivative = thumbnails.derivative_name(name, variant, config['format'])
+    path = default_storage.path(derivative)
+    if not os.path.exists(path):
+        jobs.enqueue(tasks.render_attachment_derivatives, name=name, variants=[variant],
+                     unique_key=f"attachment-derivative:{attachment.pk}:{variant}")
+        response = HttpResponseNotFound("Preview not rendered yet")
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+    immutable = request.GET.get('v') == thumbnails.version(name)
+    return serve_file(request, path, derivative, content_type=thumbnails.CONTENT_TYPES[config['format']][0],
+                      cache_control='private, max-age=31536000, immutable' if immutable else 'private, no-cache')
+
+@login_required
+def attachment_download(request, pk):
+    """
+    One of the user's attachment files: inline (PDF, images, video) or with ?download=1 as a download
+    Supports Range (resumable, seekable) and conditional requests; see downloads.serve_file.
+    """
+    attachment = get_object_or_404(Attachment.objects.only('id', 'file', 'title'), pk=pk, service_record__vehicle__user=request.user)
+    name = attachment.file.name
+    ext = os.path.splitext(name)[1]
+    title = attachment.title or os.path.basename(name)
+    filename = title if title.lower().endswith(ext.lower()) else title + ext
+    try:
+        return serve_file(request, default_storage.path(name), name, filename=filename,
+                          as_attachment=request.GET.get('download') == '1')
+    except FileNotFoundError:
+        logger.error(f"Attachment {pk} file is missing: {name}")
+        raise Http404("File not found")
+
+def _read_vin(request):
+    """
+    Pull the VIN out of a lookup request (JSON or form data) and validate it locally
+    Returns (vin, error_response); error_response is None if the VIN may be decoded
+    """
+    # Determine how data is sent (JSON or form)
+    if request.content_type == 'application/json':
+        data = json.loads(request.body.decode('utf-8'))
+        vin = data.get('vin', '').strip().upper()
+    else: # Assume form data
+        vin = request.POST.get('vin', '').strip().upper()
+    if not vin:
+        logger.warning("VIN lookup attempted with empty VIN.")
+        return vin, JsonResponse({'success': False, 'error': 'VIN is required'})
+    if len(vin) != 17:
+        logger.info(f"VIN lookup attempted with invalid length VIN: {vin}")
+        return vin, JsonResponse({'success': False, 'error': 'VIN must be 17 characters long'})
+    # Reject typos locally instead of spending an NHTSA round-trip on them
+    vin_error = validate_vin(vin)
+    if vin_error:
+        logger.info(f"VIN lookup rejected invalid VIN {vin}: {vin_error}")
+        return vin, JsonResponse({'success': False, 'error': vin_error})
+    return vin, None
+
+def _vin_lookup_response(vin, vehicle_data):
+    if vehicle_data:
+        logger.info(f"VIN lookup successful for {vin}")
+        return JsonResponse({'success': True, 'data': vehicle_data})
+    logger.info(f"VIN lookup failed for {vin} - API returned no data or error.")
+    return JsonResponse({'success': False, 'error': 'Could not decode VIN. Please check the VIN and try again.'})
+
 @login_required
 def vin_lookup(request):
     if request.method == 'POST':
         try:
-            # Determine how data is sent (JSON or form)
-            if request.content_type == 'application/json':
-                data = json.loads(request.body.decode('utf-8'))
-                vin = data.get('vin', '').strip().upper()
-            else: # Assume form data
-                vin = request.POST.get('vin', '').strip().upper()
-            if not vin:
-                logger.warning("VIN lookup attempted with empty VIN.")
-                return JsonResponse({'success': False, 'error': 'VIN is required'})
-            if len(vin) != 17:
-                logger.info(f"VIN lookup attempted with invalid length VIN: {vin}")
-                return JsonResponse({'success': False, 'error': 'VIN must be 17 characters long'})
-            vehicle_data = decode_vin(vin)
-            # --- FIXED SYNTAX ERROR HERE ---
-            if vehicle_data: # <-- Corrected condition
-                logger.info(f"VIN lookup successful for {vin}")
-                return JsonResponse({'success': True, 'data': vehicle_data})
-            else:
-                logger.info(f"VIN lookup failed for {vin} - API returned no data or error.")
-                return JsonResponse({'success': False, 'error': 'Could not decode VIN. Please check the VIN and try again.'})
+            vin, error_response = _read_vin(request)
+            if error_response: return error_response
+            return _vin_lookup_response(vin, decode_vin(vin))
         except json.JSONDecodeError as e:
             logger.error(f"VIN lookup failed due to invalid JSON: {e}")
             return JsonResponse({'success': False, 'error': 'Invalid JSON data received.'})
@@ -160,4 +392,29 @@ def vin_lookup(request):
             return JsonResponse({'success': False, 'error': f'An internal error occurred: {str(e)}'})
     return JsonResponse({'success': False, 'error': 'Invalid request method'})
 
+@login_required
+async def vin_lookup_async(request):
+    """
+    Async vin_lookup: under ASGI a slow NHTSA response no longer holds a worker thread,
+    and concurrent lookups of the same VIN share one upstream call (see adecode_vin).
+    """
+    if request.method == 'POST':
+        try:
+            vin, error_response = _read_vin(request)
+            if error_response: return error_response
+            return _vin_lookup_response(vin, await adecode_vin(vin))
+        except json.JSONDecodeError as e:
+            logger.error(f"VIN lookup failed due to invalid JSON: {e}")
+            return JsonResponse({'success': False, 'error': 'Invalid JSON data received.'})
+        except Exception as e:
+            import traceback
+            logger.error(f"VIN lookup failed with unexpected error: {e}\n{traceback.format_exc()}")
+            return JsonResponse({'success': False, 'error': f'An internal error occurred: {str(e)}'})
+    return JsonResponse({'success': False, 'error': 'Invalid request method'})
+
+def metrics(request):
+    """Prometheus text exposition of this process's request metrics (see metrics.py)"""
+    if not request_metrics.scrape_allowed(request): return HttpResponseForbidden()
+    return HttpResponse(request_metrics.render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # Ensure there's a newline at the end of the file
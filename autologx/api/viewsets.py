@@ -0,0 +1,254 @@
+# AutoLogX/autologx/api/viewsets.py
+"""
+REST API (api/v1/) for vehicles, service records and attachments.
+Authenticates with JWT (api/token/) or the browser session, and only ever sees
+the requesting user's rows. Lists are keyset-paginated, accept ?fields= for
+sparse fieldsets (which also narrows the SELECT), and GETs carry an ETag so
+clients can revalidate with If-None-Match. POST/PATCH on <resource>/bulk/ take
+JSON arrays and write them with one bulk_create/bulk_update; service-records/import/
+streams a CSV/JSONL upload through importers.ServiceRecordImporter, and
+service-records/search/?q= ranks records through the full-text index (search.py).
+Vehicles are deleted set-wise (deletion.py), one at a time or through
+vehicles/bulk-delete/ with {"ids": [...]}. Telematics units POST odometer readings
+to odometer/, staged and applied in the background (odometer.py).
+"""
+import logging
+from django.db import IntegrityError, transaction
+from django.db.models import F, prefetch_related_objects
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, set_response_etag
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
+from rest_framework.response import Response
+from .importers import ServiceRecordImporter, iter_rows, detect_format, text_stream
+from . import deletion, odometer, search
+from .models import Vehicle, ServiceRecord, Attachment
+from .pagination import KeysetPagination
+from .serializers import VehicleSerializer, ServiceRecordSerializer, AttachmentSerializer, ATTACHMENT_IDS
+
+logger = logging.getLogger(__name__)
+
+BULK_MAX_ITEMS = 1000
+SEARCH_PAGE_SIZE = 20
+
+class ETagMixin:
+    """Strong ETag from the rendered body on successful GETs; a matching If-None-Match gets a 304"""
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if request.method in ('GET', 'HEAD') and response.status_code == 200:
+            response.render()
+            set_response_etag(response)
+            response['Cache-Control'] = 'private, no-cache'
+            return get_conditional_response(request, etag=response['ETag'], response=response)
+        return response
+
+class OwnedModelViewSet(ETagMixin, viewsets.ModelViewSet):
+    pagination_class = KeysetPagination
+    parser_classes = [JSONParser]
+    ordering = ['-id']
+
+    # Writes commit together with the summaries, rollups and cache invalidation their signals apply
+    @transaction.atomic
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
+
+    @transaction.atomic
+    def destroy(self, request, *args, **kwargs):
+        return super().destroy(request, *args, **kwargs)
+
+    def requested_fields(self):
+        """Field names from ?fields= (GET only), or None for all fields"""
+        wanted = self.request.query_params.get('fields') if self.request.method == 'GET' else None
+        if not wanted: return None
+        return {name.strip() for name in wanted.split(',') if name.strip()}
+
+    def narrow(self, queryset, wanted):
+        """Defer columns the response will not include"""
+        model = queryset.model
+        columns = {f.name for f in model._meta.concrete_fields}
+        keep = {f.lstrip('-') for f in self.ordering} | {'id'} | (wanted & columns)
+        return queryset.only(*keep)
+
+    def get_queryset(self):
+        queryset = self.owned_queryset()
+        wanted = self.requested_fields()
+        return self.narrow(queryset, wanted) if wanted is not None else queryset
+
+class BulkWriteMixin:
+    @action(detail=False, methods=['post', 'patch'], url_path='bulk')
+    def bulk(self, request):
+        """POST: create every object in the array; PATCH: update each {"id": ..., field: value} item"""
+        data = request.data
+        if not isinstance(data, list):
+            raise ValidationError({'non_field_errors': ["Expected a list of items."]})
+        if len(data) > BULK_MAX_ITEMS:
+            raise ValidationError({'non_field_errors': [f"At most {BULK_MAX_ITEMS} items per request."]})
+        try:
+            with transaction.atomic():
+                if request.method == 'POST':
+                    serializer = self.get_serializer(data=data, many=True)
+                    response_status = status.HTTP_201_CREATED
+                else:
+                    # Locked, so the old values the summaries are adjusted by are current
+                    ids = [str(item.get('id')) for item in data if isinstance(item, dict)]
+                    instances = list(self.get_queryset().select_for_update(of=('self',))
+                                     .filter(pk__in=[int(i) for i in ids if i.isdigit()]).order_by('pk'))
+                    serializer = self.get_serializer(instances, data=data, many=True, partial=True)
+                    response_status = status.HTTP_200_OK
+                serializer.is_valid(raise_exception=True)
+                self.perform_bulk_save(serializer)
+        except IntegrityError as e:
+            logger.warning(f"Bulk {request.method} on {self.basename} rejected: {e}")
+            raise ValidationError({'non_field_errors': ["Items conflict with existing data (e.g. duplicate VIN)."]})
+        return Response(serializer.data, status=response_status)
+
+    def perform_bulk_save(self, serializer):
+        serializer.save()
+
+class VehicleViewSet(BulkWriteMixin, OwnedModelViewSet):
+    serializer_class = VehicleSerializer
+    ordering = ['created_at', 'id']
+
+    def owned_queryset(self):
+        return Vehicle.objects.filter(user=self.request.user)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        wanted = self.requested_fields()
+        if wanted is None or 'summary' in wanted: queryset = queryset.select_related('summary')
+        return queryset
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    def perform_bulk_save(self, serializer):
+        if serializer.instance is None: serializer.save(user=self.request.user)
+        else: serializer.save()
+
+    def perform_destroy(self, instance):
+        deletion.delete_vehicles(Vehicle.objects.filter(pk=instance.pk))
+
+    @action(detail=False, methods=['post'], url_path='bulk-delete')
+    def bulk_delete(self, request):
+        """{"ids": [...]}: delete those of the user's vehicles, with their records and attachments"""
+        ids = request.data.get('ids') if isinstance(request.data, dict) else None
+        if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            raise ValidationError({'ids': ["Expected a list of vehicle ids."]})
+        if len(ids) > BULK_MAX_ITEMS:
+            raise ValidationError({'ids': [f"At most {BULK_MAX_ITEMS} ids per request."]})
+        total, counts = deletion.delete_vehicles(self.owned_queryset().filter(pk__in=ids))
+        return Response({'deleted': total, 'counts': counts})
+
+class ServiceRecordViewSet(BulkWriteMixin, OwnedModelViewSet):
+    """Filter with ?vehicle=<id> to page through one vehicle's history (served by its index)"""
+    serializer_class = ServiceRecordSerializer
+    ordering = ['-date', '-id']
+
+    def owned_queryset(self):
+        queryset = ServiceRecord.objects.filter(vehicle__user=self.request.user)
+        vehicle = self.request.query_params.get('vehicle')
+        if vehicle is not None:
+            if not vehicle.isdigit(): raise ValidationError({'vehicle': ["Must be a vehicle id."]})
+            queryset = queryset.filter(vehicle_id=int(vehicle))
+        return queryset
+
+    def narrow(self, queryset, wanted):
+        return super().narrow(queryset, wanted | {'vehicle'})
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        wanted = self.requested_fields()
+        if wanted is None or 'attachments' in wanted:
+            queryset = queryset.prefetch_related(ATTACHMENT_IDS)
+        return queryset
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_file(self, request):
+        """
+        Multipart 'file' (CSV or JSONL, see import_service_records) into the user's vehicles, matched by VIN
+        A file unreadable from some line on (not UTF-8, malformed CSV) is imported up to that line,
+        reported as stopped_at_line and as an error there.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': ["No file was uploaded."]})
+        fmt = request.data.get('format') or detect_format(upload.name)
+        if fmt not in ('csv', 'jsonl'):
+            raise ValidationError({'format': ["Must be 'csv' or 'jsonl'."]})
+        importer = ServiceRecordImporter(user=request.user, dry_run=request.data.get('dry_run') in ('1', 'true'))
+        result = importer.run(iter_rows(text_stream(upload.file), fmt))
+        return Response(result.as_dict(), status=status.HTTP_201_CREATED if result.created and not importer.dry_run else status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='search')
+    def search(self, request):
+        """?q= ranked full-text matches (page with ?page=, narrow with ?vehicle=), each with highlighted fields"""
+        query = request.query_params.get('q', '').strip()[:200]
+        if not search.parse_terms(query): raise ValidationError({'q': ["Enter at least one word to search for."]})
+        page = request.query_params.get('page', '1')
+        vehicle = request.query_params.get('vehicle')
+        if not page.isdigit() or int(page) < 1: raise ValidationError({'page': ["Must be a positive integer."]})
+        if vehicle is not None and not vehicle.isdigit(): raise ValidationError({'vehicle': ["Must be a vehicle id."]})
+        results, has_next = search.search(query, user=request.user, vehicle_id=int(vehicle) if vehicle else None,
+                                          page=int(page), page_size=SEARCH_PAGE_SIZE)
+        records = [r['record'] for r in results]
+        prefetch_related_objects(records, ATTACHMENT_IDS)
+        data = self.get_serializer(records, many=True).data
+        for item, result in zip(data, results):
+            item['score'], item['highlights'] = result['score'], result['highlights']
+        return Response({'next_page': int(page) + 1 if has_next else None, 'results': data})
+
+class AttachmentViewSet(OwnedModelViewSet):
+    """Uploads are multipart (one file per request); filter with ?service_record=<id>"""
+    serializer_class = AttachmentSerializer
+    parser_classes = [MultiPartParser, FormParser, JSONParser]
+    ordering = ['-id']
+
+    def owned_queryset(self):
+        queryset = (Attachment.objects.filter(service_record__vehicle__user=self.request.user)
+                    .annotate(vehicle_id=F('service_record__vehicle_id')))
+        service_record = self.request.query_params.get('service_record')
+        if service_record is not None:
+            if not service_record.isdigit(): raise ValidationError({'service_record': ["Must be a service record id."]})
+            queryset = queryset.filter(service_record_id=int(service_record))
+        return queryset
+
+    def narrow(self, queryset, wanted):
+        return super().narrow(queryset, wanted | {'service_record'} | ({'file'} if 'thumbnail' in wanted else set()))
+
+class OdometerViewSet(ETagMixin, viewsets.ViewSet):
+    """
+    POST: a JSON array of {"vin", "mileage", "timestamp"} readings of the user's vehicles
+    (202: staged, applied within ODOMETER_INGEST['FLUSH_INTERVAL']); GET ?vehicle=<id>
+    (&since=<date-time>): the vehicle's downsampled odometer series
+    """
+    parser_classes = [JSONParser]
+
+    def create(self, request):
+        data = request.data
+        limit = odometer.ingest_config()['max_readings']
+        if not isinstance(data, list):
+            raise ValidationError({'non_field_errors': ["Expected a list of readings."]})
+        if len(data) > limit:
+            raise ValidationError({'non_field_errors': [f"At most {limit} readings per request."]})
+        accepted, rejected = odometer.ingest(request.user, data)
+        if rejected and not accepted: return Response({'accepted': 0, 'rejected': rejected}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'accepted': accepted, 'rejected': rejected}, status=status.HTTP_202_ACCEPTED)
+
+    def list(self, request):
+        vehicle = request.query_params.get('vehicle', '')
+        if not vehicle.isdigit(): raise ValidationError({'vehicle': ["Must be a vehicle id."]})
+        since = request.query_params.get('since')
+        if since is not None:
+            since = odometer.parse_timestamp(since)
+            if since is None: raise ValidationError({'since': ["Must be an ISO 8601 date-time."]})
+        vehicle = get_object_or_404(Vehicle, pk=int(vehicle), user=request.user)
+        return Response({'vehicle': vehicle.pk, 'current_mileage': vehicle.current_mileage,
+                         'bucket_seconds': odometer.ingest_config()['bucket_seconds'],
+                         'samples': odometer.series(vehicle, since=since)})
@@ -0,0 +1,188 @@
+# AutoLogX/autologx/api/vin_index.py
+"""
+Offline VIN validation and decoding.
+validate_vin() checks characters and the position 9 check digit; decode_vin_offline()
+answers make, model year and plant (and model details for known VDS patterns) from a
+memory-mapped index file built by `manage.py build_vin_index`.
+
+Index file layout: fixed-width ASCII records of RECORD_SIZE bytes, sorted by key, so
+lookups are a binary search over the mmap without loading the file into memory.
+Each record is the key padded to KEY_SIZE, a JSON object, space padding and '\n'.
+Keys are a one-letter kind followed by the VIN positions they match:
+    W<wmi>                  manufacturer  -> {"make": ...}
+    P<wmi><plant code>      assembly plant -> {"plant": ...}
+    V<wmi><vds><year code>  model pattern -> {"model": ..., "trim": ..., ...}
+"""
+import json
+import logging
+import mmap
+import os
+import threading
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+RECORD_SIZE = 256
+KEY_SIZE = 10
+
+VIN_CHARS = frozenset('ABCDEFGHJKLMNPRSTUVWXYZ0123456789')
+
+_TRANSLITERATION = {
+    'A': 1, 'B': 2, 'C': 3, 'D': 4, 'E': 5, 'F': 6, 'G': 7, 'H': 8,
+    'J': 1, 'K': 2, 'L': 3, 'M': 4, 'N': 5, 'P': 7, 'R': 9,
+    'S': 2, 'T': 3, 'U': 4, 'V': 5, 'W': 6, 'X': 7, 'Y': 8, 'Z': 9,
+}
+_WEIGHTS = (8, 7, 6, 5, 4, 3, 2, 10, 0, 9, 8, 7, 6, 5, 4, 3, 2)
+
+# Position 10 model year codes, in cycle order starting at 1980 (and 2010)
+_YEAR_CODES = 'ABCDEFGHJKLMNPRSTVWXY123456789'
+
+# The check digit is mandatory for North American VINs (WMI regions 1-5);
+# elsewhere position 9 is often manufacturer-defined, so it is not enforced.
+CHECK_DIGIT_REGIONS = frozenset('12345')
+
+def compute_check_digit(vin):
+    """Return the expected position 9 character ('0'-'9' or 'X') for a 17-character VIN."""
+    total = 0
+    for char, weight in zip(vin, _WEIGHTS):
+        total += (int(char) if char.isdigit() else _TRANSLITERATION[char]) * weight
+    remainder = total % 11
+    return 'X' if remainder == 10 else str(remainder)
+
+def random_vin(rng):
+    """A random North American VIN with a valid check digit (test and benchmark data)."""
+    chars = sorted(VIN_CHARS)
+    vin = ['1'] + [rng.choice(chars) for _ in range(16)]
+    vin[8] = '0'
+    vin[8] = compute_check_digit(''.join(vin))
+    return ''.join(vin)
+
+def validate_vin(vin):
+    """
+    Validate a normalized (uppercase) VIN without any network access
+    Returns an error message, or None if the VIN is plausible
+    """
+    if len(vin) != 17:
+        return "VIN must be 17 characters long"
+    illegal = sorted(set(vin) - VIN_CHARS)
+    if illegal:
+        if set(illegal) & set('IOQ'):
+            return "VIN cannot contain the letters I, O or Q"
+        return f"VIN contains invalid characters: {''.join(illegal)}"
+    if vin[0] in CHECK_DIGIT_REGIONS and compute_check_digit(vin) != vin[8]:
+        return "VIN check digit (9th character) does not match; please check the VIN for typos"
+    return None
+
+def decode_model_year(vin):
+    """
+    Decode the model year from position 10
+    Codes repeat every 30 years; for passenger vehicles a letter in position 7
+    marks the 2010+ cycle. Years in the future (beyond next year) fall back a cycle.
+    """
+    code = vin[9]
+    if code not in _YEAR_CODES: return None
+    year = 1980 + _YEAR_CODES.index(code)
+    if vin[6].isalpha(): year += 30
+    if year > date.today().year + 1: year -= 30
+    return year
+
+class VinIndex:
+    """Read-only, memory-mapped WMI/VDS/plant index (see module docstring for the format)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size % RECORD_SIZE:
+            self._file.close()
+            raise ValueError(f"{path}: size {size} is not a multiple of {RECORD_SIZE}")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.count = size // RECORD_SIZE
+
+    def _key_at(self, i):
+        offset = i * RECORD_SIZE
+        return self._mmap[offset:offset + KEY_SIZE]
+
+    def get(self, key):
+        """Binary-search the index for key; returns the record dict or None."""
+        target = key.encode('ascii').ljust(KEY_SIZE)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < target: lo = mid + 1
+            else: hi = mid
+        if lo < self.count and self._key_at(lo) == target:
+            offset = lo * RECORD_SIZE
+            return json.loads(self._mmap[offset + KEY_SIZE:offset + RECORD_SIZE].decode('utf-8'))
+        return None
+
+    def close(self):
+        if self._mmap is not None: self._mmap.close()
+        self._file.close()
+
+def write_index(path, records):
+    """
+    Write an index file from an iterable of (key, dict) pairs
+    Later duplicates of a key replace earlier ones. Written to a temp file and
+    renamed so running processes keep their mapping of the old file.
+    """
+    rows = {}
+    for key, value in records:
+        if not key or len(key) > KEY_SIZE:
+            raise ValueError(f"Invalid index key: {key!r}")
+        payload = json.dumps({k: v for k, v in value.items() if v not in (None, '')}, separators=(',', ':'), ensure_ascii=True)
+        if len(payload) > RECORD_SIZE - KEY_SIZE - 1:
+            raise ValueError(f"Index record for {key} is longer than {RECORD_SIZE - KEY_SIZE - 1} bytes")
+        rows[key.ljust(KEY_SIZE)] = payload
+    tmp_path = f"{path}.tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(tmp_path, 'wb') as f:
+        for key in sorted(rows):
+            f.write((key + rows[key]).ljust(RECORD_SIZE - 1).encode('ascii') + b'\n')
+    os.replace(tmp_path, path)
+    return len(rows)
+
+def wmi_key(vin): return 'W' + vin[:3]
+def plant_key(vin): return 'P' + vin[:3] + vin[10]
+def vds_key(vin): return 'V' + vin[:8] + vin[9]
+
+_index = None
+_index_lock = threading.Lock()
+
+def load_index(path=None, reload=False):
+    """Map the index at path (default settings.VIN_INDEX_PATH) once; returns None if missing."""
+    global _index
+    from django.conf import settings
+    index = _index
+    if index is not None and not reload and (path is None or index.path == str(path)):
+        return index
+    path = path or getattr(settings, 'VIN_INDEX_PATH', None)
+    with _index_lock:
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            index = VinIndex(str(path))
+        except (OSError, ValueError) as e:
+            logger.error(f"VIN index could not be loaded from {path}: {e}")
+            return None
+        # The previous mapping is left to the garbage collector; other threads may still be reading it
+        _index = index
+        logger.info(f"VIN index loaded from {path} ({index.count} records)")
+        return _index
+
+def decode_vin_offline(vin):
+    """
+    Decode what the local index knows about a normalized, valid VIN
+    Returns (vehicle_data, complete); complete means make, model and year are all
+    known, i.e. enough to create a Vehicle without asking NHTSA.
+    """
+    vehicle_data = {}
+    year = decode_model_year(vin)
+    if year: vehicle_data['year'] = year
+    index = load_index()
+    if index is not None:
+        for key in (wmi_key(vin), plant_key(vin), vds_key(vin)):
+            record = index.get(key)
+            if record: vehicle_data.update(record)
+    complete = all(vehicle_data.get(field) for field in ('make', 'model', 'year'))
+    return vehicle_data, complete
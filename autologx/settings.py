@@ -45,6 +45,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'autologx.api.metrics.RequestMetricsMiddleware',  # Early, so it times the middleware below too
+    'autologx.api.db_routing.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -57,7 +59,8 @@ ROOT_URLCONF = 'autologx.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that also times renders for the request metrics
+        'BACKEND': 'autologx.api.metrics.TimedDjangoTemplates',
         # --- Make sure this line includes your project's templates directory ---
         'DIRS': [os.path.join(BASE_DIR, 'templates')], # Should resolve to C:\Users\MY-PC\Desktop\unit 4\autologx\templates
         # ------------------------------------------------------------------------
@@ -79,12 +82,66 @@ WSGI_APPLICATION = 'autologx.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# Configured from the environment:
+#   DATABASE_ENGINE        'sqlite' (default) or 'postgresql'
+#   DATABASE_NAME          SQLite file (default db.sqlite3) or PostgreSQL database name
+#   DATABASE_USER, DATABASE_PASSWORD, DATABASE_HOST, DATABASE_PORT  (PostgreSQL)
+#   DATABASE_REPLICAS      comma-separated read replicas, aliases replica1, replica2...:
+#                          SQLite files, or PostgreSQL host[:port] (same database and credentials)
+#   DATABASE_CONN_MAX_AGE  seconds a connection is reused (default 0: one per request). Keep 0
+#                          when serving through ASGI (asgi.py, the async VIN lookup): connections
+#                          are per thread there and persistent ones leak; under WSGI only, e.g. 60
+#                          saves a connect per request (use a pooler such as PgBouncer with ASGI)
+# AUTOLOGX_PROFILE=production runs SQLite in WAL mode with tuned pragmas. Replica reads
+# are routed by autologx.api.db_routing (see DATABASE_ROUTING below).
+
+AUTOLOGX_PROFILE = os.environ.get('AUTOLOGX_PROFILE', 'development')
+DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'sqlite')
+DATABASE_CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE', 0))
+
+# WAL lets readers run alongside the writer; synchronous=NORMAL is durable in WAL mode
+# except for the last commits on power loss; the rest trade memory for fewer syscalls
+SQLITE_PRODUCTION_PRAGMAS = [
+    'PRAGMA journal_mode=WAL', 'PRAGMA synchronous=NORMAL', 'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-65536', 'PRAGMA mmap_size=268435456', 'PRAGMA wal_autocheckpoint=1000',
+]
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+def database_settings(location=None, replica=False):
+    """A DATABASES entry for the primary, or for a replica at location (SQLite file / host[:port])"""
+    common = {'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE, 'CONN_HEALTH_CHECKS': True}
+    if replica: common['TEST'] = {'MIRROR': 'default'}
+    if DATABASE_ENGINE == 'postgresql':
+        host, _, port = (location or os.environ.get('DATABASE_HOST', 'localhost')).partition(':')
+        return {
+            **common, 'ENGINE': 'django.db.backends.postgresql', 'NAME': os.environ.get('DATABASE_NAME', 'autologx'),
+            'USER': os.environ.get('DATABASE_USER', ''), 'PASSWORD': os.environ.get('DATABASE_PASSWORD', ''),
+            'HOST': host, 'PORT': port or os.environ.get('DATABASE_PORT', ''),
+        }
+    options = {}
+    if AUTOLOGX_PROFILE == 'production':
+        # IMMEDIATE: a writing transaction takes the write lock up front and waits up to
+        # timeout for it, instead of failing with "database is locked" when it first writes
+        options = {'transaction_mode': 'IMMEDIATE', 'timeout': 20, 'init_command': '; '.join(SQLITE_PRODUCTION_PRAGMAS)}
+    if replica:
+        options['init_command'] = '; '.join(filter(None, [options.get('init_command'), 'PRAGMA query_only=ON']))
+    return {**common, 'ENGINE': 'django.db.backends.sqlite3', 'OPTIONS': options,
+            'NAME': location or os.environ.get('DATABASE_NAME', BASE_DIR / 'db.sqlite3')}
+
+DATABASES = {'default': database_settings()}
+for _number, _location in enumerate([r.strip() for r in os.environ.get('DATABASE_REPLICAS', '').split(',') if r.strip()], 1):
+    DATABASES[f'replica{_number}'] = database_settings(_location, replica=True)
+
+DATABASE_ROUTERS = ['autologx.api.db_routing.PrimaryReplicaRouter']
+
+# Reads of these URL names (GET/HEAD only) go to a replica, unless the client wrote within
+# PIN_SECONDS (it is pinned to the primary by a cookie, so it reads its own writes)
+DATABASE_ROUTING = {
+    'REPLICA_VIEWS': [
+        'vehicle_list', 'vehicle_list_page', 'vehicle_detail', 'service_record_page',
+        'service_record_export', 'service_record_search', 'maintenance_forecast', 'fleet_analytics',
+    ],
+    'PIN_SECONDS': 10,  # At least the replication lag
+    'PIN_COOKIE': 'db_primary',
 }
 
 
@@ -126,6 +183,53 @@ STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
 
+# Uploads are stored content-addressed (deduplicated) under MEDIA_ROOT/cas/;
+# see autologx.api.storage. Files saved earlier keep their paths.
+STORAGES = {
+    'default': {'BACKEND': 'autologx.api.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+# Attachment thumbnails/previews (autologx.api.thumbnails): variant -> longest edge in px.
+# Rendered after upload by a background job (see JOB_QUEUE).
+ATTACHMENT_DERIVATIVES = {
+    'SIZES': {'thumb': 320, 'preview': 1280},
+    'FORMAT': 'WEBP',       # or 'JPEG'
+    'QUALITY': 80,
+}
+
+# Attachment downloads (autologx.api.downloads) are authorized by Django and then, with
+# SENDFILE set, transferred by the web server: 'x-accel-redirect' (nginx) or 'x-sendfile'
+# (Apache mod_xsendfile, lighttpd). For nginx, map ACCEL_PREFIX onto MEDIA_ROOT as an
+# internal-only location:
+#     location /protected-media/ { internal; alias /path/to/media/; }
+# Unset, files are streamed by Django (with Range support).
+ATTACHMENT_DOWNLOADS = {
+    'SENDFILE': os.environ.get('ATTACHMENT_SENDFILE'),
+    'ACCEL_PREFIX': '/protected-media/',
+}
+
+# Background jobs (autologx.api.jobs), run by `manage.py run_workers`.
+# EAGER runs them in the enqueuing process after commit instead (no workers needed).
+JOB_QUEUE = {
+    'POLL_INTERVAL': 1.0,   # Seconds an idle worker waits before looking again
+    'LEASE_SECONDS': 600,   # A running job not finished by then is requeued (worker died)
+    'MAX_ATTEMPTS': 5,
+    'RETRY_BACKOFF': 10.0,  # Seconds before the first retry, doubling each attempt
+    'EAGER': False,
+}
+
+
+# Telematics odometer ingest (autologx.api.odometer, POST api/v1/odometer/). Readings are
+# staged and applied by a background flush (see JOB_QUEUE) FLUSH_INTERVAL seconds after
+# the first one arrives, and kept as a series with one sample per vehicle and bucket.
+ODOMETER_INGEST = {
+    'FLUSH_INTERVAL': 30,       # Seconds
+    'FLUSH_BATCH': 20000,       # Staged rows per flush transaction
+    'BUCKET_SECONDS': 60 * 60,  # Downsampled series resolution
+    'MAX_READINGS': 5000,       # Per request
+    'MAX_CLOCK_SKEW': 300,      # Seconds a reading may be dated in the future
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -141,3 +245,91 @@ LOGIN_REDIRECT_URL = '/'
 # Heroku expects this to be set.
 STATIC_ROOT = BASE_DIR / 'staticfiles' # Or os.path.join(BASE_DIR, 'staticfiles')
 
+
+# --- Caching ---
+# 'vin_decode' is the shared (cross-process) level of the NHTSA VIN decode cache.
+# Point it at Redis/Memcached in production if several hosts serve the app.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'vin_decode': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'vin_decode',
+        'TIMEOUT': None,  # Entries carry their own TTL, see VIN_DECODE_CACHE
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    # Read-path query results (autologx.api.query_cache). Its invalidation tokens must be
+    # shared by every process serving requests: LocMemCache is faster but only correct
+    # with a single server process; use a shared backend (Redis, Memcached) across hosts.
+    'query_cache': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'query_cache',
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+}
+
+# Request instrumentation (autologx.api.metrics), served at /metrics for Prometheus.
+# Scrapers send "Authorization: Bearer <TOKEN>"; without a TOKEN only staff sessions may read it.
+METRICS = {
+    'ENABLED': True,
+    'TOKEN': os.environ.get('METRICS_TOKEN'),
+    'SLOW_REQUEST_MS': 500,  # Requests at least this slow are logged with their top SQL
+    'SLOW_SQL_SAMPLES': 5,
+}
+
+# Per-user/per-vehicle caching of vehicle_list and vehicle_detail queries
+QUERY_CACHE = {
+    'ENABLED': True,
+    'CACHE_ALIAS': 'query_cache',
+    'TIMEOUT': 300,         # Seconds; stale entries are never served, this only bounds their lifetime
+}
+
+# NHTSA vPIC API root; override (e.g. with a local stub server) via the environment
+NHTSA_API_BASE = os.environ.get('NHTSA_API_BASE', 'https://vpic.nhtsa.dot.gov/api')
+
+# NHTSA HTTP client (autologx.api.services.nhtsa_client); times in seconds.
+# TOTAL_TIMEOUT bounds a lookup including retries, so it bounds vin-lookup latency.
+NHTSA_CLIENT = {
+    'CONNECT_TIMEOUT': 3.05,
+    'READ_TIMEOUT': 6.0,
+    'TOTAL_TIMEOUT': 10.0,
+    'RETRIES': 2,               # Extra attempts for idempotent calls (jittered backoff)
+    'BACKOFF': 0.25,
+    'POOL_SIZE': 20,            # Keep-alive connections per host
+    'BREAKER_FAILURES': 5,      # Consecutive failures that open the circuit
+    'BREAKER_RESET': 30.0,      # Seconds before a trial call is allowed
+}
+
+# Offline VIN index (autologx.api.vin_index), built with `manage.py build_vin_index`
+# and memory-mapped at startup; VINs it fully decodes skip the NHTSA call.
+VIN_INDEX_PATH = os.environ.get('VIN_INDEX_PATH', str(BASE_DIR / 'data' / 'vin_index.dat'))
+
+# NHTSA VIN decode cache (autologx.api.services.vin_cache)
+VIN_DECODE_CACHE = {
+    'MAXSIZE': 4096,                    # In-process LRU entries per worker
+    'TTL': 60 * 60 * 24 * 30,           # Successful decodes: 30 days
+    'NEGATIVE_TTL': 60 * 60,            # VINs NHTSA could not decode: 1 hour
+    'CACHE_ALIAS': 'vin_decode',        # Shared level; set to None to disable
+}
+
+# Maintenance forecasting (autologx.api.forecasting): miles and/or days between
+# services per ServiceRecord.SERVICE_TYPES key; None means "not scheduled that way".
+MAINTENANCE_INTERVALS = {
+    'oil_change': {'miles': 5000, 'days': 182},
+    'tire_rotation': {'miles': 7500, 'days': 182},
+    'brake_service': {'miles': 30000, 'days': 730},
+    'inspection': {'miles': None, 'days': 365},
+}
+
+# REST API (autologx.api.viewsets): JWT from api/token/ or the browser session.
+# JSON only outside DEBUG; the browsable renderer is much slower per response.
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticated'],
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'] + (
+        ['rest_framework.renderers.BrowsableAPIRenderer'] if DEBUG else []),
+}
@@ -0,0 +1,34 @@
+// AutoLogX/static/js/load-more.js
+// "Load more" for keyset-paginated lists. A button with data-url, data-cursor and
+// data-target fetches the next page as partial HTML, appends it to the target and
+// takes the next cursor from the X-Next-Cursor header (hidden when there is none).
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('[data-load-more]').forEach(function(button) {
+        const target = document.querySelector(button.dataset.target);
+        if (!target) return;
+        button.addEventListener('click', function() {
+            const url = new URL(button.dataset.url, window.location.origin);
+            url.searchParams.set('cursor', button.dataset.cursor);
+            button.disabled = true;
+            fetch(url, {headers: {'Accept': 'text/html'}, credentials: 'same-origin'})
+                .then(response => {
+                    if (!response.ok) throw new Error(`Status ${response.status}`);
+                    const nextCursor = response.headers.get('X-Next-Cursor');
+                    return response.text().then(html => ({html, nextCursor}));
+                })
+                .then(({html, nextCursor}) => {
+                    target.insertAdjacentHTML('beforeend', html);
+                    if (nextCursor) {
+                        button.dataset.cursor = nextCursor;
+                        button.disabled = false;
+                    } else {
+                        button.remove();
+                    }
+                })
+                .catch(error => {
+                    button.disabled = false;
+                    console.error('Load more failed:', error);
+                });
+        });
+    });
+});